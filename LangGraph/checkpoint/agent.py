@@ -96,10 +96,13 @@ def build_agent_with_mongodb(
         )
     else:
         from mongodb_checkpointer import MongoDBSaver
+        # 每个会话只保留最近50个检查点，由后台整理线程定期执行 prune/compact 清理
         checkpointer = MongoDBSaver.from_conn_string(
             mongodb_uri,
-            db_name=db_name
+            db_name=db_name,
+            keep_last=50,
         )
+        checkpointer.start_compactor()
     
     return build_customer_service_agent(
         checkpointer=checkpointer,
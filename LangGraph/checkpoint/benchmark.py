@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : benchmark.py
+@Desc    : Checkpointer 跨后端性能基准测试
+
+用合成的对话图负载驱动各个检查点存储器，对比它们的性能：
+1. MemorySaver：进程内存储
+2. SqliteSaver：临时 SQLite 文件
+3. MongoDBSaver / AsyncMongoDBSaver：本地 mongod（--mongo-uri）或 mongomock / mongomock_motor
+
+每个线程模拟一段对话：每一步先写入任务结果（put_writes），再保存新的检查点（put），
+然后读取最新检查点（get_tuple）；对话结束后分别读取最近几个检查点和完整历史（list）。
+输出各操作的延迟分位数、检查点吞吐量和存储占用。
+
+运行示例：
+    python benchmark.py
+    python benchmark.py --backends sqlite mongodb --depths 10 1000 100000 \\
+        --payload-sizes 1024 1048576 --concurrency 1 64 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from langgraph.checkpoint.base import Checkpoint, copy_checkpoint, empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.memory import MemorySaver
+
+
+# 默认测试矩阵（完整范围可通过命令行参数指定，例如 --depths 10 1000 100000）
+DEFAULT_BACKENDS = ["memory", "sqlite", "mongodb", "mongodb-async"]
+DEFAULT_DEPTHS = [10, 100]  # 每个线程的检查点数量
+DEFAULT_PAYLOAD_SIZES = [1024, 64 * 1024]  # 每条消息的字节数
+DEFAULT_CONCURRENCY = [1, 8]  # 并发线程数
+
+HISTORY_WINDOW = 20  # messages 通道保留的最近消息数量
+LIST_LIMIT = 10  # list(limit=...) 读取的最近检查点数量
+PERCENTILES = (0.5, 0.9, 0.99)
+
+# 生成类自然语言的消息内容，使压缩等优化的效果接近真实数据
+WORDS = (
+    "订单 物流 退款 商品 客服 用户 地址 支付 优惠券 发货 签收 查询 "
+    "the order was shipped and the customer asked about refund status for item "
+    "please confirm delivery address payment method coupon tracking number"
+).split()
+
+
+def make_payload(size: int) -> str:
+    """生成指定字节数的消息内容"""
+    rng = random.Random(size)
+    parts, total = [], 0
+    while total < size:
+        word = rng.choice(WORDS)
+        parts.append(word)
+        total += len(word.encode("utf-8")) + 1
+    return " ".join(parts).encode("utf-8")[:size].decode("utf-8", errors="ignore")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def _nbytes(obj: Any) -> int:
+    """统计嵌套容器中所有 bytes 的总长度（用于估算 MemorySaver 的存储占用）"""
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, dict):
+        return sum(_nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(value) for value in obj)
+    return 0
+
+
+class LatencyRecorder:
+    """按操作名称记录每次调用的耗时（线程安全）"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _record(self, op: str, elapsed: float):
+        with self._lock:
+            self.latencies[op].append(elapsed)
+
+    def time(self, op: str, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self._record(op, time.perf_counter() - start)
+        return result
+
+    async def atime(self, op: str, coro):
+        start = time.perf_counter()
+        result = await coro
+        self._record(op, time.perf_counter() - start)
+        return result
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """各操作的调用次数和延迟分位数（毫秒）"""
+        result = {}
+        for op, values in sorted(self.latencies.items()):
+            stats = {"count": len(values)}
+            for q in PERCENTILES:
+                stats[f"p{int(q * 100)}"] = percentile(values, q) * 1000
+            stats["max"] = max(values) * 1000
+            result[op] = stats
+        return result
+
+
+# ============================================================
+# 合成负载
+# ============================================================
+
+def next_checkpoint(
+    saver, previous: Optional[Checkpoint], step: int, messages: list[dict]
+) -> tuple[Checkpoint, dict]:
+    """
+    基于上一个检查点生成下一步的检查点
+
+    每一步更新 messages（最近 HISTORY_WINDOW 条消息）和 step 两个通道，
+    与对话图中 agent 节点每轮追加一条消息的形态一致。
+
+    Returns:
+        (checkpoint, new_versions)
+    """
+    if previous is None:
+        checkpoint = empty_checkpoint()
+    else:
+        checkpoint = copy_checkpoint(previous)
+        checkpoint["id"] = str(uuid6(clock_seq=step))
+        checkpoint["ts"] = datetime.now(timezone.utc).isoformat()
+    new_versions = {}
+    for channel, value in (("messages", messages), ("step", step)):
+        version = saver.get_next_version(checkpoint["channel_versions"].get(channel), None)
+        checkpoint["channel_values"][channel] = value
+        checkpoint["channel_versions"][channel] = version
+        new_versions[channel] = version
+    checkpoint["versions_seen"]["agent"] = dict(checkpoint["channel_versions"])
+    return checkpoint, new_versions
+
+
+def _message(step: int, payload: str) -> dict:
+    return {"role": "user" if step % 2 == 0 else "assistant", "content": f"[{step}] {payload}"}
+
+
+def _metadata(step: int) -> dict:
+    return {"source": "input" if step == 0 else "loop", "step": step, "parents": {}}
+
+
+def _thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def run_thread(saver, recorder: LatencyRecorder, thread_id: str, depth: int, payload: str, window: int):
+    """同步模拟一段对话"""
+    config = _thread_config(thread_id)
+    checkpoint, messages = None, []
+    for step in range(depth):
+        message = _message(step, payload)
+        if checkpoint is not None:
+            recorder.time("put_writes", saver.put_writes, config, [("messages", [message])], str(uuid.uuid4()))
+        messages = (messages + [message])[-window:]
+        checkpoint, new_versions = next_checkpoint(saver, checkpoint, step, messages)
+        config = recorder.time("put", saver.put, config, checkpoint, _metadata(step), new_versions)
+        recorder.time("get_tuple", saver.get_tuple, _thread_config(thread_id))
+    recorder.time("list", lambda: list(saver.list(_thread_config(thread_id), limit=LIST_LIMIT)))
+    recorder.time("list_all", lambda: sum(1 for _ in saver.list(_thread_config(thread_id))))
+
+
+async def arun_thread(saver, recorder: LatencyRecorder, thread_id: str, depth: int, payload: str, window: int):
+    """异步模拟一段对话"""
+    config = _thread_config(thread_id)
+    checkpoint, messages = None, []
+    for step in range(depth):
+        message = _message(step, payload)
+        if checkpoint is not None:
+            await recorder.atime(
+                "put_writes", saver.aput_writes(config, [("messages", [message])], str(uuid.uuid4()))
+            )
+        messages = (messages + [message])[-window:]
+        checkpoint, new_versions = next_checkpoint(saver, checkpoint, step, messages)
+        config = await recorder.atime("put", saver.aput(config, checkpoint, _metadata(step), new_versions))
+        await recorder.atime("get_tuple", saver.aget_tuple(_thread_config(thread_id)))
+
+    async def collect(limit: Optional[int]):
+        return [item async for item in saver.alist(_thread_config(thread_id), limit=limit)]
+
+    await recorder.atime("list", collect(LIST_LIMIT))
+    await recorder.atime("list_all", collect(None))
+
+
+# ============================================================
+# 后端
+# ============================================================
+
+def _mongo_options(args) -> dict:
+    return {
+        "durability": args.durability,
+        "compression_level": args.compression_level,
+        "cache_size": args.cache_size,
+    }
+
+
+def _mongo_storage(db) -> int:
+    """MongoDB 数据和索引的存储占用；mongomock 不支持 dbstats 时按 BSON 大小估算"""
+    try:
+        stats = db.command("dbstats")
+        return int(stats["dataSize"] + stats["indexSize"])
+    except Exception:
+        import bson
+        return sum(
+            len(bson.encode(doc))
+            for name in db.list_collection_names()
+            for doc in db[name].find()
+        )
+
+
+async def _amongo_storage(db) -> int:
+    try:
+        stats = await db.command("dbstats")
+        return int(stats["dataSize"] + stats["indexSize"])
+    except Exception:
+        import bson
+        total = 0
+        for name in await db.list_collection_names():
+            async for doc in db[name].find():
+                total += len(bson.encode(doc))
+        return total
+
+
+@contextmanager
+def open_memory(args):
+    saver = MemorySaver()
+    yield saver, lambda: sum(
+        _nbytes(getattr(saver, name, {})) for name in ("storage", "writes", "blobs")
+    )
+
+
+@contextmanager
+def open_sqlite(args):
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    workdir = tempfile.mkdtemp(prefix="checkpoint-bench-")
+    path = os.path.join(workdir, "checkpoints.db")
+    conn = sqlite3.connect(path, check_same_thread=False)
+    try:
+        saver = SqliteSaver(conn)
+        saver.setup()
+        yield saver, lambda: sum(
+            os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)
+        )
+    finally:
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def open_mongodb(args):
+    from mongodb_checkpointer import MongoDBSaver
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise RuntimeError("未指定 --mongo-uri，且 mongomock 未安装。请运行: pip install mongomock")
+        client = mongomock.MongoClient()
+    db_name = f"checkpoint_bench_{uuid.uuid4().hex[:8]}"
+    saver = MongoDBSaver(client, db_name, **_mongo_options(args))
+    try:
+        yield saver, lambda: (saver.flush(), _mongo_storage(saver.db))[1]
+    finally:
+        saver.flush()
+        client.drop_database(db_name)
+        saver.close()
+
+
+@asynccontextmanager
+async def open_async_mongodb(args):
+    from mongodb_checkpointer import AsyncMongoDBSaver
+
+    if args.mongo_uri:
+        try:
+            from motor.motor_asyncio import AsyncIOMotorClient
+        except ImportError:
+            raise RuntimeError("motor 库未安装。请运行: pip install motor")
+        client = AsyncIOMotorClient(args.mongo_uri)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise RuntimeError("未指定 --mongo-uri，且 mongomock_motor 未安装。请运行: pip install mongomock-motor")
+        client = AsyncMongoMockClient()
+    db_name = f"checkpoint_bench_{uuid.uuid4().hex[:8]}"
+    saver = AsyncMongoDBSaver(client, db_name, **_mongo_options(args))
+    await saver.setup()
+
+    async def storage() -> int:
+        await saver.aflush()
+        return await _amongo_storage(saver.db)
+
+    try:
+        yield saver, storage
+    finally:
+        await saver.aflush()
+        await client.drop_database(db_name)
+        await saver.aclose()
+
+
+# 后端名称 -> (打开函数, 是否为异步存储器)
+BACKENDS: dict[str, tuple[Callable, bool]] = {
+    "memory": (open_memory, False),
+    "sqlite": (open_sqlite, False),
+    "mongodb": (open_mongodb, False),
+    "mongodb-async": (open_async_mongodb, True),
+}
+
+
+# ============================================================
+# 运行
+# ============================================================
+
+def _result(backend: str, depth: int, payload_size: int, concurrency: int,
+            recorder: LatencyRecorder, elapsed: float, storage_bytes: int) -> dict:
+    checkpoints = depth * concurrency
+    return {
+        "backend": backend,
+        "depth": depth,
+        "payload_size": payload_size,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "checkpoints_per_second": checkpoints / elapsed if elapsed else 0.0,
+        "storage_bytes": storage_bytes,
+        "latency_ms": recorder.summary(),
+    }
+
+
+def run_case(backend: str, args, depth: int, payload_size: int, concurrency: int) -> dict:
+    """同步存储器：用线程池并发运行 concurrency 个线程"""
+    payload = make_payload(payload_size)
+    recorder = LatencyRecorder()
+    with BACKENDS[backend][0](args) as (saver, storage):
+        thread_ids = [f"bench-{uuid.uuid4().hex[:8]}-{i}" for i in range(concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_thread, saver, recorder, tid, depth, payload, args.window)
+                for tid in thread_ids
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+        storage_bytes = storage()
+    return _result(backend, depth, payload_size, concurrency, recorder, elapsed, storage_bytes)
+
+
+async def arun_case(backend: str, args, depth: int, payload_size: int, concurrency: int) -> dict:
+    """异步存储器：在同一个事件循环中并发运行 concurrency 个线程"""
+    payload = make_payload(payload_size)
+    recorder = LatencyRecorder()
+    async with BACKENDS[backend][0](args) as (saver, storage):
+        thread_ids = [f"bench-{uuid.uuid4().hex[:8]}-{i}" for i in range(concurrency)]
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            arun_thread(saver, recorder, tid, depth, payload, args.window) for tid in thread_ids
+        ))
+        elapsed = time.perf_counter() - start
+        storage_bytes = await storage()
+    return _result(backend, depth, payload_size, concurrency, recorder, elapsed, storage_bytes)
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def print_result(result: dict):
+    """打印单个测试用例的结果"""
+    print(
+        f"\n[{result['backend']}] depth={result['depth']} "
+        f"payload={_format_bytes(result['payload_size'])} concurrency={result['concurrency']}"
+    )
+    print(
+        f"  耗时 {result['elapsed']:.2f}s  吞吐 {result['checkpoints_per_second']:.1f} checkpoints/s  "
+        f"存储 {_format_bytes(result['storage_bytes'])}"
+    )
+    print(f"  {'操作':<12}{'次数':>8}{'p50(ms)':>12}{'p90(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+    for op, stats in result["latency_ms"].items():
+        print(
+            f"  {op:<12}{stats['count']:>8}{stats['p50']:>12.2f}{stats['p90']:>12.2f}"
+            f"{stats['p99']:>12.2f}{stats['max']:>12.2f}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Checkpointer 跨后端性能基准测试")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=DEFAULT_BACKENDS)
+    parser.add_argument("--depths", nargs="+", type=int, default=DEFAULT_DEPTHS,
+                        help="每个线程的检查点数量")
+    parser.add_argument("--payload-sizes", nargs="+", type=int, default=DEFAULT_PAYLOAD_SIZES,
+                        help="每条消息的字节数")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY,
+                        help="并发线程数")
+    parser.add_argument("--window", type=int, default=HISTORY_WINDOW,
+                        help="messages 通道保留的最近消息数量")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGODB_URI"),
+                        help="本地 mongod 连接字符串，未指定时使用 mongomock")
+    parser.add_argument("--durability", default="sync", help="MongoDB 持久化模式")
+    parser.add_argument("--compression-level", type=int, default=None, help="MongoDB zstd 压缩级别")
+    parser.add_argument("--cache-size", type=int, default=0, help="MongoDB 最新检查点缓存大小")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    for backend in args.backends:
+        is_async = BACKENDS[backend][1]
+        for depth in args.depths:
+            for payload_size in args.payload_sizes:
+                for concurrency in args.concurrency:
+                    try:
+                        if is_async:
+                            result = asyncio.run(arun_case(backend, args, depth, payload_size, concurrency))
+                        else:
+                            result = run_case(backend, args, depth, payload_size, concurrency)
+                    except Exception as e:
+                        print(f"\n[{backend}] depth={depth} payload={payload_size} "
+                              f"concurrency={concurrency} 运行失败: {e}")
+                        continue
+                    print_result(result)
+                    results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
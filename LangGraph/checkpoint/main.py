@@ -15,6 +15,8 @@
 import sys
 import io
 import asyncio
+import threading
+import time
 from typing import Optional
 
 from langchain_core.messages import HumanMessage
@@ -22,6 +24,7 @@ from langgraph.types import Command
 
 from agent import build_customer_service_agent, build_agent_with_mongodb
 from mongodb_checkpointer import MongoDBSaver
+from langgraph.checkpoint.serde.types import RESUME
 
 
 def print_separator(title: str = ""):
@@ -294,6 +297,10 @@ def demo_mongodb_checkpoint():
         print(f"检查点 ID: {current_state.config['configurable']['checkpoint_id'][:20]}...")
         print(f"消息数量: {len(current_state.values.get('messages', []))}")
         
+        # 后台整理线程每小时按 keep_last 清理一次，这里立即执行一次
+        removed = agent.checkpointer.prune(config["configurable"]["thread_id"])
+        print(f"按 keep_last={agent.checkpointer.keep_last} 清理的旧检查点: {removed}")
+        
         print("\n✅ 演示完成：MongoDB 检查点存储工作正常")
         
     except Exception as e:
@@ -302,6 +309,61 @@ def demo_mongodb_checkpoint():
         print("启动命令: mongod --dbpath /path/to/data")
 
 
+def demo_resume_notifications():
+    """
+    演示 8：跨进程恢复通知（MongoDB Change Stream）
+    
+    中断的线程不必由发起请求的进程恢复：人工回复通过 put_resume 写入 MongoDB，
+    订阅了 RESUME 通道的 worker 立即收到通知并恢复执行。
+    注意：需要本地运行 MongoDB 服务（单机模式下自动退化为轮询）。
+    """
+    print_separator("演示 8：跨进程恢复通知")
+    
+    try:
+        agent = build_agent_with_mongodb(db_name="customer_service_demo")
+    except Exception as e:
+        print(f"\n❌ MongoDB 连接失败: {e}")
+        return
+    checkpointer = agent.checkpointer
+    config = {"configurable": {"thread_id": f"demo-resume-{int(time.time())}"}}
+    stop = threading.Event()
+    
+    def resume_worker():
+        """worker：等待恢复值写入后恢复对应线程"""
+        thread_id = config["configurable"]["thread_id"]
+        for event in checkpointer.subscribe(thread_id, channels=[RESUME], stop_event=stop):
+            thread_config = {"configurable": {"thread_id": event["thread_id"]}}
+            pending = checkpointer.get_tuple(thread_config).pending_writes or []
+            value = next((v for _, channel, v in pending if channel == RESUME), None)
+            print(f"\n🔔 worker 收到恢复通知：{event['thread_id']}")
+            result = agent.invoke(Command(resume=value), config=thread_config)
+            print("\n📤 Agent 最终回复：")
+            print_messages(result["messages"], last_n=1)
+            stop.set()
+    
+    worker = threading.Thread(target=resume_worker, daemon=True)
+    worker.start()
+    
+    print("\n📝 用户提问（这个问题需要人工介入）：")
+    result = agent.invoke(
+        {"messages": [HumanMessage(content="我的订单 ORD999 发货有问题，快递丢了怎么办？")]},
+        config=config
+    )
+    if not result.get("__interrupt__"):
+        print("\n📤 Agent 回复（无需人工介入）：")
+        print_messages(result["messages"], last_n=1)
+        stop.set()
+        return
+    
+    print(f"\n⏸️ Agent 请求人工介入：{result['__interrupt__'][0].value}")
+    human_response = "您的订单 ORD999 快递丢失问题已记录，我们会在24小时内联系您处理赔偿事宜。"
+    print(f"\n👤 人工客服回复（只写入恢复值，不在本进程恢复）：{human_response}")
+    checkpointer.put_resume(config, human_response)
+    
+    worker.join(timeout=120)
+    print("\n✅ 演示完成：worker 通过变更订阅恢复了中断的线程")
+
+
 def interactive_chat():
     """
     交互式聊天模式
@@ -390,10 +452,11 @@ def main():
     print("5. MongoDB 检查点存储")
     print("6. 交互式聊天")
     print("7. 运行所有演示")
+    print("8. 跨进程恢复通知（MongoDB）")
     print("0. 退出")
     
     try:
-        choice = input("\n请输入选项 (0-7): ").strip()
+        choice = input("\n请输入选项 (0-8): ").strip()
         
         if choice == "1":
             demo_memory_feature()
@@ -413,6 +476,8 @@ def main():
             demo_time_travel()
             demo_state_management_api()
             demo_mongodb_checkpoint()
+        elif choice == "8":
+            demo_resume_notifications()
         elif choice == "0":
             print("\n👋 再见！")
         else:
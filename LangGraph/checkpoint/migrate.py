@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : migrate.py
+@Desc    : Checkpointer 之间的流式数据迁移工具
+
+将线程、检查点和待处理写入从任意 BaseCheckpointSaver 迁移到另一个存储器，无需重放图：
+1. 按 thread_id 顺序流式读取线程，每个线程的检查点通过 list() 逐个读取，内存占用与数据总量无关
+2. 多个线程并行迁移
+3. 目标存储器提供 bulk() 时（MongoDBSaver），每个迁移线程的写入合并为批量写入
+4. 已完成的线程位置写入游标文件，中断后从游标继续（重复迁移同一线程是幂等的）
+
+待处理写入通过目标存储器的 put_writes 写入：错误、中断、恢复值等特殊写入由目标存储器按 WRITES_IDX_MAP
+恢复固定序号；CheckpointTuple 不包含普通写入的序号，每个任务的普通写入按原顺序从 0 重新编号
+（图执行时每个任务的普通写入由一次 put_writes 写入，序号与源存储器相同）。
+
+运行示例：
+    python migrate.py --source sqlite:///db/memory.db --target mongodb://localhost:27017/langgraph
+    python migrate.py --source mongodb://localhost:27017/langgraph --target sqlite:///backup.db \\
+        --workers 8 --cursor migrate.cursor.json
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import groupby
+from typing import Callable, Iterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+
+from mongodb_checkpointer import MongoDBSaver
+
+
+# 迁移配置
+DEFAULT_WORKERS = 4  # 并行迁移的线程数
+THREAD_ID_PAGE_SIZE = 1000  # 每次读取的 thread_id 数量
+SAVE_CURSOR_EVERY = 100  # 每完成多少个线程保存一次游标
+
+
+# ============================================================
+# 读取源存储器
+# ============================================================
+
+def iter_thread_ids(saver: BaseCheckpointSaver, after: Optional[str] = None) -> Iterator[str]:
+    """
+    按 thread_id 升序流式列出源存储器中的线程
+
+    Args:
+        saver: 源存储器
+        after: 只列出大于该值的 thread_id（从游标继续）
+    """
+    if isinstance(saver, MongoDBSaver):
+        pipeline = [
+            {"$match": {"thread_id": {"$gt": after}} if after is not None else {}},
+            {"$group": {"_id": "$thread_id"}},
+            {"$sort": {"_id": 1}},
+        ]
+        for doc in saver.checkpoints_collection.aggregate(pipeline, allowDiskUse=True):
+            yield doc["_id"]
+        return
+
+    if isinstance(saver, MemorySaver):
+        yield from sorted(t for t in saver.storage if after is None or t > after)
+        return
+
+    conn = getattr(saver, "conn", None)
+    if isinstance(conn, sqlite3.Connection):
+        # SqliteSaver：分页读取，每页之间释放连接锁，不阻塞迁移线程读取检查点
+        last = after if after is not None else ""
+        while True:
+            with saver.lock:
+                rows = conn.execute(
+                    "SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id > ? "
+                    "ORDER BY thread_id LIMIT ?",
+                    (last, THREAD_ID_PAGE_SIZE),
+                ).fetchall()
+            if not rows:
+                return
+            for (thread_id,) in rows:
+                yield thread_id
+            last = rows[-1][0]
+
+    # 其他存储器：遍历全部检查点收集 thread_id（内存占用与线程数成正比）
+    thread_ids = {item.config["configurable"]["thread_id"] for item in saver.list(None)}
+    yield from sorted(t for t in thread_ids if after is None or t > after)
+
+
+def _thread_configs(saver: BaseCheckpointSaver, thread_id: str) -> list[RunnableConfig]:
+    """
+    列出线程的检查点所需的配置
+
+    MongoDBSaver.list 只返回一个命名空间，需要按命名空间分别列出；
+    其他存储器在 config 不含 checkpoint_ns 时返回所有命名空间。
+    """
+    if isinstance(saver, MongoDBSaver):
+        return [
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+            for checkpoint_ns in saver.checkpoints_collection.distinct(
+                "checkpoint_ns", {"thread_id": thread_id}
+            )
+        ]
+    return [{"configurable": {"thread_id": thread_id}}]
+
+
+# ============================================================
+# 写入目标存储器
+# ============================================================
+
+def _version_normalizer(target: BaseCheckpointSaver) -> Callable:
+    """
+    将通道版本转换为目标存储器的格式
+
+    图执行时会比较同一线程内的通道版本，因此迁移后的版本必须与目标存储器生成的版本类型一致。
+    SqliteSaver / MemorySaver / MongoDBSaver 生成 "<序号>.<随机数>" 格式的字符串版本，整数版本
+    （以及 MongoDBSaver 早期整数线程的浮点版本）转换为相同格式，字符串版本保持不变
+    （同一序号在不同分支上可能对应不同的版本，转换为整数会相互覆盖）。
+    """
+    if not isinstance(target.get_next_version(None, None), str):
+        return lambda version: version
+
+    def normalize(version):
+        if isinstance(version, int):
+            return f"{version:032}.{0:016}"
+        if isinstance(version, float):
+            # MongoDBSaver 早期整数线程的 "序号 + 随机小数" 版本，保留随机部分区分分支
+            return f"{int(version):032}.{version - int(version):016}"
+        return version
+
+    return normalize
+
+
+def _copy_tuple(
+    target: BaseCheckpointSaver,
+    item: CheckpointTuple,
+    older_versions: dict,
+    normalize: Callable = lambda version: version,
+) -> None:
+    """
+    将一个检查点及其待处理写入写入目标存储器
+
+    new_versions 取与同一命名空间中下一个（更旧的）检查点不同的通道版本：
+    每个 (channel, version) 都会由引用它的最旧检查点写入一次，与分支无关。
+    所有通道版本经 normalize 转换为目标存储器的格式。
+    """
+    checkpoint = dict(item.checkpoint)
+    new_versions = {
+        channel: normalize(version)
+        for channel, version in checkpoint["channel_versions"].items()
+        if older_versions.get(channel) != version
+    }
+    checkpoint["channel_versions"] = {
+        channel: normalize(version) for channel, version in checkpoint["channel_versions"].items()
+    }
+    checkpoint["versions_seen"] = {
+        node: {channel: normalize(version) for channel, version in seen.items()}
+        for node, seen in checkpoint["versions_seen"].items()
+    }
+    configurable = item.config["configurable"]
+    parent_config = item.parent_config or {
+        "configurable": {
+            "thread_id": configurable["thread_id"],
+            "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+        }
+    }
+    saved_config = target.put(parent_config, checkpoint, item.metadata, new_versions)
+    for task_id, writes in groupby(item.pending_writes or [], key=lambda write: write[0]):
+        writes = list(writes)
+        # 普通写入按原顺序一次写入，序号与源存储器相同；特殊写入逐个写入，
+        # 由目标存储器按 WRITES_IDX_MAP 恢复原来的固定序号，不占用普通写入的序号
+        regular = [(channel, value) for _, channel, value in writes if channel not in WRITES_IDX_MAP]
+        if regular:
+            target.put_writes(saved_config, regular, task_id)
+        for _, channel, value in writes:
+            if channel in WRITES_IDX_MAP:
+                target.put_writes(saved_config, [(channel, value)], task_id)
+
+
+def migrate_thread(source: BaseCheckpointSaver, target: BaseCheckpointSaver, thread_id: str) -> int:
+    """
+    迁移一个线程的所有检查点
+
+    list() 按新到旧返回，每个命名空间只保留一个等待写入的检查点，
+    读到下一个更旧的检查点后即可计算它的 new_versions 并写入。
+
+    Returns:
+        迁移的检查点数量
+    """
+    normalize = _version_normalizer(target)
+    count = 0
+    for config in _thread_configs(source, thread_id):
+        waiting: dict[str, CheckpointTuple] = {}
+        for item in source.list(config):
+            checkpoint_ns = item.config["configurable"].get("checkpoint_ns", "")
+            if checkpoint_ns in waiting:
+                _copy_tuple(target, waiting[checkpoint_ns], item.checkpoint["channel_versions"], normalize)
+                count += 1
+            waiting[checkpoint_ns] = item
+        for item in waiting.values():
+            _copy_tuple(target, item, {}, normalize)
+            count += 1
+    return count
+
+
+# ============================================================
+# 游标
+# ============================================================
+
+def load_cursor(path: Optional[str]) -> dict:
+    """读取游标文件（不存在时从头开始）"""
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"after": None, "threads": 0, "checkpoints": 0}
+
+
+def save_cursor(path: Optional[str], cursor: dict) -> None:
+    """原子地写入游标文件"""
+    if not path:
+        return
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(cursor, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def migrate(
+    source: BaseCheckpointSaver,
+    target: BaseCheckpointSaver,
+    *,
+    workers: int = DEFAULT_WORKERS,
+    cursor_path: Optional[str] = None,
+    save_every: int = SAVE_CURSOR_EVERY,
+    on_progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    将 source 中的所有线程迁移到 target
+
+    线程按 thread_id 顺序提交给线程池，最多同时有 2 * workers 个线程在迁移；
+    bulk() 按线程生效，每个线程在工作线程中的 bulk() 上下文里迁移，完成时剩余数据已经写入。
+    游标只记录之前的线程全部完成的位置，并且在目标存储器写入缓存数据之后才保存，
+    中断后从游标继续时，游标之后已经迁移过的线程会被重新写入（覆盖相同的数据）。
+
+    Args:
+        source: 源存储器
+        target: 目标存储器
+        workers: 并行迁移的线程数
+        cursor_path: 游标文件路径，None 表示不支持断点续传
+        save_every: 每完成多少个线程保存一次游标
+        on_progress: 保存游标后的回调，参数为游标
+
+    Returns:
+        游标：after（最后完成的 thread_id）、threads、checkpoints
+    """
+    cursor = load_cursor(cursor_path)
+    bulk = getattr(target, "bulk", None)
+    flush = getattr(target, "flush", None)
+
+    def checkpoint_cursor():
+        # 游标之前的数据必须已经写入目标存储器
+        if flush is not None:
+            flush()
+        save_cursor(cursor_path, cursor)
+        if on_progress is not None:
+            on_progress(dict(cursor))
+
+    def migrate_one(thread_id: str) -> int:
+        with bulk() if bulk is not None else nullcontext():
+            return migrate_thread(source, target, thread_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight: deque = deque()
+        since_saved = 0
+
+        def complete_head():
+            nonlocal since_saved
+            thread_id, future = in_flight.popleft()
+            cursor["checkpoints"] += future.result()
+            cursor["threads"] += 1
+            cursor["after"] = thread_id
+            since_saved += 1
+            if since_saved >= save_every:
+                checkpoint_cursor()
+                since_saved = 0
+
+        for thread_id in iter_thread_ids(source, cursor["after"]):
+            in_flight.append((thread_id, executor.submit(migrate_one, thread_id)))
+            # 按提交顺序完成，保证游标之前的线程都已迁移
+            while in_flight and (in_flight[0][1].done() or len(in_flight) >= 2 * workers):
+                complete_head()
+        while in_flight:
+            complete_head()
+    checkpoint_cursor()
+    return cursor
+
+
+# ============================================================
+# 命令行
+# ============================================================
+
+def open_saver(spec: str) -> BaseCheckpointSaver:
+    """
+    根据连接串创建存储器
+
+    - sqlite:///path/to/file.db：SqliteSaver
+    - mongodb://host:port/db_name：MongoDBSaver（未指定数据库时使用 langgraph）
+    """
+    if spec.startswith("sqlite:///"):
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        saver = SqliteSaver(sqlite3.connect(spec[len("sqlite:///"):], check_same_thread=False))
+        saver.setup()
+        return saver
+    if spec.startswith(("mongodb://", "mongodb+srv://")):
+        from pymongo import MongoClient
+        from pymongo.uri_parser import parse_uri
+
+        db_name = parse_uri(spec).get("database") or "langgraph"
+        return MongoDBSaver(MongoClient(spec), db_name)
+    raise ValueError(f"不支持的存储器连接串: {spec}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkpointer 之间的流式数据迁移")
+    parser.add_argument("--source", required=True, help="源存储器，如 sqlite:///db/memory.db")
+    parser.add_argument("--target", required=True, help="目标存储器，如 mongodb://localhost:27017/langgraph")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并行迁移的线程数")
+    parser.add_argument("--cursor", help="游标文件路径，指定后支持断点续传")
+    parser.add_argument("--save-every", type=int, default=SAVE_CURSOR_EVERY,
+                        help="每完成多少个线程保存一次游标")
+    args = parser.parse_args(argv)
+
+    source = open_saver(args.source)
+    target = open_saver(args.target)
+    start = time.time()
+
+    def report(cursor: dict):
+        elapsed = time.time() - start
+        print(
+            f"已迁移 {cursor['threads']} 个线程、{cursor['checkpoints']} 个检查点 "
+            f"（{cursor['checkpoints'] / elapsed if elapsed else 0:.0f} checkpoints/s），"
+            f"游标: {cursor['after']}"
+        )
+
+    try:
+        cursor = migrate(
+            source,
+            target,
+            workers=args.workers,
+            cursor_path=args.cursor,
+            save_every=args.save_every,
+            on_progress=report,
+        )
+    except KeyboardInterrupt:
+        print("\n迁移已中断，使用相同的 --cursor 重新运行即可继续")
+        return
+    finally:
+        for saver in (source, target):
+            if isinstance(saver, MongoDBSaver):
+                saver.close()
+    print(f"\n✅ 迁移完成：{cursor['threads']} 个线程，{cursor['checkpoints']} 个检查点")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,21 @@
 @Desc    : 基于 MongoDB 的自定义 Checkpointer 实现
 """
 
-from typing import Any, Iterator, Optional, Sequence, Tuple
+from __future__ import annotations
+
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence, Tuple
+from collections import OrderedDict, defaultdict
 from contextlib import contextmanager
+from itertools import islice
+import asyncio
 import pickle
-from datetime import datetime, timezone
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 
 from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.base import (
@@ -17,14 +28,809 @@ from langgraph.checkpoint.base import (
     Checkpoint,
     CheckpointMetadata,
     CheckpointTuple,
+    WRITES_IDX_MAP,
     SerializerProtocol,
+    copy_checkpoint,
     get_checkpoint_id,
 )
 from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.serde.types import RESUME
 
-from pymongo import MongoClient, DESCENDING
+from pymongo import MongoClient, DESCENDING, UpdateOne
 from pymongo.database import Database
 from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+from pymongo.write_concern import WriteConcern
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    带 zstd 压缩的序列化器
+    
+    包装任意 SerializerProtocol，对超过 min_size 的序列化结果进行 zstd 压缩，
+    并在类型标签前加上 "zstd+"（使用字典时为 "zstd-dict+"）。
+    没有压缩标签的数据直接交给内部序列化器，因此可以读取压缩前写入的旧文档；
+    level 为 None 时只解压读取到的压缩数据，写入时不压缩。
+    
+    使用示例:
+        ```python
+        checkpointer = MongoDBSaver.from_conn_string(
+            "mongodb://localhost:27017",
+            compression_level=3,
+        )
+        print(checkpointer.serde.metrics())
+        ```
+    """
+    
+    TAG = "zstd+"
+    DICT_TAG = "zstd-dict+"
+    
+    def __init__(
+        self,
+        serde: SerializerProtocol,
+        *,
+        level: Optional[int] = 3,
+        dictionary: Optional[bytes] = None,
+        min_size: int = 256,
+    ):
+        """
+        初始化压缩序列化器
+        
+        Args:
+            serde: 内部序列化器
+            level: zstd 压缩级别，None 表示写入时不压缩（仍可读取压缩数据）
+            dictionary: 训练好的 zstd 字典（可选，见 train_dictionary）
+            min_size: 小于该字节数的数据不压缩
+        """
+        if zstandard is None:
+            raise ImportError("zstandard 库未安装。请运行: pip install zstandard")
+        self.serde = serde
+        self.level = level
+        self.min_size = min_size
+        self.dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        # zstd 压缩/解压对象不是线程安全的，每个线程各自持有
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "compressed_count": 0,
+            "skipped_count": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "compress_seconds": 0.0,
+            "decompressed_count": 0,
+            "decompress_seconds": 0.0,
+        }
+    
+    @staticmethod
+    def train_dictionary(samples: Sequence[bytes], dict_size: int = 112640) -> bytes:
+        """
+        使用样本（如历史消息的序列化结果）训练 zstd 字典
+        
+        Args:
+            samples: 样本数据
+            dict_size: 字典大小（字节）
+            
+        Returns:
+            字典内容，可传给 dictionary 参数
+        """
+        if zstandard is None:
+            raise ImportError("zstandard 库未安装。请运行: pip install zstandard")
+        return zstandard.train_dictionary(dict_size, list(samples)).as_bytes()
+    
+    def _compressor(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self.dictionary
+            )
+        return self._local.compressor
+    
+    def _decompressor(self, with_dictionary: bool):
+        attr = "dict_decompressor" if with_dictionary else "decompressor"
+        if not hasattr(self._local, attr):
+            setattr(
+                self._local,
+                attr,
+                zstandard.ZstdDecompressor(dict_data=self.dictionary if with_dictionary else None),
+            )
+        return getattr(self._local, attr)
+    
+    def _record(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._metrics[key] += value
+    
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+    
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+    
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if self.level is None:
+            return type_, data
+        if len(data) < self.min_size:
+            self._record(skipped_count=1, raw_bytes=len(data), stored_bytes=len(data))
+            return type_, data
+        start = time.perf_counter()
+        compressed = self._compressor().compress(data)
+        self._record(
+            compressed_count=1,
+            raw_bytes=len(data),
+            stored_bytes=len(compressed),
+            compress_seconds=time.perf_counter() - start,
+        )
+        tag = self.DICT_TAG if self.dictionary else self.TAG
+        return tag + type_, compressed
+    
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        for tag, with_dictionary in ((self.DICT_TAG, True), (self.TAG, False)):
+            if type_.startswith(tag):
+                if with_dictionary and self.dictionary is None:
+                    raise ValueError("数据使用 zstd 字典压缩，但未配置 dictionary")
+                start = time.perf_counter()
+                payload = self._decompressor(with_dictionary).decompress(payload)
+                self._record(
+                    decompressed_count=1, decompress_seconds=time.perf_counter() - start
+                )
+                type_ = type_[len(tag):]
+                break
+        return self.serde.loads_typed((type_, payload))
+    
+    def metrics(self) -> dict[str, Any]:
+        """压缩统计：次数、原始/存储字节数、压缩率和耗时"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["ratio"] = (
+            metrics["stored_bytes"] / metrics["raw_bytes"] if metrics["raw_bytes"] else 1.0
+        )
+        return metrics
+
+
+def _build_write_ops(
+    serde: SerializerProtocol,
+    config: RunnableConfig,
+    writes: Sequence[Tuple[str, Any]],
+    task_id: str,
+) -> list[UpdateOne]:
+    """
+    构建待处理写入的批量 upsert 操作
+
+    以 (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) 为幂等键，
+    重复提交同一批写入只会覆盖原有文档（created_at 更新为本次写入的时间）。
+    与 SqliteSaver / MemorySaver 一致，错误、中断、恢复值等特殊写入使用 WRITES_IDX_MAP 中的固定序号。
+    """
+    thread_id = config["configurable"]["thread_id"]
+    checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+    checkpoint_id = get_checkpoint_id(config)
+    created_at = datetime.now(timezone.utc)
+
+    ops = []
+    for idx, (channel, value) in enumerate(writes):
+        key = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+            "task_id": task_id,
+            "idx": WRITES_IDX_MAP.get(channel, idx),
+        }
+        doc = {
+            **key,
+            "channel": channel,
+            "value_data": serde.dumps_typed(value),
+            "created_at": created_at,
+        }
+        ops.append(UpdateOne(key, {"$set": doc}, upsert=True))
+    return ops
+
+
+# 缓存校验查询只读取的字段
+STAMP_PROJECTION = {"checkpoint_id": 1, "writes_stamp": 1, "_id": 0}
+
+# list() 每页读取的检查点数量（每页只发起一次待处理写入查询）
+LIST_PAGE_SIZE = 100
+
+# 跨线程检索按 (created_at, checkpoint_id) 倒序排列，分页游标也由这两个字段组成
+SEARCH_SORT = [("created_at", DESCENDING), ("checkpoint_id", DESCENDING)]
+# 只返回元数据时读取的字段（不读取 checkpoint_data 和 blob）
+METADATA_PROJECTION = {
+    "_id": 0,
+    "thread_id": 1,
+    "checkpoint_ns": 1,
+    "checkpoint_id": 1,
+    "parent_checkpoint_id": 1,
+    "metadata_data": 1,
+    "created_at": 1,
+}
+
+# 持久化模式 -> 写关注（None 表示沿用客户端/数据库的默认写关注）
+# sync: 每次 put/put_writes 同步写入，写关注与未设置持久化模式时相同
+# batched: 超级步内的写入先缓存，put（超级步结束）时合并为一次批量写入
+# async: 后台线程批量写入，进程崩溃时可能丢失最后一步
+DURABILITY_WRITE_CONCERNS = {
+    "sync": None,
+    "batched": WriteConcern(w=1, j=True),
+    "async": WriteConcern(w=1, j=False),
+}
+WRITE_QUEUE_SIZE = 1000  # async 模式后台队列容量（队列满时 put 阻塞）
+WRITE_FLUSH_BATCH = 100  # async 模式每次最多合并的提交数
+BULK_BATCH_SIZE = 1000  # bulk() 上下文中累计多少个写入操作后合并写入一次
+
+# 保留策略与后台整理
+PRUNE_BATCH_SIZE = 1000  # 每批删除的文档数
+COMPACT_GRACE_SECONDS = 600  # 只清理创建超过该时间的孤立数据，避免误删正在写入的数据
+COMPACT_INTERVAL = 3600  # 后台整理间隔（秒）
+
+# 批量写入的集合顺序：blob 和待处理写入先于检查点文档，保证检查点引用的数据已经存在
+WRITE_ORDER = ("checkpoint_blobs", "checkpoint_writes", "checkpoints")
+
+# 变更订阅
+SUBSCRIBE_MAX_AWAIT_MS = 1000  # change stream 每次等待新事件的最长时间（毫秒），到时检查停止信号
+SUBSCRIBE_POLL_INTERVAL = 1.0  # 不支持 change stream（单机 mongod、mongomock）时的轮询间隔（秒）
+SUBSCRIBE_FIELDS = ("thread_id", "checkpoint_ns", "checkpoint_id", "channel", "task_id")
+# 与 langgraph.constants.NULL_TASK_ID 一致：Command(resume=...) 的恢复值以该任务 ID 写入
+NULL_TASK_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def _next_version(current: Any) -> Any:
+    """
+    生成通道的下一个版本号
+    
+    blob 按 (channel, version) 存储且写入后不再覆盖，从历史检查点分叉的分支会生成与另一分支
+    相同序号的版本，因此每次生成的版本都带随机部分：与 SqliteSaver / MemorySaver 一致使用
+    "<序号>.<随机数>" 格式的字符串版本。此前以整数版本创建的线程不能改用字符串（图执行时会比较
+    同一线程内所有通道的版本），继续使用 "序号 + 随机小数" 的浮点版本，与整数可以相互比较。
+    """
+    if current is None:
+        return f"{1:032}.{random.random():016}"
+    if isinstance(current, str):
+        return f"{int(current.split('.')[0]) + 1:032}.{random.random():016}"
+    return int(current) + 1 + random.random()
+
+
+class LazyCheckpoint(Mapping):
+    """
+    延迟反序列化的检查点
+    
+    第一次访问其中的字段时才调用 loader 反序列化，
+    只浏览历史元数据（如时间旅行列表）时可以跳过 checkpoint_data 的反序列化。
+    """
+    
+    def __init__(self, loader: Callable[[], Checkpoint]):
+        self._loader = loader
+        self._value: Optional[Checkpoint] = None
+    
+    @property
+    def loaded(self) -> bool:
+        """是否已经反序列化"""
+        return self._value is not None
+    
+    def _load(self) -> Checkpoint:
+        if self._value is None:
+            self._value = self._loader()
+            self._loader = None
+        return self._value
+    
+    def __getitem__(self, key: str) -> Any:
+        return self._load()[key]
+    
+    def __iter__(self):
+        return iter(self._load())
+    
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+def _checkpoint_config(
+    thread_id: str, checkpoint_ns: str, checkpoint_id: str
+) -> RunnableConfig:
+    """构建指向某个检查点的配置"""
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
+def _doc_to_tuple(
+    doc: dict,
+    checkpoint: Checkpoint,
+    metadata: CheckpointMetadata,
+    pending_writes: list[Tuple[str, str, Any]],
+) -> CheckpointTuple:
+    """由检查点文档和已反序列化的数据构建 CheckpointTuple"""
+    parent_config = None
+    if doc.get("parent_checkpoint_id"):
+        parent_config = _checkpoint_config(
+            doc["thread_id"], doc["checkpoint_ns"], doc["parent_checkpoint_id"]
+        )
+    return CheckpointTuple(
+        config=_checkpoint_config(doc["thread_id"], doc["checkpoint_ns"], doc["checkpoint_id"]),
+        checkpoint=checkpoint,
+        metadata=metadata,
+        parent_config=parent_config,
+        pending_writes=pending_writes,
+    )
+
+
+def _pending_writes_query(docs: Sequence[dict]) -> dict:
+    """
+    构建一批检查点的待处理写入查询
+    
+    同一线程和命名空间下的检查点合并为一个 $in 条件，可以命中写入集合的索引。
+    """
+    groups: dict[Tuple[str, str], list[str]] = defaultdict(list)
+    for doc in docs:
+        groups[(doc["thread_id"], doc["checkpoint_ns"])].append(doc["checkpoint_id"])
+    clauses = [
+        {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": {"$in": ids}}
+        for (thread_id, checkpoint_ns), ids in groups.items()
+    ]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _group_pending_writes(
+    serde: SerializerProtocol, write_docs
+) -> dict[Tuple[str, str, str], list[Tuple[str, str, Any]]]:
+    """按 (thread_id, checkpoint_ns, checkpoint_id) 分组待处理写入"""
+    grouped = defaultdict(list)
+    for doc in sorted(write_docs, key=lambda d: (d["task_id"], d["idx"])):
+        key = (doc["thread_id"], doc["checkpoint_ns"], doc["checkpoint_id"])
+        grouped[key].append(
+            (doc["task_id"], doc["channel"], serde.loads_typed(doc["value_data"]))
+        )
+    return grouped
+
+
+def _writes_key(doc: dict) -> Tuple[str, str, str]:
+    """检查点文档对应的待处理写入分组键"""
+    return (doc["thread_id"], doc["checkpoint_ns"], doc["checkpoint_id"])
+
+
+def _writes_stamp_op(config: RunnableConfig, stamp: str) -> UpdateOne:
+    """
+    更新检查点文档的写入戳
+
+    每次 put_writes 都为对应检查点生成新的写入戳（在写入之后写入，见 WRITE_ORDER），
+    缓存只需比较写入戳即可判断待处理写入是否有变化（包括重写同一写入，如再次 put_resume）
+    """
+    return UpdateOne(
+        {
+            "thread_id": config["configurable"]["thread_id"],
+            "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+            "checkpoint_id": get_checkpoint_id(config),
+        },
+        {"$set": {"writes_stamp": stamp}},
+    )
+
+
+def _stamp_query(cached: CheckpointTuple, latest: bool) -> Tuple[dict, Optional[list]]:
+    """缓存校验查询：latest 时查询线程的最新检查点，否则查询缓存的检查点本身"""
+    configurable = cached.config["configurable"]
+    query = {"thread_id": configurable["thread_id"], "checkpoint_ns": configurable["checkpoint_ns"]}
+    if not latest:
+        query["checkpoint_id"] = configurable["checkpoint_id"]
+    return query, [("checkpoint_id", DESCENDING)]
+
+
+def _check_stamp(
+    cache: LatestCheckpointCache,
+    cached: CheckpointTuple,
+    writes_stamp: Optional[str],
+    doc: Optional[dict],
+) -> Optional[CheckpointTuple]:
+    """比较缓存校验查询的结果，不一致时删除缓存条目（本次读取计为未命中）"""
+    configurable = cached.config["configurable"]
+    if (
+        not doc
+        or doc["checkpoint_id"] != configurable["checkpoint_id"]
+        or doc.get("writes_stamp") != writes_stamp
+    ):
+        cache.reject(configurable["thread_id"], configurable["checkpoint_ns"])
+        return None
+    return cached
+
+
+def _search_index_keys(metadata_indexes: Sequence[str]) -> list[list[Tuple[str, int]]]:
+    """
+    跨线程检索使用的索引
+    
+    每个声明的元数据键建立 (metadata.<key>, created_at, checkpoint_id) 复合索引，
+    等值过滤后按时间范围和排序字段扫描索引即可。
+    """
+    return [SEARCH_SORT] + [[(f"metadata.{key}", 1)] + SEARCH_SORT for key in metadata_indexes]
+
+
+def _list_query(
+    config: Optional[RunnableConfig],
+    filter: Optional[dict[str, Any]],
+    before: Optional[RunnableConfig],
+) -> Tuple[dict, list[Tuple[str, int]]]:
+    """
+    构建 list() 的查询条件和排序
+    
+    config 中没有 thread_id 时跨线程列出，按 SEARCH_SORT 排序；
+    否则列出该线程（命名空间）的检查点，按 checkpoint_id 倒序。
+    """
+    configurable = (config or {}).get("configurable", {})
+    thread_id = configurable.get("thread_id")
+    if thread_id is None:
+        query, sort = {}, SEARCH_SORT
+    else:
+        query = {
+            "thread_id": thread_id,
+            "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+        }
+        sort = [("checkpoint_id", DESCENDING)]
+    
+    # checkpoint_id 按时间有序，跨线程时同样可以用于 before 条件
+    if before:
+        before_checkpoint_id = get_checkpoint_id(before)
+        if before_checkpoint_id:
+            query["checkpoint_id"] = {"$lt": before_checkpoint_id}
+    
+    if filter:
+        for key, value in filter.items():
+            query[f"metadata.{key}"] = value
+    return query, sort
+
+
+def _search_query(
+    filter: Optional[dict[str, Any]],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    after: Optional[dict],
+) -> dict:
+    """构建跨线程检索的查询条件（after 为上一页返回的游标）"""
+    query: dict[str, Any] = {f"metadata.{key}": value for key, value in (filter or {}).items()}
+    created_at = {}
+    if since is not None:
+        created_at["$gte"] = since
+    if until is not None:
+        created_at["$lt"] = until
+    if created_at:
+        query["created_at"] = created_at
+    if after:
+        keyset = {"$or": [
+            {"created_at": {"$lt": after["created_at"]}},
+            {"created_at": after["created_at"], "checkpoint_id": {"$lt": after["checkpoint_id"]}},
+        ]}
+        query = {"$and": [query, keyset]} if query else keyset
+    return query
+
+
+def _namespace_pipeline(thread_id: str, prefix: str) -> list[dict]:
+    """
+    构建获取线程内各命名空间最新检查点的聚合管道
+    
+    前缀条件是锚定的正则，排序与 (thread_id, checkpoint_ns, checkpoint_id) 索引一致，
+    $group 取每个命名空间的第一个文档即为最新检查点。
+    """
+    match: dict[str, Any] = {"thread_id": thread_id}
+    if prefix:
+        match["checkpoint_ns"] = {"$regex": f"^{re.escape(prefix)}"}
+    return [
+        {"$match": match},
+        {"$sort": {"thread_id": 1, "checkpoint_ns": 1, "checkpoint_id": -1}},
+        {"$group": {"_id": "$checkpoint_ns", "doc": {"$first": "$$ROOT"}}},
+    ]
+
+
+def _change_stream_pipeline(
+    thread_id: Optional[str], channels: Optional[Sequence[str]]
+) -> list[dict]:
+    """
+    构建数据库级 change stream 的管道
+    
+    只关注检查点和待处理写入集合的插入/更新，并只保留定位线程所需的字段，
+    updateLookup 取回的完整文档中的检查点数据不会发送到客户端。
+    put_writes 对检查点文档写入戳的更新不是新的检查点（不更新 created_at），不产生检查点事件。
+    """
+    match: dict[str, Any] = {"operationType": {"$in": ["insert", "update", "replace"]}}
+    if channels:
+        match["ns.coll"] = "checkpoint_writes"
+        match["fullDocument.channel"] = {"$in": list(channels)}
+    else:
+        match["$or"] = [
+            {"ns.coll": "checkpoint_writes"},
+            {"ns.coll": "checkpoints", "operationType": {"$in": ["insert", "replace"]}},
+            {"ns.coll": "checkpoints", "updateDescription.updatedFields.created_at": {"$exists": True}},
+        ]
+    if thread_id is not None:
+        match["fullDocument.thread_id"] = thread_id
+    project = {"ns": 1, **{f"fullDocument.{field}": 1 for field in SUBSCRIBE_FIELDS}}
+    return [{"$match": match}, {"$project": project}]
+
+
+def _poll_query(
+    collection_name: str,
+    since: datetime,
+    thread_id: Optional[str],
+    channels: Optional[Sequence[str]],
+) -> Optional[dict]:
+    """轮询模式下某个集合的查询条件，不需要查询该集合时返回 None"""
+    if channels and collection_name != "checkpoint_writes":
+        return None
+    query: dict[str, Any] = {"created_at": {"$gte": since}}
+    if thread_id is not None:
+        query["thread_id"] = thread_id
+    if channels:
+        query["channel"] = {"$in": list(channels)}
+    return query
+
+
+def _change_event(collection_name: str, doc: Optional[dict], token: Any = None) -> Optional[dict]:
+    """将检查点或写入文档转换为订阅事件（文档已被删除时返回 None）"""
+    if not doc:
+        return None
+    event = {
+        "type": "checkpoint" if collection_name == "checkpoints" else "write",
+        "thread_id": doc["thread_id"],
+        "checkpoint_ns": doc.get("checkpoint_ns", ""),
+        "checkpoint_id": doc["checkpoint_id"],
+        "token": token,
+    }
+    if collection_name == "checkpoint_writes":
+        event["channel"] = doc.get("channel")
+        event["task_id"] = doc.get("task_id")
+    return event
+
+
+def _collect_polled(
+    polled: Sequence[Tuple[str, dict]], since: datetime, seen: set
+) -> Tuple[list[dict], datetime, set]:
+    """
+    整理一轮轮询结果
+    
+    查询条件是 created_at >= since，边界时间戳上已经返回过的文档记录在 seen 中，
+    避免重复通知；去重键包含 created_at，同一文档被重新写入（如再次 put_resume）时仍会通知。
+    返回 (事件, 新的 since, 新的 seen)。
+    """
+    fresh = sorted(
+        (
+            (doc["created_at"], name, doc)
+            for name, doc in polled
+            if (name, doc["_id"], doc["created_at"]) not in seen
+        ),
+        key=lambda item: item[0],
+    )
+    if not fresh:
+        return [], since, seen
+    latest = fresh[-1][0]
+    boundary = {(name, doc["_id"], created_at) for created_at, name, doc in fresh if created_at == latest}
+    if latest == since:
+        boundary |= seen
+    return [_change_event(name, doc) for _, name, doc in fresh], latest, boundary
+
+
+def _supports_change_streams(hello: Optional[dict]) -> bool:
+    """根据 hello 命令的结果判断是否支持 change stream：只有副本集成员和 mongos 支持"""
+    return bool(hello) and (bool(hello.get("setName")) or hello.get("msg") == "isdbgrid")
+
+
+def _search_cursor(docs: Sequence[dict], limit: int) -> Optional[dict]:
+    """由一页结果生成下一页的游标，不足一页时说明没有更多数据"""
+    if len(docs) < limit:
+        return None
+    return {"created_at": docs[-1]["created_at"], "checkpoint_id": docs[-1]["checkpoint_id"]}
+
+
+def _split_checkpoint(checkpoint: Checkpoint) -> Tuple[Checkpoint, list[list[Any]]]:
+    """
+    拆分检查点：channel_values 单独按 (channel, version) 存储为 blob
+    
+    Returns:
+        (不含 channel_values 的检查点, 当前引用的 [channel, version] 列表)
+    """
+    stripped = {**checkpoint, "channel_values": {}}
+    blob_refs = [
+        [channel, version] for channel, version in checkpoint["channel_versions"].items()
+    ]
+    return stripped, blob_refs
+
+
+def _build_blob_ops(
+    serde: SerializerProtocol,
+    thread_id: str,
+    checkpoint_ns: str,
+    channel_values: dict[str, Any],
+    new_versions: dict[str, Any],
+) -> list[UpdateOne]:
+    """
+    构建本次检查点新增的通道 blob 写入操作（只包含 new_versions 中的通道）
+    
+    同一 (channel, version) 的值不会改变，因此使用 $setOnInsert，重复写入不会覆盖。
+    """
+    ops = []
+    for channel, version in new_versions.items():
+        key = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "channel": channel,
+            "version": version,
+        }
+        if channel in channel_values:
+            value_data = serde.dumps_typed(channel_values[channel])
+        else:
+            # 通道被清空，记录空值以便组装时跳过
+            value_data = ("empty", b"")
+        doc = {**key, "value_data": value_data, "created_at": datetime.now(timezone.utc)}
+        ops.append(UpdateOne(key, {"$setOnInsert": doc}, upsert=True))
+    return ops
+
+
+def _blobs_query(docs: Sequence[dict]) -> Optional[dict]:
+    """构建一批检查点所引用的 blob 查询（相同引用只查询一次），无引用时返回 None"""
+    groups: dict[Tuple[str, str], dict[Tuple[str, Any], None]] = defaultdict(dict)
+    for doc in docs:
+        for channel, version in doc.get("blob_refs") or []:
+            groups[(doc["thread_id"], doc["checkpoint_ns"])][(channel, version)] = None
+    clauses = [
+        {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "$or": [{"channel": channel, "version": version} for channel, version in refs],
+        }
+        for (thread_id, checkpoint_ns), refs in groups.items()
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _group_blobs(blob_docs) -> dict[Tuple[str, str, str, Any], Any]:
+    """按 (thread_id, checkpoint_ns, channel, version) 索引 blob（保持序列化形式）"""
+    return {
+        (doc["thread_id"], doc["checkpoint_ns"], doc["channel"], doc["version"]): doc["value_data"]
+        for doc in blob_docs
+    }
+
+
+def _assemble_checkpoint(
+    serde: SerializerProtocol, doc: dict, blobs: dict[Tuple[str, str, str, Any], Any]
+) -> Checkpoint:
+    """由检查点文档和引用的 blob 重新组装完整检查点（兼容整体存储的旧文档）"""
+    checkpoint = serde.loads_typed(doc["checkpoint_data"])
+    if "blob_refs" not in doc:
+        return checkpoint
+    channel_values = {}
+    for channel, version in doc["blob_refs"]:
+        value_data = blobs.get((doc["thread_id"], doc["checkpoint_ns"], channel, version))
+        if value_data is None or value_data[0] == "empty":
+            continue
+        channel_values[channel] = serde.loads_typed(value_data)
+    checkpoint["channel_values"] = channel_values
+    return checkpoint
+
+
+class LatestCheckpointCache:
+    """
+    最新检查点的进程内 LRU 缓存
+    
+    按 (thread_id, checkpoint_ns) 缓存最新的检查点及其待处理写入，
+    put/put_writes 写穿更新，get_tuple 命中时无需反序列化检查点，也不需要读取 blob 和写入内容。
+    每次命中都要先校验：一次只返回 checkpoint_id 和写入戳的查询，检查点仍是最新的，
+    并且写入戳（put 时生成、每次 put_writes 更新）与缓存一致；其他进程写入新检查点、
+    新增或重写待处理写入（如 put_resume）时缓存失效。未命中时写入戳随检查点文档一起读取，不增加查询。
+    """
+    
+    def __init__(self, maxsize: int):
+        """
+        初始化缓存
+        
+        Args:
+            maxsize: 最多缓存的线程数
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(
+        self, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str] = None
+    ) -> Optional[Tuple[CheckpointTuple, Optional[str]]]:
+        """
+        读取缓存
+        
+        Returns:
+            (缓存的检查点元组, 缓存时的写入戳)，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get((thread_id, checkpoint_ns))
+            if entry is None or (checkpoint_id and checkpoint_id != entry["checkpoint_id"]):
+                self.misses += 1
+                return None
+            self._entries.move_to_end((thread_id, checkpoint_ns))
+            self.hits += 1
+            return self._to_tuple(entry), entry["writes_stamp"]
+    
+    @staticmethod
+    def _to_tuple(entry: dict) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=entry["config"],
+            checkpoint=copy_checkpoint(entry["checkpoint"]),
+            metadata=entry["metadata"],
+            parent_config=entry["parent_config"],
+            pending_writes=[entry["writes"][key] for key in sorted(entry["writes"])],
+        )
+    
+    def put(self, checkpoint_tuple: CheckpointTuple, writes_stamp: Optional[str]):
+        """
+        缓存线程的最新检查点
+        
+        Args:
+            checkpoint_tuple: 检查点元组
+            writes_stamp: 检查点文档的写入戳（在待处理写入之前读取）
+        """
+        configurable = checkpoint_tuple.config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        # 按任务内的序号建立幂等键（特殊写入使用固定序号），与 add_writes 保持一致
+        writes = {}
+        task_counts: dict[str, int] = defaultdict(int)
+        for task_id, channel, value in checkpoint_tuple.pending_writes or []:
+            if channel in WRITES_IDX_MAP:
+                writes[(task_id, WRITES_IDX_MAP[channel])] = (task_id, channel, value)
+                continue
+            writes[(task_id, task_counts[task_id])] = (task_id, channel, value)
+            task_counts[task_id] += 1
+        entry = {
+            "checkpoint_id": configurable["checkpoint_id"],
+            "config": checkpoint_tuple.config,
+            "checkpoint": copy_checkpoint(checkpoint_tuple.checkpoint),
+            "metadata": checkpoint_tuple.metadata,
+            "parent_config": checkpoint_tuple.parent_config,
+            "writes": writes,
+            "writes_stamp": writes_stamp,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def add_writes(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        writes_stamp: str,
+    ):
+        """
+        把待处理写入合并到缓存的检查点（与数据库相同的 (task_id, idx) 幂等键），
+        写入戳更新为本次写入的写入戳
+        """
+        with self._lock:
+            entry = self._entries.get((thread_id, checkpoint_ns))
+            if entry is None or entry["checkpoint_id"] != checkpoint_id:
+                return
+            for idx, (channel, value) in enumerate(writes):
+                entry["writes"][(task_id, WRITES_IDX_MAP.get(channel, idx))] = (task_id, channel, value)
+            entry["writes_stamp"] = writes_stamp
+    
+    def reject(self, thread_id: str, checkpoint_ns: str):
+        """命中的条目没有通过校验：删除条目，本次读取计为未命中"""
+        with self._lock:
+            self._entries.pop((thread_id, checkpoint_ns), None)
+            self.hits -= 1
+            self.misses += 1
+    
+    def invalidate(self, thread_id: str, checkpoint_ns: Optional[str] = None):
+        """使线程的缓存失效（不指定 checkpoint_ns 时清除该线程的所有命名空间）"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == thread_id and (checkpoint_ns is None or key[1] == checkpoint_ns):
+                    del self._entries[key]
 
 
 class MongoDBSaver(BaseCheckpointSaver):
@@ -53,6 +859,7 @@ class MongoDBSaver(BaseCheckpointSaver):
     db: Database
     checkpoints_collection: Collection
     writes_collection: Collection
+    blobs_collection: Collection
     
     def __init__(
         self,
@@ -60,6 +867,17 @@ class MongoDBSaver(BaseCheckpointSaver):
         db_name: str = "langgraph",
         *,
         serde: Optional[SerializerProtocol] = None,
+        lazy_checkpoints: bool = False,
+        list_page_size: int = LIST_PAGE_SIZE,
+        compression_level: Optional[int] = None,
+        compression_dictionary: Optional[bytes] = None,
+        cache_size: int = 0,
+        durability: str = "sync",
+        write_queue_size: int = WRITE_QUEUE_SIZE,
+        keep_last: Optional[int] = None,
+        max_age: Optional[float] = None,
+        ttl_seconds: Optional[int] = None,
+        metadata_indexes: Sequence[str] = (),
     ):
         """
         初始化 MongoDB Checkpointer
@@ -68,12 +886,71 @@ class MongoDBSaver(BaseCheckpointSaver):
             client: MongoDB 客户端实例
             db_name: 数据库名称
             serde: 序列化器，默认使用 JsonPlusSerializer
+            lazy_checkpoints: list() 是否延迟反序列化 checkpoint_data
+            list_page_size: list() 每页读取的检查点数量
+            compression_level: zstd 压缩级别，设置后写入时压缩；安装了 zstandard 时无论是否设置都能读取压缩数据
+            compression_dictionary: 训练好的 zstd 字典（可选）
+            cache_size: 最新检查点缓存的线程数，0 表示不启用缓存
+            durability: 持久化模式，sync、batched 或 async（见 DURABILITY_WRITE_CONCERNS）
+            write_queue_size: async 模式后台队列容量
+            keep_last: 每个线程（命名空间）保留的检查点数量，None 表示不限制
+            max_age: 检查点保留时间（秒），None 表示不限制
+            ttl_seconds: 在 created_at 上创建 TTL 索引，超时的检查点和写入由 MongoDB 自动删除
+            metadata_indexes: 需要建立二级索引的元数据键，用于 search() 和跨线程 list() 的过滤
         """
         super().__init__(serde=serde)
+        # 安装了 zstandard 时总是可以读取其他实例写入的压缩数据，只有写入时的压缩需要开启
+        if compression_level is not None or zstandard is not None:
+            self.serde = CompressedSerializer(
+                self.serde, level=compression_level, dictionary=compression_dictionary
+            )
+        self.lazy_checkpoints = lazy_checkpoints
+        self.list_page_size = list_page_size
+        self.cache = LatestCheckpointCache(cache_size) if cache_size > 0 else None
+        if durability not in DURABILITY_WRITE_CONCERNS:
+            raise ValueError(f"不支持的持久化模式: {durability}")
+        self.durability = durability
+        write_concern = DURABILITY_WRITE_CONCERNS[durability]
         self.client = client
         self.db = client[db_name]
-        self.checkpoints_collection = self.db["checkpoints"]
-        self.writes_collection = self.db["checkpoint_writes"]
+        self.checkpoints_collection = self.db.get_collection("checkpoints", write_concern=write_concern)
+        self.writes_collection = self.db.get_collection("checkpoint_writes", write_concern=write_concern)
+        self.blobs_collection = self.db.get_collection("checkpoint_blobs", write_concern=write_concern)
+        self._collections = {
+            "checkpoints": self.checkpoints_collection,
+            "checkpoint_writes": self.writes_collection,
+            "checkpoint_blobs": self.blobs_collection,
+        }
+        # 本进程已写入过完整通道 blob 的 (thread_id, checkpoint_ns)
+        self._blob_threads: set[Tuple[str, str]] = set()
+        
+        # batched 模式缓存的写入操作：集合名 -> 操作列表
+        self._pending_ops: dict[str, list] = defaultdict(list)
+        self._pending_lock = threading.Lock()
+        # bulk() 上下文按线程生效：size 为批量写入大小，ops 为该线程缓存的写入操作
+        self._bulk = threading.local()
+        # async 模式后台写入失败的异常，由下一次 flush() 抛出
+        self._write_error: Optional[BaseException] = None
+        
+        # async 模式的后台写入线程
+        self._queue: Optional[queue.Queue] = None
+        if durability == "async":
+            self._queue = queue.Queue(maxsize=write_queue_size)
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="mongodb-checkpoint-flusher", daemon=True
+            )
+            self._flusher.start()
+        
+        # 保留策略
+        self.keep_last = keep_last
+        self.max_age = max_age
+        self.ttl_seconds = ttl_seconds
+        self._compactor: Optional[threading.Thread] = None
+        self._compactor_stop = threading.Event()
+        
+        self.metadata_indexes = tuple(metadata_indexes)
+        # 是否支持 change stream，第一次订阅时检测
+        self._change_streams: Optional[bool] = None
         
         # 创建索引以提高查询性能
         self._setup_indexes()
@@ -89,10 +966,31 @@ class MongoDBSaver(BaseCheckpointSaver):
             [("thread_id", 1), ("checkpoint_ns", 1)],
         )
         
+        # 跨线程检索索引（按时间倒序，以及声明的元数据键）
+        for keys in _search_index_keys(self.metadata_indexes):
+            self.checkpoints_collection.create_index(keys)
+        
         # 写入集合索引
         self.writes_collection.create_index(
             [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", 1)],
         )
+        # 订阅的轮询模式按 created_at 查询新写入
+        self.writes_collection.create_index(SEARCH_SORT)
+        
+        # 通道 blob 集合索引
+        self.blobs_collection.create_index(
+            [("thread_id", 1), ("checkpoint_ns", 1), ("channel", 1), ("version", 1)],
+            unique=True
+        )
+        
+        # TTL 索引（blob 可能被多个检查点共享，不设置 TTL，由 compact 清理）
+        if self.ttl_seconds:
+            self.checkpoints_collection.create_index(
+                "created_at", expireAfterSeconds=self.ttl_seconds
+            )
+            self.writes_collection.create_index(
+                "created_at", expireAfterSeconds=self.ttl_seconds
+            )
     
     @classmethod
     def from_conn_string(
@@ -101,6 +999,7 @@ class MongoDBSaver(BaseCheckpointSaver):
         db_name: str = "langgraph",
         *,
         serde: Optional[SerializerProtocol] = None,
+        **kwargs: Any,
     ) -> "MongoDBSaver":
         """
         从连接字符串创建 MongoDBSaver 实例
@@ -109,12 +1008,13 @@ class MongoDBSaver(BaseCheckpointSaver):
             conn_string: MongoDB 连接字符串，如 "mongodb://localhost:27017"
             db_name: 数据库名称
             serde: 序列化器
+            **kwargs: 其他构造参数
             
         Returns:
             MongoDBSaver 实例
         """
         client = MongoClient(conn_string)
-        return cls(client, db_name, serde=serde)
+        return cls(client, db_name, serde=serde, **kwargs)
     
     @contextmanager
     def _get_connection(self):
@@ -148,6 +1048,119 @@ class MongoDBSaver(BaseCheckpointSaver):
         """反序列化待处理写入"""
         return self.serde.loads_typed(data)
     
+    def _bulk_write(self, grouped: dict[str, list], ordered: bool) -> None:
+        """按 WRITE_ORDER 顺序对每个集合执行一次批量写入"""
+        for name in WRITE_ORDER:
+            if grouped.get(name):
+                self._collections[name].bulk_write(grouped[name], ordered=ordered)
+    
+    def _submit(self, grouped: dict[str, list], boundary: bool) -> None:
+        """
+        按持久化模式提交写入操作
+        
+        Args:
+            grouped: 集合名 -> 写入操作列表
+            boundary: 是否为超级步边界（batched 模式在边界处合并写入）
+        """
+        bulk_size = getattr(self._bulk, "size", None)
+        if bulk_size:
+            for name, ops in grouped.items():
+                self._bulk.ops[name].extend(ops)
+            if sum(len(ops) for ops in self._bulk.ops.values()) >= bulk_size:
+                self._flush_bulk()
+        elif self.durability == "sync":
+            self._bulk_write(grouped, ordered=False)
+        elif self.durability == "batched":
+            with self._pending_lock:
+                for name, ops in grouped.items():
+                    self._pending_ops[name].extend(ops)
+            if boundary:
+                self.flush()
+        else:
+            # 队列满时阻塞，避免后台写入跟不上时内存无限增长
+            self._queue.put(grouped)
+    
+    def _flush_loop(self) -> None:
+        """async 模式的后台写入线程：合并队列中的提交后批量写入"""
+        while True:
+            items = [self._queue.get()]
+            while len(items) < WRITE_FLUSH_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            grouped: dict[str, list] = defaultdict(list)
+            for item in items:
+                for name, ops in (item or {}).items():
+                    grouped[name].extend(ops)
+            try:
+                if grouped:
+                    # 合并了多次提交，保持提交顺序以便后写入的值覆盖先写入的值
+                    self._bulk_write(grouped, ordered=True)
+            except Exception as e:
+                # 记录下来由 flush()/close() 抛出，不能让调用方以为数据已经写入
+                self._write_error = self._write_error or e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if None in items:
+                return
+    
+    def flush(self) -> None:
+        """
+        写入尚未持久化的数据
+        
+        async 模式等待后台队列清空，batched 模式和当前线程 bulk() 上下文中缓存的操作立即写入。
+        读取前会自动调用，保证读到本进程已提交的写入。
+        
+        Raises:
+            async 模式下后台写入失败时抛出该异常（此前提交的部分数据已经丢失）
+        """
+        if self.durability == "async":
+            self._queue.join()
+            error, self._write_error = self._write_error, None
+            if error is not None:
+                raise error
+        with self._pending_lock:
+            grouped, self._pending_ops = self._pending_ops, defaultdict(list)
+        if grouped:
+            self._bulk_write(grouped, ordered=True)
+        self._flush_bulk()
+    
+    def _flush_bulk(self) -> None:
+        """写入当前线程 bulk() 上下文中缓存的操作"""
+        grouped = getattr(self._bulk, "ops", None)
+        if grouped:
+            self._bulk.ops = defaultdict(list)
+            self._bulk_write(grouped, ordered=True)
+    
+    @contextmanager
+    def bulk(self, batch_size: int = BULK_BATCH_SIZE):
+        """
+        批量导入上下文
+        
+        当前线程在上下文中的 put/put_writes 不再逐次（或按超级步）写入，而是累计 batch_size 个
+        写入操作后合并为一次有序批量写入，退出时写入剩余数据；其他线程的写入不受影响。
+        用于迁移、导入大量检查点，多个线程并行导入时各自进入上下文。
+        
+            with saver.bulk():
+                for ...:
+                    saver.put(...)
+        """
+        previous = getattr(self._bulk, "size", None)
+        if previous is None:
+            self._bulk.ops = defaultdict(list)
+        self._bulk.size = batch_size
+        try:
+            yield self
+        finally:
+            self._bulk.size = previous
+            self._flush_bulk()
+    
+    def get_next_version(self, current: Any, channel: Any) -> Any:
+        """生成通道的下一个版本号（每次写入唯一，分叉的分支不会相互覆盖 blob）"""
+        return _next_version(current)
+    
     def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
         """
         获取检查点元组
@@ -165,6 +1178,17 @@ class MongoDBSaver(BaseCheckpointSaver):
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
         checkpoint_id = get_checkpoint_id(config)
         
+        # 读取前写入本进程尚未持久化的数据
+        self.flush()
+        
+        # 优先读取进程内缓存（每次命中都校验）
+        if self.cache is not None:
+            cached = self.cache.get(thread_id, checkpoint_ns, checkpoint_id)
+            if cached is not None:
+                checkpoint_tuple = self._validate_cached(*cached, latest=not checkpoint_id)
+                if checkpoint_tuple is not None:
+                    return checkpoint_tuple
+        
         # 构建查询条件
         query = {
             "thread_id": thread_id,
@@ -183,42 +1207,50 @@ class MongoDBSaver(BaseCheckpointSaver):
         if not doc:
             return None
         
-        # 反序列化数据
-        checkpoint = self._deserialize_checkpoint(doc["checkpoint_data"])
-        metadata = self._deserialize_metadata(doc["metadata_data"])
-        
-        # 获取待处理写入
+        # 获取待处理写入和检查点引用的通道 blob（写入戳随检查点文档在写入之前读取：
+        # 之后发生的写入只会让缓存多失效一次，不会被漏掉）
         pending_writes = self._get_pending_writes(
             thread_id, checkpoint_ns, doc["checkpoint_id"]
         )
+        blobs = self._get_blobs([doc])
         
-        # 构建配置
-        checkpoint_config = {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": doc["checkpoint_id"],
-            }
-        }
-        
-        # 构建父配置
-        parent_config = None
-        if doc.get("parent_checkpoint_id"):
-            parent_config = {
-                "configurable": {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": doc["parent_checkpoint_id"],
-                }
-            }
-        
-        return CheckpointTuple(
-            config=checkpoint_config,
-            checkpoint=checkpoint,
-            metadata=metadata,
-            parent_config=parent_config,
-            pending_writes=pending_writes,
-        )
+        checkpoint_tuple = self._load_tuple(doc, pending_writes, blobs)
+        if self.cache is not None and not checkpoint_id:
+            self.cache.put(checkpoint_tuple, doc.get("writes_stamp"))
+        return checkpoint_tuple
+    
+    def _validate_cached(
+        self, cached: CheckpointTuple, writes_stamp: Optional[str], latest: bool
+    ) -> Optional[CheckpointTuple]:
+        """
+        校验缓存命中：latest 为 True（未指定 checkpoint_id）时检查点必须仍是线程的最新检查点，
+        并且写入戳与缓存一致；一次只返回 checkpoint_id 和写入戳的查询
+        """
+        query, sort = _stamp_query(cached, latest)
+        doc = self.checkpoints_collection.find_one(query, sort=sort, projection=STAMP_PROJECTION)
+        return _check_stamp(self.cache, cached, writes_stamp, doc)
+    
+    def _get_blobs(self, docs: Sequence[dict]) -> dict[Tuple[str, str, str, Any], Any]:
+        """一次查询获取一批检查点引用的通道 blob"""
+        query = _blobs_query(docs)
+        if query is None:
+            return {}
+        return _group_blobs(self.blobs_collection.find(query))
+    
+    def _load_tuple(
+        self,
+        doc: dict,
+        pending_writes: list[Tuple[str, str, Any]],
+        blobs: dict[Tuple[str, str, str, Any], Any],
+        lazy: bool = False,
+    ) -> CheckpointTuple:
+        """反序列化检查点文档（lazy 为 True 时检查点延迟到首次访问时组装）"""
+        if lazy:
+            checkpoint = LazyCheckpoint(lambda: _assemble_checkpoint(self.serde, doc, blobs))
+        else:
+            checkpoint = _assemble_checkpoint(self.serde, doc, blobs)
+        metadata = self._deserialize_metadata(doc["metadata_data"])
+        return _doc_to_tuple(doc, checkpoint, metadata, pending_writes)
     
     def _get_pending_writes(
         self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
@@ -239,6 +1271,16 @@ class MongoDBSaver(BaseCheckpointSaver):
         
         return writes
     
+    def _get_pending_writes_batch(
+        self, docs: Sequence[dict]
+    ) -> dict[Tuple[str, str, str], list[Tuple[str, str, Any]]]:
+        """一次查询获取一批检查点的待处理写入，按检查点分组"""
+        if not docs:
+            return {}
+        return _group_pending_writes(
+            self.serde, self.writes_collection.find(_pending_writes_query(docs))
+        )
+    
     def list(
         self,
         config: Optional[RunnableConfig],
@@ -250,7 +1292,8 @@ class MongoDBSaver(BaseCheckpointSaver):
         """
         列出检查点历史
         
-        按时间倒序返回匹配的检查点列表。
+        按时间倒序返回匹配的检查点列表。config 为 None（或不含 thread_id）时跨线程列出，
+        按 (created_at, checkpoint_id) 倒序排列，过滤条件建议只使用 metadata_indexes 中声明的键。
         
         Args:
             config: 运行配置
@@ -261,72 +1304,118 @@ class MongoDBSaver(BaseCheckpointSaver):
         Yields:
             CheckpointTuple 对象
         """
-        thread_id = config["configurable"]["thread_id"]
-        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        
-        # 构建查询条件
-        query = {
-            "thread_id": thread_id,
-            "checkpoint_ns": checkpoint_ns,
-        }
-        
-        # 添加 before 条件
-        if before:
-            before_checkpoint_id = get_checkpoint_id(before)
-            if before_checkpoint_id:
-                query["checkpoint_id"] = {"$lt": before_checkpoint_id}
+        self.flush()
         
-        # 添加自定义过滤条件
-        if filter:
-            for key, value in filter.items():
-                query[f"metadata.{key}"] = value
-        
-        # 执行查询
-        cursor = self.checkpoints_collection.find(
-            query,
-            sort=[("checkpoint_id", DESCENDING)]
-        )
+        query, sort = _list_query(config, filter, before)
+        cursor = self.checkpoints_collection.find(query, sort=sort).batch_size(self.list_page_size)
         
         if limit:
             cursor = cursor.limit(limit)
         
-        for doc in cursor:
-            # 反序列化数据
-            checkpoint = self._deserialize_checkpoint(doc["checkpoint_data"])
-            metadata = self._deserialize_metadata(doc["metadata_data"])
-            
-            # 获取待处理写入
-            pending_writes = self._get_pending_writes(
-                thread_id, checkpoint_ns, doc["checkpoint_id"]
+        # 按页读取，每页的待处理写入通过一次 $in 查询获取
+        while True:
+            page = list(islice(cursor, self.list_page_size))
+            if not page:
+                break
+            yield from self._load_page(page)
+    
+    def _load_page(self, page: list[dict]) -> list[CheckpointTuple]:
+        """一次查询获取一页检查点的待处理写入（blob 同样一次查询），并构建 CheckpointTuple"""
+        pending_writes = self._get_pending_writes_batch(page)
+        blobs = self._get_blobs(page)
+        return [
+            self._load_tuple(
+                doc, pending_writes.get(_writes_key(doc), []), blobs, self.lazy_checkpoints
             )
+            for doc in page
+        ]
+    
+    def search(
+        self,
+        filter: Optional[dict[str, Any]] = None,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[dict] = None,
+        limit: int = LIST_PAGE_SIZE,
+        metadata_only: bool = False,
+    ) -> Tuple[list[CheckpointTuple], Optional[dict]]:
+        """
+        跨线程检索检查点（按页返回）
+        
+        按 (created_at, checkpoint_id) 倒序做键集分页，翻页代价与页码无关。
+        例如查询最近一小时所有 source=input 的检查点：
+        
+            saver = MongoDBSaver(client, metadata_indexes=["source"])
+            page, cursor = saver.search({"source": "input"}, since=now - timedelta(hours=1))
+            while cursor:
+                page, cursor = saver.search({"source": "input"}, since=..., after=cursor)
+        
+        Args:
+            filter: 元数据过滤条件（建议只使用 metadata_indexes 中声明的键）
+            since: 只返回 created_at >= since 的检查点
+            until: 只返回 created_at < until 的检查点
+            after: 上一页返回的游标
+            limit: 每页数量
+            metadata_only: 只读取元数据（不读取检查点数据、blob 和待处理写入），
+                返回的 CheckpointTuple 中 checkpoint 和 pending_writes 为 None
             
-            # 构建配置
-            checkpoint_config = {
-                "configurable": {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": doc["checkpoint_id"],
-                }
-            }
-            
-            # 构建父配置
-            parent_config = None
-            if doc.get("parent_checkpoint_id"):
-                parent_config = {
-                    "configurable": {
-                        "thread_id": thread_id,
-                        "checkpoint_ns": checkpoint_ns,
-                        "checkpoint_id": doc["parent_checkpoint_id"],
-                    }
-                }
+        Returns:
+            (本页检查点, 下一页游标)，没有更多数据时游标为 None
+        """
+        self.flush()
+        
+        docs = list(self.checkpoints_collection.find(
+            _search_query(filter, since, until, after),
+            projection=METADATA_PROJECTION if metadata_only else None,
+            sort=SEARCH_SORT,
+            limit=limit,
+        ))
+        if metadata_only:
+            tuples = [
+                _doc_to_tuple(doc, None, self._deserialize_metadata(doc["metadata_data"]), None)
+                for doc in docs
+            ]
+        else:
+            tuples = self._load_page(docs) if docs else []
+        return tuples, _search_cursor(docs, limit)
+    
+    def get_namespace_tuples(
+        self, config: RunnableConfig, prefix: str = ""
+    ) -> dict[str, CheckpointTuple]:
+        """
+        获取线程内命名空间以 prefix 开头的各个命名空间的最新检查点
+        
+        父图和子图的检查点保存在不同的 checkpoint_ns 下，逐个调用 get_tuple 需要每个
+        命名空间一次查询；这里用一次聚合取回所有最新检查点，待处理写入和 blob 各一次批量查询。
+        启用缓存时结果会写入缓存，之后 get_state(subgraphs=True) 对各命名空间的
+        get_tuple 可以直接命中缓存。
+        
+        Args:
+            config: 运行配置，包含 thread_id
+            prefix: 命名空间前缀，默认 "" 表示所有命名空间（包括父图）
             
-            yield CheckpointTuple(
-                config=checkpoint_config,
-                checkpoint=checkpoint,
-                metadata=metadata,
-                parent_config=parent_config,
-                pending_writes=pending_writes,
-            )
+        Returns:
+            命名空间 -> 最新的 CheckpointTuple
+        """
+        self.flush()
+        
+        thread_id = config["configurable"]["thread_id"]
+        docs = [
+            group["doc"]
+            for group in self.checkpoints_collection.aggregate(_namespace_pipeline(thread_id, prefix))
+        ]
+        if not docs:
+            return {}
+        pending_writes = self._get_pending_writes_batch(docs)
+        blobs = self._get_blobs(docs)
+        result = {}
+        for doc in sorted(docs, key=lambda d: d["checkpoint_ns"]):
+            checkpoint_tuple = self._load_tuple(doc, pending_writes.get(_writes_key(doc), []), blobs)
+            if self.cache is not None:
+                self.cache.put(checkpoint_tuple, doc.get("writes_stamp"))
+            result[doc["checkpoint_ns"]] = checkpoint_tuple
+        return result
     
     def put(
         self,
@@ -338,7 +1427,8 @@ class MongoDBSaver(BaseCheckpointSaver):
         """
         保存检查点
         
-        将检查点及其元数据保存到 MongoDB。
+        将检查点及其元数据保存到 MongoDB。通道值按 (channel, version) 单独存储，
+        只写入 new_versions 中发生变化的通道，检查点文档只保存对 blob 的引用。
         
         Args:
             config: 运行配置
@@ -354,8 +1444,20 @@ class MongoDBSaver(BaseCheckpointSaver):
         checkpoint_id = checkpoint["id"]
         parent_checkpoint_id = get_checkpoint_id(config)
         
+        # 只写入本次发生变化的通道
+        stripped, blob_refs = _split_checkpoint(checkpoint)
+        # 进程内首次写入某线程时写入全部通道（兼容旧格式的父检查点），之后只写变化的通道
+        known = (thread_id, checkpoint_ns) in self._blob_threads
+        blob_ops = _build_blob_ops(
+            self.serde,
+            thread_id,
+            checkpoint_ns,
+            checkpoint["channel_values"],
+            new_versions if known else checkpoint["channel_versions"],
+        )
+        
         # 序列化数据
-        checkpoint_data = self._serialize_checkpoint(checkpoint)
+        checkpoint_data = self._serialize_checkpoint(stripped)
         metadata_data = self._serialize_metadata(metadata)
         
         # 保存到 MongoDB
@@ -365,12 +1467,14 @@ class MongoDBSaver(BaseCheckpointSaver):
             "checkpoint_id": checkpoint_id,
             "parent_checkpoint_id": parent_checkpoint_id,
             "checkpoint_data": checkpoint_data,
+            "blob_refs": blob_refs,
             "metadata_data": metadata_data,
             "metadata": dict(metadata) if metadata else {},
+            "writes_stamp": uuid.uuid4().hex,
             "created_at": datetime.now(timezone.utc),
         }
         
-        self.checkpoints_collection.update_one(
+        checkpoint_op = UpdateOne(
             {
                 "thread_id": thread_id,
                 "checkpoint_ns": checkpoint_ns,
@@ -380,6 +1484,16 @@ class MongoDBSaver(BaseCheckpointSaver):
             upsert=True
         )
         
+        # put 标志着超级步结束，batched 模式在此合并写入
+        self._submit(
+            {"checkpoint_blobs": blob_ops, "checkpoints": [checkpoint_op]}, boundary=True
+        )
+        self._blob_threads.add((thread_id, checkpoint_ns))
+        
+        # 写穿缓存
+        if self.cache is not None:
+            self.cache.put(_doc_to_tuple(doc, checkpoint, metadata, []), doc["writes_stamp"])
+        
         # 返回新的配置
         return {
             "configurable": {
@@ -413,30 +1527,126 @@ class MongoDBSaver(BaseCheckpointSaver):
         if not checkpoint_id:
             return
         
-        # 保存每个写入
-        for idx, (channel, value) in enumerate(writes):
-            doc = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-                "task_id": task_id,
-                "idx": idx,
-                "channel": channel,
-                "value_data": self.serde.dumps_typed(value),
-                "created_at": datetime.now(timezone.utc),
-            }
+        # 所有写入合并为一次无序批量写入（一次网络往返）；
+        # 中断、错误等特殊写入之后可能不再有 put，需要立即写入
+        ops = _build_write_ops(self.serde, config, writes, task_id)
+        if not ops:
+            return
+        stamp = uuid.uuid4().hex
+        self._submit(
+            {"checkpoint_writes": ops, "checkpoints": [_writes_stamp_op(config, stamp)]},
+            boundary=any(channel in WRITES_IDX_MAP for channel, _ in writes),
+        )
+        
+        if self.cache is not None:
+            self.cache.add_writes(thread_id, checkpoint_ns, checkpoint_id, writes, task_id, stamp)
+    
+    def subscribe(
+        self,
+        thread_id: Optional[str] = None,
+        *,
+        channels: Optional[Sequence[str]] = None,
+        start_after: Any = None,
+        poll_interval: float = SUBSCRIBE_POLL_INTERVAL,
+        stop_event: Optional[threading.Event] = None,
+    ) -> Iterator[dict]:
+        """
+        订阅检查点和待处理写入的变更
+        
+        优先使用 MongoDB change stream（需要副本集），新事件到达时立即返回，空闲时不产生查询；
+        单机 mongod 或 mongomock 不支持 change stream 时退化为按 created_at 轮询。
+        多个 worker 可以借此发现需要恢复执行的线程，例如订阅 RESUME 通道：
+        
+            for event in saver.subscribe(channels=[RESUME], stop_event=stop):
+                config = {"configurable": {"thread_id": event["thread_id"]}}
+                ...
+        
+        Args:
+            thread_id: 只订阅该线程，None 表示所有线程
+            channels: 只订阅这些通道的待处理写入（不再通知检查点），None 表示全部
+            start_after: 从某个事件的 token 之后继续订阅（仅 change stream 模式）
+            poll_interval: 轮询模式的查询间隔（秒）
+            stop_event: 设置后结束订阅
             
-            self.writes_collection.update_one(
-                {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": checkpoint_id,
-                    "task_id": task_id,
-                    "idx": idx,
-                },
-                {"$set": doc},
-                upsert=True
+        Yields:
+            事件字典：type（checkpoint/write）、thread_id、checkpoint_ns、checkpoint_id、
+            token（change stream 的恢复 token，轮询模式为 None），写入事件另有 channel 和 task_id
+        """
+        stop_event = stop_event or threading.Event()
+        if not self._change_streams_supported():
+            yield from self._poll_changes(thread_id, channels, poll_interval, stop_event)
+            return
+        try:
+            stream = self.db.watch(
+                _change_stream_pipeline(thread_id, channels),
+                full_document="updateLookup",
+                start_after=start_after,
+                max_await_time_ms=SUBSCRIBE_MAX_AWAIT_MS,
             )
+        except (OperationFailure, NotImplementedError):
+            yield from self._poll_changes(thread_id, channels, poll_interval, stop_event)
+            return
+        
+        with stream:
+            while stream.alive and not stop_event.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                event = _change_event(change["ns"]["coll"], change.get("fullDocument"), change["_id"])
+                if event is not None:
+                    yield event
+    
+    def _change_streams_supported(self) -> bool:
+        """检测部署是否支持 change stream（单机 mongod、mongomock 不支持）"""
+        if self._change_streams is None:
+            try:
+                hello = self.client.admin.command("hello")
+            except (OperationFailure, NotImplementedError):
+                hello = None
+            self._change_streams = _supports_change_streams(hello)
+        return self._change_streams
+    
+    def _poll_changes(
+        self,
+        thread_id: Optional[str],
+        channels: Optional[Sequence[str]],
+        poll_interval: float,
+        stop_event: threading.Event,
+    ) -> Iterator[dict]:
+        """轮询模式的订阅实现"""
+        since, seen = datetime.now(timezone.utc).replace(tzinfo=None), set()
+        projection = {field: 1 for field in SUBSCRIBE_FIELDS + ("created_at",)}
+        while not stop_event.is_set():
+            polled = []
+            for name in ("checkpoints", "checkpoint_writes"):
+                query = _poll_query(name, since, thread_id, channels)
+                if query is not None:
+                    polled.extend(
+                        (name, doc) for doc in self._collections[name].find(query, projection)
+                    )
+            events, since, seen = _collect_polled(polled, since, seen)
+            yield from events
+            stop_event.wait(poll_interval)
+    
+    def put_resume(self, config: RunnableConfig, value: Any) -> Optional[RunnableConfig]:
+        """
+        为处于中断状态的线程记录恢复值
+        
+        写入的待处理写入与 graph.invoke(Command(resume=value)) 相同，订阅了 RESUME 通道的
+        worker 会收到通知，再用 Command(resume=value) 恢复执行。
+        
+        Args:
+            config: 运行配置，包含 thread_id
+            value: 恢复值
+            
+        Returns:
+            写入的检查点配置，线程不存在时返回 None
+        """
+        latest = self.get_tuple(config)
+        if latest is None:
+            return None
+        self.put_writes(latest.config, [(RESUME, value)], NULL_TASK_ID)
+        return latest.config
     
     def delete_thread(self, thread_id: str) -> None:
         """
@@ -445,12 +1655,189 @@ class MongoDBSaver(BaseCheckpointSaver):
         Args:
             thread_id: 线程 ID
         """
+        # 先写入排队中的数据，避免删除后又被后台写入重新创建
+        self.flush()
         self.checkpoints_collection.delete_many({"thread_id": thread_id})
         self.writes_collection.delete_many({"thread_id": thread_id})
+        self.blobs_collection.delete_many({"thread_id": thread_id})
+        self._blob_threads = {key for key in self._blob_threads if key[0] != thread_id}
+        if self.cache is not None:
+            self.cache.invalidate(thread_id)
+    
+    def _thread_namespaces(self, collection: Collection, thread_id: Optional[str] = None):
+        """列出集合中出现的 (thread_id, checkpoint_ns)"""
+        pipeline = [
+            {"$match": {"thread_id": thread_id} if thread_id else {}},
+            {"$group": {"_id": {"thread_id": "$thread_id", "checkpoint_ns": "$checkpoint_ns"}}},
+        ]
+        return [
+            (doc["_id"]["thread_id"], doc["_id"]["checkpoint_ns"])
+            for doc in collection.aggregate(pipeline, allowDiskUse=True)
+        ]
+    
+    def _expired_checkpoint_ids(self, thread_id: str, checkpoint_ns: str) -> Iterator[str]:
+        """按保留策略列出需要删除的检查点（始终保留最新的检查点）"""
+        base = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        projection = {"checkpoint_id": 1, "_id": 0}
+        if self.keep_last is not None:
+            cursor = self.checkpoints_collection.find(
+                base, projection=projection, sort=[("checkpoint_id", DESCENDING)]
+            ).skip(max(self.keep_last, 1))
+            for doc in cursor:
+                yield doc["checkpoint_id"]
+        if self.max_age is not None:
+            latest = self.checkpoints_collection.find_one(
+                base, projection=projection, sort=[("checkpoint_id", DESCENDING)]
+            )
+            if latest is None:
+                return
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+            cursor = self.checkpoints_collection.find(
+                {
+                    **base,
+                    "checkpoint_id": {"$lt": latest["checkpoint_id"]},
+                    "created_at": {"$lt": cutoff},
+                },
+                projection=projection,
+            )
+            for doc in cursor:
+                yield doc["checkpoint_id"]
+    
+    def prune(self, thread_id: Optional[str] = None, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+        """
+        按保留策略（keep_last、max_age）删除旧检查点及其待处理写入
+        
+        每个线程（命名空间）的最新检查点始终保留；不再被引用的通道 blob 由 compact 清理。
+        
+        Args:
+            thread_id: 只处理指定线程，默认处理所有线程
+            batch_size: 每批删除的检查点数量
+            
+        Returns:
+            删除的检查点数量
+        """
+        if self.keep_last is None and self.max_age is None:
+            return 0
+        self.flush()
+        
+        deleted = 0
+        for tid, checkpoint_ns in self._thread_namespaces(self.checkpoints_collection, thread_id):
+            expired = self._expired_checkpoint_ids(tid, checkpoint_ns)
+            while True:
+                batch = list(islice(expired, batch_size))
+                if not batch:
+                    break
+                query = {
+                    "thread_id": tid,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": {"$in": batch},
+                }
+                deleted += self.checkpoints_collection.delete_many(query).deleted_count
+                self.writes_collection.delete_many(query)
+        return deleted
+    
+    def compact(self, batch_size: int = PRUNE_BATCH_SIZE) -> dict[str, int]:
+        """
+        清理孤立数据：所属检查点已被删除的待处理写入，以及不再被任何检查点引用的通道 blob
+        
+        只处理创建超过 COMPACT_GRACE_SECONDS 的数据，分批扫描和删除。
+        
+        Returns:
+            {"writes": 删除的写入数量, "blobs": 删除的 blob 数量}
+        """
+        self.flush()
+        grace_cutoff = datetime.now(timezone.utc) - timedelta(seconds=COMPACT_GRACE_SECONDS)
+        removed = {"writes": 0, "blobs": 0}
+        
+        # 待处理写入：按 _id 分批扫描，每批再用一次查询找出仍然存在的检查点，删除其余写入
+        last_id = None
+        projection = {"thread_id": 1, "checkpoint_ns": 1, "checkpoint_id": 1}
+        while True:
+            match = {"created_at": {"$lt": grace_cutoff}}
+            if last_id is not None:
+                match["_id"] = {"$gt": last_id}
+            scanned = list(self.writes_collection.find(
+                match, projection=projection, sort=[("_id", 1)], limit=batch_size
+            ))
+            if not scanned:
+                break
+            last_id = scanned[-1]["_id"]
+            existing = {
+                _writes_key(doc)
+                for doc in self.checkpoints_collection.find(
+                    _pending_writes_query(scanned), projection={**projection, "_id": 0}
+                )
+            }
+            orphans = [doc["_id"] for doc in scanned if _writes_key(doc) not in existing]
+            if orphans:
+                result = self.writes_collection.delete_many({"_id": {"$in": orphans}})
+                removed["writes"] += result.deleted_count
+            if len(scanned) < batch_size:
+                break
+        
+        # 通道 blob：逐个线程（命名空间）收集仍被引用的 (channel, version)，删除其余 blob
+        for tid, checkpoint_ns in self._thread_namespaces(self.blobs_collection):
+            base = {"thread_id": tid, "checkpoint_ns": checkpoint_ns}
+            referenced = set()
+            for doc in self.checkpoints_collection.find(
+                {**base, "blob_refs": {"$exists": True}}, projection={"blob_refs": 1, "_id": 0}
+            ):
+                referenced.update((channel, version) for channel, version in doc["blob_refs"])
+            orphans = []
+            for blob in self.blobs_collection.find(
+                {**base, "created_at": {"$not": {"$gte": grace_cutoff}}},
+                projection={"channel": 1, "version": 1},
+            ):
+                if (blob["channel"], blob["version"]) not in referenced:
+                    orphans.append(blob["_id"])
+                if len(orphans) >= batch_size:
+                    removed["blobs"] += self.blobs_collection.delete_many(
+                        {"_id": {"$in": orphans}}
+                    ).deleted_count
+                    orphans = []
+            if orphans:
+                removed["blobs"] += self.blobs_collection.delete_many(
+                    {"_id": {"$in": orphans}}
+                ).deleted_count
+        return removed
+    
+    def start_compactor(self, interval: float = COMPACT_INTERVAL) -> None:
+        """启动后台整理线程，定期执行 prune 和 compact"""
+        if self._compactor is not None:
+            return
+        self._compactor_stop.clear()
+        
+        def run():
+            while not self._compactor_stop.wait(interval):
+                try:
+                    self.prune()
+                    self.compact()
+                except Exception as e:
+                    print(f"检查点整理失败: {e}")
+        
+        self._compactor = threading.Thread(
+            target=run, name="mongodb-checkpoint-compactor", daemon=True
+        )
+        self._compactor.start()
+    
+    def stop_compactor(self) -> None:
+        """停止后台整理线程"""
+        if self._compactor is None:
+            return
+        self._compactor_stop.set()
+        self._compactor.join()
+        self._compactor = None
     
     def close(self) -> None:
-        """关闭 MongoDB 连接"""
-        self.client.close()
+        """写入尚未持久化的数据并关闭 MongoDB 连接（后台写入失败时抛出异常）"""
+        self.stop_compactor()
+        try:
+            self.flush()
+        finally:
+            if self._queue is not None:
+                self._queue.put(None)
+                self._flusher.join()
+            self.client.close()
 
 
 class AsyncMongoDBSaver(BaseCheckpointSaver):
@@ -484,6 +1871,15 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         db_name: str = "langgraph",
         *,
         serde: Optional[SerializerProtocol] = None,
+        lazy_checkpoints: bool = False,
+        list_page_size: int = LIST_PAGE_SIZE,
+        compression_level: Optional[int] = None,
+        compression_dictionary: Optional[bytes] = None,
+        cache_size: int = 0,
+        durability: str = "sync",
+        write_queue_size: int = WRITE_QUEUE_SIZE,
+        ttl_seconds: Optional[int] = None,
+        metadata_indexes: Sequence[str] = (),
     ):
         """
         初始化异步 MongoDB Checkpointer
@@ -492,12 +1888,56 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             client: motor 异步 MongoDB 客户端实例
             db_name: 数据库名称
             serde: 序列化器
+            lazy_checkpoints: alist() 是否延迟反序列化 checkpoint_data
+            list_page_size: alist() 每页读取的检查点数量
+            compression_level: zstd 压缩级别，设置后写入时压缩；安装了 zstandard 时无论是否设置都能读取压缩数据
+            compression_dictionary: 训练好的 zstd 字典（可选）
+            cache_size: 最新检查点缓存的线程数，0 表示不启用缓存
+            durability: 持久化模式，sync、batched 或 async（见 DURABILITY_WRITE_CONCERNS）
+            write_queue_size: async 模式后台队列容量
+            ttl_seconds: 在 created_at 上创建 TTL 索引（keep_last/max_age 保留策略和
+                孤立数据整理可以用连接同一数据库的 MongoDBSaver 执行）
+            metadata_indexes: 需要建立二级索引的元数据键，用于 asearch() 和跨线程 alist() 的过滤
         """
         super().__init__(serde=serde)
+        # 安装了 zstandard 时总是可以读取其他实例写入的压缩数据，只有写入时的压缩需要开启
+        if compression_level is not None or zstandard is not None:
+            self.serde = CompressedSerializer(
+                self.serde, level=compression_level, dictionary=compression_dictionary
+            )
+        self.lazy_checkpoints = lazy_checkpoints
+        self.list_page_size = list_page_size
+        self.cache = LatestCheckpointCache(cache_size) if cache_size > 0 else None
+        if durability not in DURABILITY_WRITE_CONCERNS:
+            raise ValueError(f"不支持的持久化模式: {durability}")
+        self.durability = durability
+        write_concern = DURABILITY_WRITE_CONCERNS[durability]
         self.client = client
         self.db = client[db_name]
-        self.checkpoints_collection = self.db["checkpoints"]
-        self.writes_collection = self.db["checkpoint_writes"]
+        self.checkpoints_collection = self.db.get_collection("checkpoints", write_concern=write_concern)
+        self.writes_collection = self.db.get_collection("checkpoint_writes", write_concern=write_concern)
+        self.blobs_collection = self.db.get_collection("checkpoint_blobs", write_concern=write_concern)
+        self._collections = {
+            "checkpoints": self.checkpoints_collection,
+            "checkpoint_writes": self.writes_collection,
+            "checkpoint_blobs": self.blobs_collection,
+        }
+        # 本进程已写入过完整通道 blob 的 (thread_id, checkpoint_ns)
+        self._blob_threads: set[Tuple[str, str]] = set()
+        
+        # batched 模式缓存的写入操作：集合名 -> 操作列表
+        self._pending_ops: dict[str, list] = defaultdict(list)
+        
+        # async 模式的后台写入任务（首次写入时在当前事件循环中创建）
+        self.write_queue_size = write_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        # 后台写入失败的异常，由下一次 aflush() 抛出
+        self._write_error: Optional[BaseException] = None
+        self.ttl_seconds = ttl_seconds
+        self.metadata_indexes = tuple(metadata_indexes)
+        # 是否支持 change stream，第一次订阅时检测
+        self._change_streams: Optional[bool] = None
     
     @classmethod
     def from_conn_string(
@@ -506,6 +1946,7 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         db_name: str = "langgraph",
         *,
         serde: Optional[SerializerProtocol] = None,
+        **kwargs: Any,
     ) -> "AsyncMongoDBSaver":
         """
         从连接字符串创建 AsyncMongoDBSaver 实例
@@ -514,6 +1955,7 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             conn_string: MongoDB 连接字符串
             db_name: 数据库名称
             serde: 序列化器
+            **kwargs: 其他构造参数
             
         Returns:
             AsyncMongoDBSaver 实例
@@ -526,7 +1968,7 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             )
         
         client = AsyncIOMotorClient(conn_string)
-        return cls(client, db_name, serde=serde)
+        return cls(client, db_name, serde=serde, **kwargs)
     
     async def setup(self) -> None:
         """创建必要的数据库索引"""
@@ -537,9 +1979,87 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         await self.checkpoints_collection.create_index(
             [("thread_id", 1), ("checkpoint_ns", 1)],
         )
+        for keys in _search_index_keys(self.metadata_indexes):
+            await self.checkpoints_collection.create_index(keys)
         await self.writes_collection.create_index(
             [("thread_id", 1), ("checkpoint_ns", 1), ("checkpoint_id", 1)],
         )
+        await self.writes_collection.create_index(SEARCH_SORT)
+        await self.blobs_collection.create_index(
+            [("thread_id", 1), ("checkpoint_ns", 1), ("channel", 1), ("version", 1)],
+            unique=True
+        )
+        if self.ttl_seconds:
+            await self.checkpoints_collection.create_index(
+                "created_at", expireAfterSeconds=self.ttl_seconds
+            )
+            await self.writes_collection.create_index(
+                "created_at", expireAfterSeconds=self.ttl_seconds
+            )
+    
+    async def _abulk_write(self, grouped: dict[str, list], ordered: bool) -> None:
+        """按 WRITE_ORDER 顺序对每个集合执行一次批量写入"""
+        for name in WRITE_ORDER:
+            if grouped.get(name):
+                await self._collections[name].bulk_write(grouped[name], ordered=ordered)
+    
+    async def _asubmit(self, grouped: dict[str, list], boundary: bool) -> None:
+        """按持久化模式提交写入操作（见 MongoDBSaver._submit）"""
+        if self.durability == "sync":
+            await self._abulk_write(grouped, ordered=False)
+        elif self.durability == "batched":
+            for name, ops in grouped.items():
+                self._pending_ops[name].extend(ops)
+            if boundary:
+                await self.aflush()
+        else:
+            if self._flusher is None:
+                self._queue = asyncio.Queue(maxsize=self.write_queue_size)
+                self._flusher = asyncio.create_task(self._aflush_loop())
+            await self._queue.put(grouped)
+    
+    async def _aflush_loop(self) -> None:
+        """async 模式的后台写入任务：合并队列中的提交后批量写入"""
+        while True:
+            items = [await self._queue.get()]
+            while len(items) < WRITE_FLUSH_BATCH and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            grouped: dict[str, list] = defaultdict(list)
+            for item in items:
+                for name, ops in (item or {}).items():
+                    grouped[name].extend(ops)
+            try:
+                if grouped:
+                    await self._abulk_write(grouped, ordered=True)
+            except Exception as e:
+                # 记录下来由 aflush()/aclose() 抛出
+                self._write_error = self._write_error or e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if None in items:
+                return
+    
+    async def aflush(self) -> None:
+        """
+        写入尚未持久化的数据（batched 模式立即写入，async 模式等待后台队列清空）
+        
+        Raises:
+            async 模式下后台写入失败时抛出该异常
+        """
+        if self.durability == "batched":
+            grouped, self._pending_ops = self._pending_ops, defaultdict(list)
+            if grouped:
+                await self._abulk_write(grouped, ordered=True)
+        elif self.durability == "async" and self._queue is not None:
+            await self._queue.join()
+            error, self._write_error = self._write_error, None
+            if error is not None:
+                raise error
+    
+    def get_next_version(self, current: Any, channel: Any) -> Any:
+        """生成通道的下一个版本号（每次写入唯一，分叉的分支不会相互覆盖 blob）"""
+        return _next_version(current)
     
     async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
         """异步获取检查点元组"""
@@ -547,6 +2067,15 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
         checkpoint_id = get_checkpoint_id(config)
         
+        await self.aflush()
+        
+        if self.cache is not None:
+            cached = self.cache.get(thread_id, checkpoint_ns, checkpoint_id)
+            if cached is not None:
+                checkpoint_tuple = await self._avalidate_cached(*cached, latest=not checkpoint_id)
+                if checkpoint_tuple is not None:
+                    return checkpoint_tuple
+        
         query = {
             "thread_id": thread_id,
             "checkpoint_ns": checkpoint_ns,
@@ -563,38 +2092,47 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         if not doc:
             return None
         
-        checkpoint = self.serde.loads_typed(doc["checkpoint_data"])
-        metadata = self.serde.loads_typed(doc["metadata_data"])
-        
         pending_writes = await self._aget_pending_writes(
             thread_id, checkpoint_ns, doc["checkpoint_id"]
         )
+        blobs = await self._aget_blobs([doc])
         
-        checkpoint_config = {
-            "configurable": {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": doc["checkpoint_id"],
-            }
-        }
-        
-        parent_config = None
-        if doc.get("parent_checkpoint_id"):
-            parent_config = {
-                "configurable": {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": doc["parent_checkpoint_id"],
-                }
-            }
-        
-        return CheckpointTuple(
-            config=checkpoint_config,
-            checkpoint=checkpoint,
-            metadata=metadata,
-            parent_config=parent_config,
-            pending_writes=pending_writes,
+        checkpoint_tuple = self._load_tuple(doc, pending_writes, blobs)
+        if self.cache is not None and not checkpoint_id:
+            self.cache.put(checkpoint_tuple, doc.get("writes_stamp"))
+        return checkpoint_tuple
+    
+    async def _avalidate_cached(
+        self, cached: CheckpointTuple, writes_stamp: Optional[str], latest: bool
+    ) -> Optional[CheckpointTuple]:
+        """异步校验缓存命中（见 MongoDBSaver._validate_cached）"""
+        query, sort = _stamp_query(cached, latest)
+        doc = await self.checkpoints_collection.find_one(
+            query, sort=sort, projection=STAMP_PROJECTION
         )
+        return _check_stamp(self.cache, cached, writes_stamp, doc)
+    
+    async def _aget_blobs(self, docs: Sequence[dict]) -> dict[Tuple[str, str, str, Any], Any]:
+        """异步一次查询获取一批检查点引用的通道 blob"""
+        query = _blobs_query(docs)
+        if query is None:
+            return {}
+        return _group_blobs(await self.blobs_collection.find(query).to_list(length=None))
+    
+    def _load_tuple(
+        self,
+        doc: dict,
+        pending_writes: list[Tuple[str, str, Any]],
+        blobs: dict[Tuple[str, str, str, Any], Any],
+        lazy: bool = False,
+    ) -> CheckpointTuple:
+        """反序列化检查点文档（lazy 为 True 时检查点延迟到首次访问时组装）"""
+        if lazy:
+            checkpoint = LazyCheckpoint(lambda: _assemble_checkpoint(self.serde, doc, blobs))
+        else:
+            checkpoint = _assemble_checkpoint(self.serde, doc, blobs)
+        metadata = self.serde.loads_typed(doc["metadata_data"])
+        return _doc_to_tuple(doc, checkpoint, metadata, pending_writes)
     
     async def _aget_pending_writes(
         self, thread_id: str, checkpoint_ns: str, checkpoint_id: str
@@ -615,6 +2153,20 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         
         return writes
     
+    async def _aload_page(self, page: list[dict]) -> list[CheckpointTuple]:
+        """一次查询获取一页检查点的待处理写入（blob 同样一次查询），并构建 CheckpointTuple"""
+        write_docs = await self.writes_collection.find(_pending_writes_query(page)).to_list(
+            length=None
+        )
+        pending_writes = _group_pending_writes(self.serde, write_docs)
+        blobs = await self._aget_blobs(page)
+        return [
+            self._load_tuple(
+                doc, pending_writes.get(_writes_key(doc), []), blobs, self.lazy_checkpoints
+            )
+            for doc in page
+        ]
+    
     async def alist(
         self,
         config: Optional[RunnableConfig],
@@ -623,65 +2175,82 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         before: Optional[RunnableConfig] = None,
         limit: Optional[int] = None,
     ):
-        """异步列出检查点历史"""
-        thread_id = config["configurable"]["thread_id"]
-        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        
-        query = {
-            "thread_id": thread_id,
-            "checkpoint_ns": checkpoint_ns,
-        }
-        
-        if before:
-            before_checkpoint_id = get_checkpoint_id(before)
-            if before_checkpoint_id:
-                query["checkpoint_id"] = {"$lt": before_checkpoint_id}
+        """异步列出检查点历史（config 为 None 时跨线程列出，见 MongoDBSaver.list）"""
+        await self.aflush()
         
-        if filter:
-            for key, value in filter.items():
-                query[f"metadata.{key}"] = value
-        
-        cursor = self.checkpoints_collection.find(
-            query,
-            sort=[("checkpoint_id", DESCENDING)]
-        )
+        query, sort = _list_query(config, filter, before)
+        cursor = self.checkpoints_collection.find(query, sort=sort).batch_size(self.list_page_size)
         
         if limit:
             cursor = cursor.limit(limit)
         
+        # 按页读取，每页的待处理写入通过一次 $in 查询获取
+        page = []
         async for doc in cursor:
-            checkpoint = self.serde.loads_typed(doc["checkpoint_data"])
-            metadata = self.serde.loads_typed(doc["metadata_data"])
-            
-            pending_writes = await self._aget_pending_writes(
-                thread_id, checkpoint_ns, doc["checkpoint_id"]
-            )
-            
-            checkpoint_config = {
-                "configurable": {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": doc["checkpoint_id"],
-                }
-            }
-            
-            parent_config = None
-            if doc.get("parent_checkpoint_id"):
-                parent_config = {
-                    "configurable": {
-                        "thread_id": thread_id,
-                        "checkpoint_ns": checkpoint_ns,
-                        "checkpoint_id": doc["parent_checkpoint_id"],
-                    }
-                }
-            
-            yield CheckpointTuple(
-                config=checkpoint_config,
-                checkpoint=checkpoint,
-                metadata=metadata,
-                parent_config=parent_config,
-                pending_writes=pending_writes,
+            page.append(doc)
+            if len(page) >= self.list_page_size:
+                for item in await self._aload_page(page):
+                    yield item
+                page = []
+        if page:
+            for item in await self._aload_page(page):
+                yield item
+    
+    async def asearch(
+        self,
+        filter: Optional[dict[str, Any]] = None,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[dict] = None,
+        limit: int = LIST_PAGE_SIZE,
+        metadata_only: bool = False,
+    ) -> Tuple[list[CheckpointTuple], Optional[dict]]:
+        """异步跨线程检索检查点（按页返回，参数见 MongoDBSaver.search）"""
+        await self.aflush()
+        
+        docs = await self.checkpoints_collection.find(
+            _search_query(filter, since, until, after),
+            projection=METADATA_PROJECTION if metadata_only else None,
+            sort=SEARCH_SORT,
+            limit=limit,
+        ).to_list(length=None)
+        if metadata_only:
+            tuples = [
+                _doc_to_tuple(doc, None, self.serde.loads_typed(doc["metadata_data"]), None)
+                for doc in docs
+            ]
+        else:
+            tuples = await self._aload_page(docs) if docs else []
+        return tuples, _search_cursor(docs, limit)
+    
+    async def aget_namespace_tuples(
+        self, config: RunnableConfig, prefix: str = ""
+    ) -> dict[str, CheckpointTuple]:
+        """异步获取各命名空间的最新检查点（见 MongoDBSaver.get_namespace_tuples）"""
+        await self.aflush()
+        
+        thread_id = config["configurable"]["thread_id"]
+        docs = [
+            group["doc"]
+            async for group in self.checkpoints_collection.aggregate(
+                _namespace_pipeline(thread_id, prefix)
             )
+        ]
+        if not docs:
+            return {}
+        write_docs = await self.writes_collection.find(_pending_writes_query(docs)).to_list(
+            length=None
+        )
+        pending_writes = _group_pending_writes(self.serde, write_docs)
+        blobs = await self._aget_blobs(docs)
+        result = {}
+        for doc in sorted(docs, key=lambda d: d["checkpoint_ns"]):
+            checkpoint_tuple = self._load_tuple(doc, pending_writes.get(_writes_key(doc), []), blobs)
+            if self.cache is not None:
+                self.cache.put(checkpoint_tuple, doc.get("writes_stamp"))
+            result[doc["checkpoint_ns"]] = checkpoint_tuple
+        return result
     
     async def aput(
         self,
@@ -696,7 +2265,18 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         checkpoint_id = checkpoint["id"]
         parent_checkpoint_id = get_checkpoint_id(config)
         
-        checkpoint_data = self.serde.dumps_typed(checkpoint)
+        stripped, blob_refs = _split_checkpoint(checkpoint)
+        # 进程内首次写入某线程时写入全部通道（兼容旧格式的父检查点），之后只写变化的通道
+        known = (thread_id, checkpoint_ns) in self._blob_threads
+        blob_ops = _build_blob_ops(
+            self.serde,
+            thread_id,
+            checkpoint_ns,
+            checkpoint["channel_values"],
+            new_versions if known else checkpoint["channel_versions"],
+        )
+        
+        checkpoint_data = self.serde.dumps_typed(stripped)
         metadata_data = self.serde.dumps_typed(metadata)
         
         doc = {
@@ -705,12 +2285,14 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             "checkpoint_id": checkpoint_id,
             "parent_checkpoint_id": parent_checkpoint_id,
             "checkpoint_data": checkpoint_data,
+            "blob_refs": blob_refs,
             "metadata_data": metadata_data,
             "metadata": dict(metadata) if metadata else {},
+            "writes_stamp": uuid.uuid4().hex,
             "created_at": datetime.now(timezone.utc),
         }
         
-        await self.checkpoints_collection.update_one(
+        checkpoint_op = UpdateOne(
             {
                 "thread_id": thread_id,
                 "checkpoint_ns": checkpoint_ns,
@@ -720,6 +2302,14 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             upsert=True
         )
         
+        await self._asubmit(
+            {"checkpoint_blobs": blob_ops, "checkpoints": [checkpoint_op]}, boundary=True
+        )
+        self._blob_threads.add((thread_id, checkpoint_ns))
+        
+        if self.cache is not None:
+            self.cache.put(_doc_to_tuple(doc, checkpoint, metadata, []), doc["writes_stamp"])
+        
         return {
             "configurable": {
                 "thread_id": thread_id,
@@ -742,29 +2332,17 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
         if not checkpoint_id:
             return
         
-        for idx, (channel, value) in enumerate(writes):
-            doc = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id,
-                "task_id": task_id,
-                "idx": idx,
-                "channel": channel,
-                "value_data": self.serde.dumps_typed(value),
-                "created_at": datetime.now(timezone.utc),
-            }
-            
-            await self.writes_collection.update_one(
-                {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": checkpoint_id,
-                    "task_id": task_id,
-                    "idx": idx,
-                },
-                {"$set": doc},
-                upsert=True
-            )
+        ops = _build_write_ops(self.serde, config, writes, task_id)
+        if not ops:
+            return
+        stamp = uuid.uuid4().hex
+        await self._asubmit(
+            {"checkpoint_writes": ops, "checkpoints": [_writes_stamp_op(config, stamp)]},
+            boundary=any(channel in WRITES_IDX_MAP for channel, _ in writes),
+        )
+        
+        if self.cache is not None:
+            self.cache.add_writes(thread_id, checkpoint_ns, checkpoint_id, writes, task_id, stamp)
     
     # 同步方法的实现（回退到异步）
     def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
@@ -817,12 +2395,105 @@ class AsyncMongoDBSaver(BaseCheckpointSaver):
             self.aput_writes(config, writes, task_id)
         )
     
+    async def asubscribe(
+        self,
+        thread_id: Optional[str] = None,
+        *,
+        channels: Optional[Sequence[str]] = None,
+        start_after: Any = None,
+        poll_interval: float = SUBSCRIBE_POLL_INTERVAL,
+    ):
+        """异步订阅检查点和待处理写入的变更（参数见 MongoDBSaver.subscribe，取消任务即结束订阅）"""
+        if not await self._achange_streams_supported():
+            async for event in self._apoll_changes(thread_id, channels, poll_interval):
+                yield event
+            return
+        try:
+            stream = self.db.watch(
+                _change_stream_pipeline(thread_id, channels),
+                full_document="updateLookup",
+                start_after=start_after,
+                max_await_time_ms=SUBSCRIBE_MAX_AWAIT_MS,
+            )
+            change = await stream.try_next()
+        except (OperationFailure, NotImplementedError):
+            async for event in self._apoll_changes(thread_id, channels, poll_interval):
+                yield event
+            return
+        
+        try:
+            while True:
+                if change is not None:
+                    event = _change_event(
+                        change["ns"]["coll"], change.get("fullDocument"), change["_id"]
+                    )
+                    if event is not None:
+                        yield event
+                change = await stream.try_next()
+        finally:
+            await stream.close()
+    
+    async def _achange_streams_supported(self) -> bool:
+        """检测部署是否支持 change stream（单机 mongod、mongomock_motor 不支持）"""
+        if self._change_streams is None:
+            try:
+                hello = await self.client.admin.command("hello")
+            except (OperationFailure, NotImplementedError):
+                hello = None
+            self._change_streams = _supports_change_streams(hello)
+        return self._change_streams
+    
+    async def _apoll_changes(
+        self,
+        thread_id: Optional[str],
+        channels: Optional[Sequence[str]],
+        poll_interval: float,
+    ):
+        """轮询模式的异步订阅实现"""
+        since, seen = datetime.now(timezone.utc).replace(tzinfo=None), set()
+        projection = {field: 1 for field in SUBSCRIBE_FIELDS + ("created_at",)}
+        while True:
+            polled = []
+            for name in ("checkpoints", "checkpoint_writes"):
+                query = _poll_query(name, since, thread_id, channels)
+                if query is not None:
+                    async for doc in self._collections[name].find(query, projection):
+                        polled.append((name, doc))
+            events, since, seen = _collect_polled(polled, since, seen)
+            for event in events:
+                yield event
+            await asyncio.sleep(poll_interval)
+    
+    async def aput_resume(self, config: RunnableConfig, value: Any) -> Optional[RunnableConfig]:
+        """异步为处于中断状态的线程记录恢复值（见 MongoDBSaver.put_resume）"""
+        latest = await self.aget_tuple(config)
+        if latest is None:
+            return None
+        await self.aput_writes(latest.config, [(RESUME, value)], NULL_TASK_ID)
+        return latest.config
+    
     async def adelete_thread(self, thread_id: str) -> None:
         """异步删除线程的所有检查点"""
+        await self.aflush()
         await self.checkpoints_collection.delete_many({"thread_id": thread_id})
         await self.writes_collection.delete_many({"thread_id": thread_id})
+        await self.blobs_collection.delete_many({"thread_id": thread_id})
+        self._blob_threads = {key for key in self._blob_threads if key[0] != thread_id}
+        if self.cache is not None:
+            self.cache.invalidate(thread_id)
+    
+    async def aclose(self) -> None:
+        """写入尚未持久化的数据并关闭 MongoDB 连接（后台写入失败时抛出异常）"""
+        try:
+            await self.aflush()
+        finally:
+            if self._flusher is not None:
+                await self._queue.put(None)
+                await self._flusher
+                self._flusher = None
+            self.client.close()
     
     def close(self) -> None:
-        """关闭 MongoDB 连接"""
+        """关闭 MongoDB 连接（batched/async 模式请使用 aclose，以写入尚未持久化的数据）"""
         self.client.close()
 
@@ -0,0 +1,592 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : test_checkpointer.py
+@Desc    : MongoDBSaver 与迁移工具的测试（使用 mongomock，无需本地 mongod）
+
+运行：
+    pytest test_checkpointer.py
+"""
+
+import operator
+from collections import Counter
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, TypedDict
+
+import mongomock
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import WRITES_IDX_MAP
+from langgraph.checkpoint.serde.types import INTERRUPT, RESUME
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import END, START, StateGraph
+
+from migrate import migrate
+from mongodb_checkpointer import NULL_TASK_ID, MongoDBSaver, _collect_polled, _next_version
+
+
+class CounterState(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+def build_graph(checkpointer, **compile_kwargs):
+    """两个节点依次追加步骤号的图"""
+
+    def first(state: CounterState):
+        return {"steps": [len(state["steps"])]}
+
+    def second(state: CounterState):
+        return {"steps": [len(state["steps"])]}
+
+    graph = StateGraph(CounterState)
+    graph.add_node("first", first)
+    graph.add_node("second", second)
+    graph.add_edge(START, "first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", END)
+    return graph.compile(checkpointer=checkpointer, **compile_kwargs)
+
+
+def mongodb_saver():
+    return MongoDBSaver(mongomock.MongoClient())
+
+
+def sqlite_saver():
+    saver = SqliteSaver(sqlite3.connect(":memory:", check_same_thread=False))
+    saver.setup()
+    return saver
+
+
+# ============================================================
+# 迁移
+# ============================================================
+
+@pytest.mark.parametrize(
+    "make_source, make_target",
+    [
+        (sqlite_saver, mongodb_saver),
+        (mongodb_saver, sqlite_saver),
+        (MemorySaver, mongodb_saver),
+        (mongodb_saver, MemorySaver),
+    ],
+)
+def test_migrated_thread_can_resume(make_source, make_target):
+    """迁移后的线程在目标存储器上可以继续执行（包括从中断处恢复）"""
+    config = {"configurable": {"thread_id": "thread-1"}}
+    source = build_graph(make_source())
+    source.invoke({"steps": []}, config)
+    source.invoke({"steps": []}, config, interrupt_before=["second"])
+    expected = source.get_state(config)
+
+    target_saver = make_target()
+    migrate(source.checkpointer, target_saver, workers=2)
+    target = build_graph(target_saver)
+
+    migrated = target.get_state(config)
+    assert migrated.values == expected.values
+    assert migrated.next == ("second",)
+    assert len(list(target.get_state_history(config))) == len(list(source.get_state_history(config)))
+
+    # 从中断处恢复，再开始新的一轮
+    assert target.invoke(None, config)["steps"] == [0, 1, 2, 3]
+    assert target.invoke({"steps": []}, config)["steps"] == [0, 1, 2, 3, 4, 5]
+
+
+def test_migrated_branches_keep_their_values():
+    """从历史检查点分叉的两个分支在迁移后保持各自的状态"""
+    config = {"configurable": {"thread_id": "thread-1"}}
+    source = build_graph(sqlite_saver())
+    source.invoke({"steps": []}, config)
+    fork = next(s for s in source.get_state_history(config) if s.next == ("second",))
+    source.invoke({"steps": []}, config)
+    source.invoke(None, fork.config)
+
+    target = build_graph(mongodb_saver())
+    migrate(source.checkpointer, target.checkpointer)
+    for snapshot in source.get_state_history(config):
+        assert target.get_state(snapshot.config).values == snapshot.values
+
+
+def write_indexes(saver, config) -> set:
+    """读取检查点的待处理写入 (task_id, idx, channel)"""
+    checkpoint_id = config["configurable"]["checkpoint_id"]
+    if isinstance(saver, MongoDBSaver):
+        docs = saver.writes_collection.find({"checkpoint_id": checkpoint_id})
+        return {(doc["task_id"], doc["idx"], doc["channel"]) for doc in docs}
+    rows = saver.conn.execute(
+        "SELECT task_id, idx, channel FROM writes WHERE checkpoint_id = ?", (checkpoint_id,)
+    )
+    return set(rows)
+
+
+@pytest.mark.parametrize("make_source, make_target", [(sqlite_saver, mongodb_saver), (mongodb_saver, sqlite_saver)])
+def test_migrated_special_writes_keep_their_idx(make_source, make_target):
+    """中断、恢复值等特殊写入迁移后保持固定序号，普通写入的序号不变"""
+    config = {"configurable": {"thread_id": "thread-1"}}
+    source = build_graph(make_source())
+    source.invoke({"steps": []}, config, interrupt_before=["second"])
+    latest = source.checkpointer.get_tuple(config).config
+    source.checkpointer.put_writes(latest, [("steps", [5]), ("steps", [6])], "task-a")
+    source.checkpointer.put_writes(latest, [(INTERRUPT, "ask")], "task-a")
+    source.checkpointer.put_writes(latest, [(RESUME, "yes")], NULL_TASK_ID)
+    expected = write_indexes(source.checkpointer, latest)
+    assert ("task-a", WRITES_IDX_MAP[INTERRUPT], INTERRUPT) in expected
+
+    target = make_target()
+    migrate(source.checkpointer, target)
+    assert write_indexes(target, latest) == expected
+
+
+# ============================================================
+# 通道版本
+# ============================================================
+
+def test_fork_keeps_its_own_channel_values():
+    """从历史检查点分叉（update_state）后，分支写入的通道值不会被另一分支的同序号版本覆盖"""
+    graph = build_graph(mongodb_saver())
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config)
+    fork = next(s for s in graph.get_state_history(config) if s.next == ("second",))
+
+    fork_config = graph.update_state(fork.config, {"steps": [99]}, as_node="first")
+    result = graph.invoke(None, fork_config)
+    assert result["steps"] == [0, 99, 2]
+    assert graph.get_state(config).values == result
+    # 原分支的检查点不受影响
+    original = next(s for s in graph.get_state_history(config) if s.values["steps"] == [0, 1])
+    assert original.next == ()
+
+
+def test_legacy_integer_versions_stay_comparable():
+    """整数版本的旧线程继续生成可与整数比较、每次不同的版本"""
+    first, second = _next_version(3), _next_version(3)
+    assert 4 <= first < 5 and 4 <= second < 5 and first != second
+    assert max([3, first]) == first
+    assert isinstance(_next_version(None), str)
+
+
+# ============================================================
+# 压缩
+# ============================================================
+
+def test_uncompressed_saver_reads_compressed_documents():
+    """未开启压缩的实例可以读取开启压缩的实例写入的检查点，自己写入时不压缩"""
+    client = mongomock.MongoClient()
+    config = {"configurable": {"thread_id": "thread-1"}}
+    writer = build_graph(MongoDBSaver(client, compression_level=3))
+    writer.invoke({"steps": list(range(200))}, config)
+
+    reader_saver = MongoDBSaver(client)
+    reader = build_graph(reader_saver)
+    assert reader.get_state(config).values == writer.get_state(config).values
+    reader.invoke({"steps": []}, config)
+    assert reader_saver.serde.metrics()["compressed_count"] == 0
+    assert reader.get_state(config).values["steps"][-2:] == [202, 203]
+
+
+# ============================================================
+# 最新检查点缓存
+# ============================================================
+
+def test_cache_sees_writes_from_other_workers():
+    """其他 worker 写入的新检查点和待处理写入（包括重写同一写入）使缓存失效"""
+    client = mongomock.MongoClient()
+    worker = MongoDBSaver(client, cache_size=16)
+    other = MongoDBSaver(client, cache_size=16)
+    graph = build_graph(worker)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config, interrupt_before=["second"])
+
+    # 本进程的写入写穿缓存，命中时只做校验查询
+    cached = worker.get_tuple(config)
+    assert worker.get_tuple(config) == cached
+    assert worker.cache.hits == 2
+
+    other.put_resume(config, "first")
+    assert [value for _, channel, value in worker.get_tuple(config).pending_writes if channel == RESUME] == ["first"]
+    time.sleep(0.01)
+    other.put_resume(config, "second")
+    assert [value for _, channel, value in worker.get_tuple(config).pending_writes if channel == RESUME] == ["second"]
+
+    build_graph(other).invoke(None, config)
+    assert worker.get_tuple(config).config == other.get_tuple(config).config
+    assert build_graph(worker).get_state(config).values["steps"] == [0, 1]
+
+
+class QueryCounter:
+    """统计各集合上的读取查询次数（find、find_one、aggregate）和批量写入次数（bulk_write）"""
+
+    METHODS = ("find", "find_one", "aggregate", "bulk_write")
+
+    def __init__(self, saver, monkeypatch):
+        self.counts = Counter()
+        for attr, name in (
+            ("checkpoints_collection", "checkpoints"),
+            ("writes_collection", "checkpoint_writes"),
+            ("blobs_collection", "checkpoint_blobs"),
+        ):
+            wrapped = self._wrap(getattr(saver, attr))
+            monkeypatch.setattr(saver, attr, wrapped)
+            monkeypatch.setitem(saver._collections, name, wrapped)
+
+    def _wrap(self, collection):
+        counts = self.counts
+
+        class Counting:
+            def __getattr__(self, name):
+                attr = getattr(collection, name)
+                if name not in QueryCounter.METHODS:
+                    return attr
+
+                def call(*args, **kwargs):
+                    counts[(collection.name, name)] += 1
+                    return attr(*args, **kwargs)
+
+                return call
+
+        return Counting()
+
+    @property
+    def count(self) -> int:
+        """读取查询总数"""
+        return sum(n for (_, method), n in self.counts.items() if method != "bulk_write")
+
+    def __call__(self, fn) -> int:
+        before = self.count
+        fn()
+        return self.count - before
+
+
+def test_cache_hit_costs_one_query(monkeypatch):
+    """缓存命中只需一次校验查询，未命中与不使用缓存时的查询次数相同"""
+    client = mongomock.MongoClient()
+    config = {"configurable": {"thread_id": "thread-1"}}
+    build_graph(MongoDBSaver(client)).invoke({"steps": []}, config, interrupt_before=["second"])
+
+    uncached = MongoDBSaver(client)
+    cached = MongoDBSaver(client, cache_size=16)
+    uncached_queries, cached_queries = QueryCounter(uncached, monkeypatch), QueryCounter(cached, monkeypatch)
+
+    expected = uncached_queries(lambda: uncached.get_tuple(config))
+    assert cached_queries(lambda: cached.get_tuple(config)) == expected
+    assert cached_queries(lambda: cached.get_tuple(config)) == 1
+    # 其他实例写入后校验失败，重新读取
+    uncached.put_resume(config, "value")
+    assert cached_queries(lambda: cached.get_tuple(config)) == 1 + expected
+    assert cached_queries(lambda: cached.get_tuple(config)) == 1
+    # 本实例的写入写穿缓存
+    cached.put_writes(cached.get_tuple(config).config, [("steps", [7])], "task-1")
+    assert cached_queries(lambda: cached.get_tuple(config)) == 1
+    assert cached.cache.hits == 4 and cached.cache.misses == 2
+
+
+# ============================================================
+# 批量写入
+# ============================================================
+
+def test_put_writes_is_one_bulk_write(monkeypatch):
+    """一次 put_writes 的所有写入合并为一次批量写入"""
+    saver = mongodb_saver()
+    config = {"configurable": {"thread_id": "thread-1"}}
+    build_graph(saver).invoke({"steps": []}, config, interrupt_before=["second"])
+    latest = saver.get_tuple(config).config
+    counter = QueryCounter(saver, monkeypatch)
+
+    saver.put_writes(latest, [("steps", [i]) for i in range(10)], "task-a")
+    assert counter.counts[("checkpoint_writes", "bulk_write")] == 1
+    assert [value for task_id, _, value in saver.get_tuple(config).pending_writes if task_id == "task-a"] == [
+        [i] for i in range(10)
+    ]
+
+
+def test_bulk_context_batches_across_calls(monkeypatch):
+    """bulk() 上下文中的写入累计到 batch_size 后才写入，退出时写入剩余数据"""
+    saver = mongodb_saver()
+    config = {"configurable": {"thread_id": "thread-1"}}
+    build_graph(saver).invoke({"steps": []}, config, interrupt_before=["second"])
+    latest = saver.get_tuple(config).config
+    counter = QueryCounter(saver, monkeypatch)
+
+    with saver.bulk(batch_size=1000):
+        for i in range(20):
+            saver.put_writes(latest, [("steps", [i])], f"task-{i}")
+        assert counter.counts[("checkpoint_writes", "bulk_write")] == 0
+    assert counter.counts[("checkpoint_writes", "bulk_write")] == 1
+    assert saver.writes_collection.count_documents({"task_id": {"$regex": "^task-"}}) == 20
+
+
+# ============================================================
+# 历史列表
+# ============================================================
+
+def test_list_reads_pending_writes_once_per_page(monkeypatch):
+    """list() 每页只查询一次待处理写入，结果与逐个 get_tuple 相同"""
+    saver = MongoDBSaver(mongomock.MongoClient(), list_page_size=3)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph = build_graph(saver)
+    graph.invoke({"steps": []}, config)
+    graph.invoke({"steps": []}, config, interrupt_before=["second"])
+    saver.put_resume(config, "value")
+    counter = QueryCounter(saver, monkeypatch)
+
+    items = list(saver.list(config))
+    pages = -(-len(items) // 3)
+    assert pages > 2
+    assert counter.counts[("checkpoint_writes", "find")] == pages
+    assert counter.counts[("checkpoint_blobs", "find")] == pages
+    for item in items:
+        assert item.pending_writes == saver.get_tuple(item.config).pending_writes
+    assert any(channel == RESUME for _, channel, _ in items[0].pending_writes)
+
+
+# ============================================================
+# 保留策略与整理
+# ============================================================
+
+def backdate(saver, collection, **delta):
+    """把集合中所有文档的 created_at 提前（模拟旧数据）"""
+    created_at = datetime.now(timezone.utc) - timedelta(**delta)
+    getattr(saver, collection).update_many({}, {"$set": {"created_at": created_at}})
+
+
+def test_prune_keeps_last_checkpoints():
+    """prune 按 keep_last 只保留每个线程最近的检查点，最新状态不受影响"""
+    saver = MongoDBSaver(mongomock.MongoClient(), keep_last=2)
+    graph = build_graph(saver)
+    configs = [{"configurable": {"thread_id": f"thread-{i}"}} for i in range(2)]
+    for config in configs:
+        for _ in range(3):
+            graph.invoke({"steps": []}, config)
+    expected = [graph.get_state(config).values for config in configs]
+
+    assert saver.prune("thread-0") == 10
+    assert len(list(saver.list(configs[0]))) == 2
+    assert len(list(saver.list(configs[1]))) == 12
+    assert saver.prune() == 10
+    assert [graph.get_state(config).values for config in configs] == expected
+    # 被删除检查点的待处理写入一并删除
+    kept = {item.config["configurable"]["checkpoint_id"] for item in saver.list(None)}
+    assert set(saver.writes_collection.distinct("checkpoint_id")) <= kept
+
+
+def test_prune_by_max_age_keeps_latest():
+    """超过 max_age 的检查点被删除，最新检查点即使过期也保留"""
+    saver = MongoDBSaver(mongomock.MongoClient(), max_age=3600)
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config)
+    backdate(saver, "checkpoints_collection", hours=2)
+    graph.invoke({"steps": []}, config)
+
+    assert saver.prune() == 4
+    assert [item.metadata["step"] for item in saver.list(config)] == [6, 5, 4, 3]
+    backdate(saver, "checkpoints_collection", hours=2)
+    assert saver.prune() == 3
+    assert graph.get_state(config).values["steps"] == [0, 1, 2, 3]
+
+
+def test_compact_removes_orphans_only():
+    """compact 删除所属检查点已删除的写入和不再被引用的 blob，宽限期内的数据和仍被引用的数据保留"""
+    saver = MongoDBSaver(mongomock.MongoClient(), keep_last=1)
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config)
+    graph.invoke({"steps": []}, config, interrupt_before=["second"])
+    saver.put_resume(config, "value")
+    orphan = {
+        "thread_id": "thread-1", "checkpoint_ns": "", "checkpoint_id": "deleted",
+        "task_id": "task-a", "idx": 0, "channel": "steps", "value_data": ("json", b"[]"),
+    }
+    saver.writes_collection.insert_one({**orphan, "created_at": datetime.now(timezone.utc)})
+    saver.prune()
+    expected = graph.get_state(config)
+
+    # 宽限期内的数据不处理
+    assert saver.compact() == {"writes": 0, "blobs": 0}
+    backdate(saver, "writes_collection", days=1)
+    backdate(saver, "blobs_collection", days=1)
+    removed = saver.compact()
+    assert removed["writes"] == 1 and removed["blobs"] > 0
+    assert saver.writes_collection.count_documents({"checkpoint_id": "deleted"}) == 0
+
+    state = graph.get_state(config)
+    assert state.values == expected.values and state.next == ("second",)
+    assert [value for _, channel, value in saver.get_tuple(config).pending_writes if channel == RESUME] == ["value"]
+    assert saver.compact() == {"writes": 0, "blobs": 0}
+
+
+# ============================================================
+# 跨线程检索
+# ============================================================
+
+def checkpoint_ids(items) -> list:
+    return [item.config["configurable"]["checkpoint_id"] for item in items]
+
+
+def test_search_pages_across_threads():
+    """search 按 (created_at, checkpoint_id) 倒序分页，跨线程、相同时间戳时不重复也不遗漏"""
+    saver = MongoDBSaver(mongomock.MongoClient(), metadata_indexes=["source"])
+    graph = build_graph(saver)
+    for i in range(3):
+        graph.invoke({"steps": []}, {"configurable": {"thread_id": f"thread-{i}"}})
+    # 一半检查点使用相同的 created_at，分页只能靠 checkpoint_id 区分
+    same_time = datetime(2026, 1, 1)
+    for doc in list(saver.checkpoints_collection.find({"metadata.step": {"$gte": 1}})):
+        saver.checkpoints_collection.update_one({"_id": doc["_id"]}, {"$set": {"created_at": same_time}})
+    expected = [
+        doc["checkpoint_id"]
+        for doc in saver.checkpoints_collection.find({"metadata.source": "loop"}).sort(
+            [("created_at", -1), ("checkpoint_id", -1)]
+        )
+    ]
+
+    found, cursor, pages = [], None, 0
+    while True:
+        page, cursor = saver.search({"source": "loop"}, after=cursor, limit=2)
+        found += checkpoint_ids(page)
+        pages += 1
+        if cursor is None:
+            break
+    assert found == expected and len(expected) == 9 and pages == 5
+    assert {item.config["configurable"]["thread_id"] for item in saver.list(None, filter={"source": "loop"})} == {
+        "thread-0", "thread-1", "thread-2"
+    }
+    assert checkpoint_ids(saver.list(None, filter={"source": "loop"})) == expected
+
+    page, _ = saver.search(
+        {"source": "loop"}, since=same_time, until=same_time + timedelta(seconds=1), metadata_only=True
+    )
+    assert len(page) == 6 and all(item.checkpoint is None for item in page)
+    assert all(item.metadata["source"] == "loop" for item in page)
+
+
+# ============================================================
+# 子图命名空间
+# ============================================================
+
+def test_namespace_tuples_match_get_tuple(monkeypatch):
+    """get_namespace_tuples 一次取回父图和子图各命名空间的最新检查点，与逐个 get_tuple 一致"""
+    saver = MongoDBSaver(mongomock.MongoClient(), cache_size=16)
+    parent = StateGraph(CounterState)
+    parent.add_node("child", build_graph(None, interrupt_before=["second"]))
+    parent.add_edge(START, "child")
+    parent.add_edge("child", END)
+    graph = parent.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config)
+    other = {"configurable": {"thread_id": "thread-2"}}
+    graph.invoke({"steps": []}, other)
+
+    counter = QueryCounter(saver, monkeypatch)
+    tuples = saver.get_namespace_tuples(config)
+    assert counter.count == 3
+    child_ns = next(ns for ns in tuples if ns)
+    assert set(tuples) == {"", child_ns} and child_ns.startswith("child:")
+    for checkpoint_ns, item in tuples.items():
+        assert item.config["configurable"]["thread_id"] == "thread-1"
+        expected = saver.get_tuple({"configurable": {"thread_id": "thread-1", "checkpoint_ns": checkpoint_ns}})
+        assert item.config == expected.config and item.pending_writes == expected.pending_writes
+        assert item.checkpoint["channel_values"] == expected.checkpoint["channel_values"]
+
+    assert set(saver.get_namespace_tuples(config, prefix="child")) == {child_ns}
+    assert saver.get_namespace_tuples(config, prefix="missing") == {}
+    # 结果写入缓存，之后各命名空间的 get_tuple 只需校验查询
+    child_config = {"configurable": {"thread_id": "thread-1", "checkpoint_ns": child_ns}}
+    assert counter(lambda: saver.get_tuple(child_config)) == 1
+    assert graph.get_state(config, subgraphs=True).tasks[0].state.next == ("second",)
+
+
+# ============================================================
+# 持久化模式
+# ============================================================
+
+def test_async_durability_reports_failed_writes(monkeypatch):
+    """后台批量写入失败时 flush() 抛出异常，而不是报告写入成功"""
+    saver = MongoDBSaver(mongomock.MongoClient(), durability="async")
+
+    def fail(grouped, ordered):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(saver, "_bulk_write", fail)
+    build_graph(saver).invoke({"steps": []}, {"configurable": {"thread_id": "thread-1"}})
+    with pytest.raises(RuntimeError, match="write failed"):
+        saver.flush()
+    # 异常只抛出一次，之后的写入正常进行
+    monkeypatch.undo()
+    saver.flush()
+    saver.close()
+
+
+def test_bulk_only_buffers_the_current_thread():
+    """一个线程处于 bulk() 上下文时，其他线程的写入仍然立即写入"""
+    saver = mongodb_saver()
+    config = {"configurable": {"thread_id": "thread-1"}}
+    entered, done = threading.Event(), threading.Event()
+
+    def importer():
+        with saver.bulk():
+            entered.set()
+            done.wait()
+
+    thread = threading.Thread(target=importer)
+    thread.start()
+    entered.wait()
+    try:
+        build_graph(saver).invoke({"steps": []}, config)
+        assert saver.checkpoints_collection.count_documents({"thread_id": "thread-1"}) > 0
+    finally:
+        done.set()
+        thread.join()
+
+
+# ============================================================
+# 订阅
+# ============================================================
+
+def test_collect_polled_reports_rewritten_documents():
+    """同一文档以新的 created_at 重新写入时再次通知，相同的写入只通知一次"""
+    first = datetime(2026, 1, 1)
+    doc = {"_id": 1, "thread_id": "t", "checkpoint_id": "c", "channel": RESUME, "created_at": first}
+    events, since, seen = _collect_polled([("checkpoint_writes", doc)], first, set())
+    assert len(events) == 1
+    events, since, seen = _collect_polled([("checkpoint_writes", doc)], since, seen)
+    assert events == []
+
+    rewritten = {**doc, "created_at": first + timedelta(milliseconds=5)}
+    events, since, seen = _collect_polled([("checkpoint_writes", rewritten)], since, seen)
+    assert len(events) == 1 and since == rewritten["created_at"]
+
+
+def test_subscribe_polls_without_change_streams():
+    """mongomock 不支持 change stream，subscribe 退化为轮询，每次 put_resume 都会通知"""
+    saver = mongodb_saver()
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "thread-1"}}
+    graph.invoke({"steps": []}, config, interrupt_before=["second"])
+
+    events, stop = [], threading.Event()
+
+    def consume():
+        for event in saver.subscribe(channels=[RESUME], poll_interval=0.01, stop_event=stop):
+            events.append(event)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    try:
+        time.sleep(0.05)
+        saver.put_resume(config, "first")
+        time.sleep(0.05)
+        saver.put_resume(config, "second")
+        deadline = time.monotonic() + 2
+        while len(events) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        consumer.join()
+
+    assert [(event["thread_id"], event["channel"]) for event in events] == [("thread-1", RESUME)] * 2
+    assert saver._change_streams is False
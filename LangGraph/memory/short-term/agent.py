@@ -21,6 +21,7 @@ from chat_node import chat_node
 from summary_node import summary_node
 from conditional_edge import conditional_edge
 from checkpointer import CHECKPOINTER
+from deferred_summary import DeferredSummarizer
 from langchain_core.messages import HumanMessage
 from sqlite import DB_PATH
 import dotenv
@@ -97,8 +98,9 @@ if __name__ == "__main__":
     # 加载环境变量
     dotenv.load_dotenv()
 
-    # 构建Agent
+    # 构建Agent，摘要在回复返回后由后台线程执行
     agent = build_agent()
+    summarizer = DeferredSummarizer(agent)
 
     # 测试多轮对话
     # 创建对话线程配置
@@ -111,23 +113,24 @@ if __name__ == "__main__":
     # 第1轮：自我介绍
     print("\n第1轮：自我介绍")
     query = HumanMessage(content="你好！我是zsa。")
-    output = agent.invoke({"messages": [query], "summary": None}, config)
+    output = summarizer.chat({"messages": [query]}, config)
     for m in output["messages"][-1:]:
         m.pretty_print()
 
     # 第2轮：Agent记忆测试
     print("\n第2轮：Agent记忆测试")
     query = HumanMessage(content="你还记得我叫什么名字吗？")
-    output = agent.invoke({"messages": [query], "summary": None}, config)
+    output = summarizer.chat({"messages": [query]}, config)
     for m in output["messages"][-1:]:
         m.pretty_print()
 
     # 第3轮：用户分享兴趣
     print("\n第3轮：用户分享兴趣")
     query = HumanMessage(content="我喜欢听周杰伦的歌")
-    output = agent.invoke({"messages": [query], "summary": None}, config)
+    output = summarizer.chat({"messages": [query]}, config)
     for m in output["messages"][-1:]:
         m.pretty_print()
 
-    # 状态检查
+    # 等待后台摘要完成后进行状态检查
+    summarizer.close()
     state_check(agent)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : archive.py
+@Desc    : 已摘要消息的归档与检索
+
+summary_node把消息合并到摘要后会删除原消息，细节只保留在摘要中。
+删除前将消息按对话轮次归档到本地向量索引（与检查点同一个SQLite文件，按thread_id隔离），
+chat_node根据当前问题检索最相关的几轮原始对话，与摘要一起放入提示词。
+"""
+
+import sqlite3
+import threading
+from typing import Sequence
+
+import numpy as np
+from langchain_core.messages import BaseMessage, HumanMessage, get_buffer_string
+
+from llm import EMBEDDINGS
+from sqlite import DB_PATH
+
+# 每次检索返回的归档轮次数量
+ARCHIVE_TOP_K = 3
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> list[list[BaseMessage]]:
+    """按对话轮次切分消息：每条用户消息开始新的一轮，之后的AI回复和工具消息属于同一轮"""
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class MessageArchive:
+    """
+    按线程隔离的消息向量索引
+
+    每个线程的归档规模有限，检索时读取该线程的全部向量，用numpy计算余弦相似度
+    """
+
+    def __init__(self, db_path: str = DB_PATH, embeddings=EMBEDDINGS):
+        """
+        初始化
+
+        Args:
+            db_path: SQLite数据库文件路径
+            embeddings: Embedding模型
+        """
+        self.embeddings = embeddings
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS message_archive (
+                thread_id TEXT NOT NULL,
+                turn_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (thread_id, turn_id)
+            )
+            """
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def add(self, thread_id: str, messages: Sequence[BaseMessage]) -> int:
+        """
+        归档消息
+
+        Args:
+            thread_id: 线程ID
+            messages: 即将从状态中删除的消息
+
+        Returns:
+            归档的轮次数量
+        """
+        turns = [turn for turn in split_turns(messages) if turn[0].id]
+        if not turns:
+            return 0
+        contents = [get_buffer_string(turn) for turn in turns]
+        vectors = np.array(self.embeddings.embed_documents(contents), dtype="float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        rows = [
+            (thread_id, turn[0].id, content, vector.tobytes())
+            for turn, content, vector in zip(turns, contents, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO message_archive (thread_id, turn_id, content, embedding) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def search(self, thread_id: str, query: str, k: int = ARCHIVE_TOP_K) -> list[str]:
+        """
+        检索与问题最相关的归档轮次
+
+        Args:
+            thread_id: 线程ID
+            query: 当前问题
+            k: 返回的轮次数量
+
+        Returns:
+            按相关度排序的对话文本，线程没有归档时返回空列表（不调用Embedding模型）
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content, embedding FROM message_archive WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+        if not rows or not query:
+            return []
+        matrix = np.stack([np.frombuffer(embedding, dtype="float32") for _, embedding in rows])
+        vector = np.array(self.embeddings.embed_query(query), dtype="float32")
+        scores = matrix @ (vector / (np.linalg.norm(vector) + 1e-12))
+        top = np.argsort(-scores)[:k]
+        return [rows[i][0] for i in top]
+
+    def delete_thread(self, thread_id: str):
+        """删除线程的全部归档"""
+        with self._lock:
+            self._conn.execute("DELETE FROM message_archive WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+
+MESSAGE_ARCHIVE = MessageArchive()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : benchmark.py
+@Desc    : SQLite Checkpointer 并发性能对比
+
+对比共享单个连接的SqliteSaver与PooledSqliteSaver（同步/异步）在不同并发thread_id数量下的吞吐量。
+每个thread_id模拟若干轮对话，每轮依次执行 put_writes、put 和 --reads-per-turn 次 get_tuple，
+默认与一次invoke对检查点的访问一致。
+
+如何解读结果：
+- 所有写入都由PooledSqliteSaver唯一的写线程提交，写入为主的负载在synchronous=NORMAL（默认）下
+  提交本身很便宜，吞吐量不随并发数增长，收益主要是比SqliteSaver更低的单轮耗时
+- synchronous=FULL时每次提交都要同步磁盘，组提交让并发写入共享一次同步，吞吐量随并发数增长
+- 读操作使用各线程独立的只读连接，增大 --reads-per-turn 可以观察读为主的负载，
+  多核机器上读操作可以并行执行（单核机器上不会随并发增长）
+
+运行示例：
+    python benchmark.py
+    python benchmark.py --concurrency 1 4 16 64 --turns 200 --payload-size 4096
+    python benchmark.py --backends pooled --synchronous FULL
+    python benchmark.py --backends sqlite pooled --reads-per-turn 10
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from langgraph.checkpoint.base import copy_checkpoint, empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from pooled_sqlite import PooledSqliteSaver
+
+# 默认测试参数
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32]  # 并发thread_id数量
+DEFAULT_TURNS = 50  # 每个thread_id的对话轮数
+DEFAULT_PAYLOAD_SIZE = 1024  # 每条消息的字节数
+HISTORY_WINDOW = 10  # messages通道保留的最近消息数量
+
+
+def next_checkpoint(saver, previous, step: int, messages: list):
+    """基于上一个检查点生成下一轮的检查点，返回 (checkpoint, new_versions)"""
+    if previous is None:
+        checkpoint = empty_checkpoint()
+    else:
+        checkpoint = copy_checkpoint(previous)
+        checkpoint["id"] = str(uuid6(clock_seq=step))
+        checkpoint["ts"] = datetime.now(timezone.utc).isoformat()
+    version = saver.get_next_version(checkpoint["channel_versions"].get("messages"), None)
+    checkpoint["channel_values"]["messages"] = messages
+    checkpoint["channel_versions"]["messages"] = version
+    return checkpoint, {"messages": version}
+
+
+def run_turns(saver, thread_id: str, turns: int, payload: str, reads: int = 1) -> list[float]:
+    """同步执行一个thread_id的所有对话轮次，返回每轮耗时"""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint, messages, latencies = None, [], []
+    for step in range(turns):
+        start = time.perf_counter()
+        message = {"role": "user", "content": f"[{step}] {payload}"}
+        if checkpoint is not None:
+            saver.put_writes(config, [("messages", [message])], str(uuid.uuid4()))
+        messages = (messages + [message])[-HISTORY_WINDOW:]
+        checkpoint, new_versions = next_checkpoint(saver, checkpoint, step, messages)
+        config = saver.put(config, checkpoint, {"source": "loop", "step": step}, new_versions)
+        for _ in range(reads):
+            saver.get_tuple({"configurable": {"thread_id": thread_id}})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def arun_turns(saver, thread_id: str, turns: int, payload: str, reads: int = 1) -> list[float]:
+    """异步执行一个thread_id的所有对话轮次，返回每轮耗时"""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint, messages, latencies = None, [], []
+    for step in range(turns):
+        start = time.perf_counter()
+        message = {"role": "user", "content": f"[{step}] {payload}"}
+        if checkpoint is not None:
+            await saver.aput_writes(config, [("messages", [message])], str(uuid.uuid4()))
+        messages = (messages + [message])[-HISTORY_WINDOW:]
+        checkpoint, new_versions = next_checkpoint(saver, checkpoint, step, messages)
+        config = await saver.aput(config, checkpoint, {"source": "loop", "step": step}, new_versions)
+        for _ in range(reads):
+            await saver.aget_tuple({"configurable": {"thread_id": thread_id}})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def open_saver(backend: str, db_path: str, synchronous: str = "NORMAL"):
+    if backend == "sqlite":
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        return SqliteSaver(conn)
+    return PooledSqliteSaver(db_path, synchronous=synchronous)
+
+
+def run_case(
+    backend: str,
+    concurrency: int,
+    turns: int,
+    payload: str,
+    reads: int = 1,
+    synchronous: str = "NORMAL",
+) -> dict:
+    """在临时数据库上运行一组测试，返回吞吐量和延迟"""
+    workdir = tempfile.mkdtemp(prefix="sqlite-bench-")
+    saver = open_saver(backend, os.path.join(workdir, "checkpoints.db"), synchronous)
+    thread_ids = [f"bench-{i}" for i in range(concurrency)]
+    try:
+        start = time.perf_counter()
+        if backend == "pooled-async":
+            async def run_all():
+                return await asyncio.gather(
+                    *(arun_turns(saver, tid, turns, payload, reads) for tid in thread_ids)
+                )
+            results = asyncio.run(run_all())
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(
+                    executor.map(lambda tid: run_turns(saver, tid, turns, payload, reads), thread_ids)
+                )
+        elapsed = time.perf_counter() - start
+    finally:
+        if isinstance(saver, PooledSqliteSaver):
+            saver.close()
+        else:
+            saver.conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "backend": backend,
+        "concurrency": concurrency,
+        "turns_per_second": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite Checkpointer 并发性能对比")
+    parser.add_argument("--backends", nargs="+", choices=["sqlite", "pooled", "pooled-async"],
+                        default=["sqlite", "pooled", "pooled-async"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="每个thread_id的对话轮数")
+    parser.add_argument("--payload-size", type=int, default=DEFAULT_PAYLOAD_SIZE, help="每条消息的字节数")
+    parser.add_argument("--reads-per-turn", type=int, default=1, help="每轮执行的get_tuple次数")
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="NORMAL",
+                        help="所有后端使用的synchronous设置")
+    args = parser.parse_args(argv)
+
+    payload = "x" * args.payload_size
+    print(f"{'后端':<14}{'并发':>6}{'轮/秒':>12}{'加速比':>10}{'p50(ms)':>12}{'p99(ms)':>12}")
+    for backend in args.backends:
+        baseline = None
+        for concurrency in args.concurrency:
+            result = run_case(
+                backend, concurrency, args.turns, payload, args.reads_per_turn, args.synchronous
+            )
+            baseline = baseline or result["turns_per_second"]
+            print(
+                f"{backend:<14}{concurrency:>6}{result['turns_per_second']:>12.1f}"
+                f"{result['turns_per_second'] / baseline:>10.2f}"
+                f"{result['p50_ms']:>12.2f}{result['p99_ms']:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -16,24 +16,40 @@ SUMMARY_PROMPT = """
 {summary}
 """
 
+ARCHIVE_PROMPT = """
+以下是与当前问题相关的早期对话原文，可用于回答摘要中没有保留的细节。
+
+{turns}
+"""
+
 from state import AgentState
 from llm import LLM_WITH_TOOLS
-from langchain_core.messages import SystemMessage
+from archive import MESSAGE_ARCHIVE, ARCHIVE_TOP_K
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 
-def chat_node(state: AgentState) -> dict:
+def chat_node(state: AgentState, config: RunnableConfig) -> dict:
     """
     对话节点
     """
 
     # 从状态中获取摘要信息
-    summary = state["summary"]
+    summary = state.get("summary")
 
     # 根据是否存在摘要信息，构造系统提示词
     system_prompt = SYSTEM_PROMPT
-    if summary is not None:
+    if summary:
         system_prompt += SUMMARY_PROMPT.format(summary=summary)
 
+        # 检索与最新问题相关的归档对话
+        question = next(
+            (m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), ""
+        )
+        turns = MESSAGE_ARCHIVE.search(config["configurable"]["thread_id"], question, k=ARCHIVE_TOP_K)
+        if turns:
+            system_prompt += ARCHIVE_PROMPT.format(turns="\n\n".join(turns))
+
     # 构造完整消息列表
     messages = [SystemMessage(content=system_prompt)] + state["messages"]
 
@@ -6,8 +6,9 @@
 @Desc    : 基于SQLite的Checkpointer实现
 """
 
-from sqlite import SQLITE_CONN
-from langgraph.checkpoint.sqlite import SqliteSaver
+from sqlite import DB_PATH
+from pooled_sqlite import PooledSqliteSaver
 
-CHECKPOINTER = SqliteSaver(SQLITE_CONN)
+# WAL模式，每个线程独立的只读连接，写操作由单独的写线程合并提交，同时支持invoke和ainvoke
+CHECKPOINTER = PooledSqliteSaver(DB_PATH)
 print("已创建SQLite Checkpointer")
@@ -7,11 +7,12 @@
 """
 
 from langgraph.graph.message import MessagesState
+from langchain_core.messages.utils import count_tokens_approximately
 from typing import Literal
 from langgraph.graph import END
 
-# 设置聊天轮次阈值，超过该阈值后生成摘要
-SUMMARY_TURNS = 4
+# 设置消息token预算，未摘要的消息超过该预算后生成摘要
+SUMMARY_TOKEN_BUDGET = 2000
 
 
 def conditional_edge(state: MessagesState) -> Literal["summary_node", END]:
@@ -19,8 +20,8 @@ def conditional_edge(state: MessagesState) -> Literal["summary_node", END]:
     条件边
     """
 
-    # 如果当前聊天记录超过指定轮次，则生成摘要，否则结束对话
-    if len(state["messages"]) >= SUMMARY_TURNS:
+    # 如果未摘要的消息超过token预算，则生成摘要，否则结束对话
+    if count_tokens_approximately(state["messages"]) >= SUMMARY_TOKEN_BUDGET:
         return "summary_node"
     else:
         return END
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : deferred_summary.py
+@Desc    : 延迟执行的后台摘要
+
+每轮对话在summary_node之前中断，chat_node的回复立即返回给用户；
+需要摘要时（条件边路由到summary_node），由后台线程恢复执行该节点。
+同一线程的下一轮对话开始前会等待尚未完成的摘要，保证状态按顺序更新。
+摘要失败或进程重启后遗留的待执行摘要不会在对话中同步重做：下一轮以新输入开始执行，
+chat_node之后条件边重新按token预算判断，仍需要摘要时由后台线程再次执行。
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+# 后台摘要线程数
+SUMMARY_WORKERS = 2
+
+
+class DeferredSummarizer:
+    """
+    对话入口：回复先返回，摘要在后台执行
+    """
+
+    def __init__(self, agent: CompiledStateGraph, max_workers: int = SUMMARY_WORKERS):
+        """
+        初始化
+
+        Args:
+            agent: 包含summary_node的Agent
+            max_workers: 后台摘要线程数
+        """
+        self.agent = agent
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+        self._pending: dict[str, Future] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _thread_lock(self, thread_id: str) -> threading.Lock:
+        """每个线程一把锁，同一线程的对话轮次串行执行"""
+        with self._locks_guard:
+            return self._locks.setdefault(thread_id, threading.Lock())
+
+    def _summarize(self, config: RunnableConfig):
+        """从中断处恢复执行，运行summary_node"""
+        self.agent.invoke(None, config)
+
+    def _drain(self, thread_id: str):
+        """等待该线程尚未完成的摘要，失败时只记录错误，不影响本轮对话"""
+        future = self._pending.pop(thread_id, None)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as e:
+            print(f"后台摘要失败（thread_id={thread_id}），将在之后的对话中重新执行: {e}")
+
+    def chat(self, input: dict, config: RunnableConfig) -> dict:
+        """
+        执行一轮对话
+
+        Args:
+            input: 图的输入，如 {"messages": [HumanMessage(...)]}
+            config: 运行配置，包含thread_id
+
+        Returns:
+            chat_node执行后的状态
+        """
+        thread_id = config["configurable"]["thread_id"]
+        with self._thread_lock(thread_id):
+            self._drain(thread_id)
+            output = self.agent.invoke(input, config, interrupt_before=["summary_node"])
+            if "summary_node" in self.agent.get_state(config).next:
+                self._pending[thread_id] = self._executor.submit(self._summarize, config)
+        return output
+
+    def wait(self, thread_id: Optional[str] = None):
+        """
+        等待后台摘要完成
+
+        Args:
+            thread_id: 只等待该线程，None表示等待所有线程
+        """
+        thread_ids = [thread_id] if thread_id is not None else list(self._pending)
+        for tid in thread_ids:
+            self._drain(tid)
+
+    def close(self):
+        """等待所有后台摘要完成并关闭线程池"""
+        self.wait()
+        self._executor.shutdown(wait=True)
@@ -8,7 +8,7 @@
 
 import dotenv
 import os
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from tools import tools
 
 # 加载环境变量
@@ -22,3 +22,11 @@ LLM = ChatOpenAI(
 )
 
 LLM_WITH_TOOLS = LLM.bind_tools(tools)
+
+# 创建智谱Embedding模型，用于归档消息的向量检索
+EMBEDDINGS = OpenAIEmbeddings(
+    model="embedding-3",
+    openai_api_key=os.getenv("ZHIPU_API_KEY"),
+    openai_api_base=os.getenv("ZHIPU_BASE_URL"),
+    check_embedding_ctx_length=False,
+)
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19
+@Author  : ZhangShenao
+@File    : pooled_sqlite.py
+@Desc    : 支持并发的SQLite Checkpointer
+
+SqliteSaver所有读写共用一个连接和一把锁，多个对话并发时只能排队执行。
+PooledSqliteSaver在SqliteSaver的基础上：
+1. 使用WAL日志模式，读写互不阻塞，synchronous默认调整为NORMAL
+2. 每个线程使用独立的只读连接，读操作并发执行
+3. 所有写操作交给唯一的写线程，同一时间提交的写入合并为一个事务（组提交），
+   调用方等待所在的事务提交后返回，保证读到自己的写入
+4. 提供异步接口，可用于ainvoke/astream
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import closing, contextmanager
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.utils import load_pending_writes, pending_writes_sql, search_where
+
+# 写线程每个事务最多合并的写操作数
+WRITE_BATCH_SIZE = 64
+
+# 等待数据库锁的超时时间（毫秒）
+BUSY_TIMEOUT_MS = 5000
+
+
+class _WriteCursor:
+    """
+    记录SqliteSaver写操作中执行的语句
+
+    cursor(transaction=True)上下文结束时，记录的语句作为一个写任务交给写线程执行
+    """
+
+    def __init__(self):
+        self.statements: list[tuple[str, Any, bool]] = []
+
+    def execute(self, sql: str, parameters: Sequence = ()):
+        self.statements.append((sql, parameters, False))
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters):
+        self.statements.append((sql, list(seq_of_parameters), True))
+        return self
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """
+    基于WAL的并发SQLite Checkpointer
+
+    使用示例:
+        checkpointer = PooledSqliteSaver("db/memory.db")
+        agent = graph.compile(checkpointer=checkpointer)
+        agent.invoke(...)          # 同步
+        await agent.ainvoke(...)   # 异步
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        synchronous: str = "NORMAL",
+        write_batch_size: int = WRITE_BATCH_SIZE,
+    ):
+        """
+        初始化
+
+        Args:
+            db_path: 数据库文件路径（多个连接共享同一个文件，不支持 :memory:）
+            serde: 序列化器
+            synchronous: 写连接的synchronous设置，WAL模式下NORMAL只在检查点时同步磁盘，
+                进程崩溃不会丢失已提交的事务，掉电可能丢失最后几个事务；需要更强的持久性时使用FULL
+            write_batch_size: 每个事务最多合并的写操作数
+        """
+        if db_path == ":memory:":
+            raise ValueError("PooledSqliteSaver需要数据库文件路径，不支持 :memory:")
+        self.db_path = db_path
+        self.write_batch_size = write_batch_size
+
+        # 写连接只在写线程中使用（初始化表结构除外）
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        super().__init__(conn, serde=serde)
+        self.setup()
+
+        # 每个线程的只读连接
+        self._local = threading.local()
+        self._read_conns: list[sqlite3.Connection] = []
+        self._read_conns_lock = threading.Lock()
+
+        # 写线程
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="sqlite-checkpoint-writer", daemon=True)
+        self._writer.start()
+
+    def _read_conn(self) -> sqlite3.Connection:
+        """获取当前线程的只读连接（首次使用时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        """
+        覆盖SqliteSaver的游标：读操作使用当前线程的只读连接，不加锁；
+        写操作先记录语句，上下文结束时提交给写线程并等待事务提交
+        """
+        if not transaction:
+            cur = self._read_conn().cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+            return
+
+        recorder = _WriteCursor()
+        yield recorder
+        if recorder.statements:
+            if not self._writer.is_alive():
+                raise RuntimeError("PooledSqliteSaver已关闭")
+            future: Future = Future()
+            self._queue.put((recorder.statements, future))
+            future.result()
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """
+        覆盖SqliteSaver.list：SqliteSaver在写连接上读取待处理写入，而写连接只能由写线程使用
+        （可能正处于未提交的组提交事务中），这里检查点和待处理写入都从当前线程的只读连接读取
+        """
+        where, param_values = search_where(config, filter, before)
+        query = f"""SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata
+        FROM checkpoints
+        {where}
+        ORDER BY checkpoint_id DESC"""
+        if limit is not None:
+            query += " LIMIT ?"
+            param_values = (*param_values, limit)
+        conn = self._read_conn()
+        with closing(conn.cursor()) as cur, closing(conn.cursor()) as wcur:
+            cur.execute(query, param_values)
+            for thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata in cur:
+                wcur.execute(pending_writes_sql(self._has_task_path), (thread_id, checkpoint_ns, checkpoint_id))
+                yield CheckpointTuple(
+                    {
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": checkpoint_ns,
+                            "checkpoint_id": checkpoint_id,
+                        }
+                    },
+                    self.serde.loads_typed((type_, checkpoint)),
+                    json.loads(metadata) if metadata is not None else {},
+                    (
+                        {
+                            "configurable": {
+                                "thread_id": thread_id,
+                                "checkpoint_ns": checkpoint_ns,
+                                "checkpoint_id": parent_checkpoint_id,
+                            }
+                        }
+                        if parent_checkpoint_id
+                        else None
+                    ),
+                    load_pending_writes(wcur, self.serde),
+                )
+
+    def _execute(self, statements: list[tuple[str, Any, bool]]):
+        for sql, parameters, many in statements:
+            if many:
+                self.conn.executemany(sql, parameters)
+            else:
+                self.conn.execute(sql, parameters)
+
+    def _write_loop(self):
+        """写线程：把队列中已有的写任务合并到一个事务中提交"""
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.write_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            jobs = [job for job in batch if job is not None]
+            try:
+                if jobs:
+                    self._write_batch(jobs)
+            except Exception as e:
+                # 写线程不能退出，否则所有等待写入的调用方都会一直阻塞
+                for _, future in jobs:
+                    if not future.done():
+                        future.set_exception(e)
+            if stop:
+                return
+
+    def _rollback(self):
+        """回滚当前事务（BEGIN失败时没有进行中的事务，无需回滚）"""
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+
+    def _write_batch(self, jobs: list):
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            # 超过busy_timeout仍未拿到写锁（SQLITE_BUSY），逐个重试也会同样等待，本批写任务直接失败
+            for _, future in jobs:
+                future.set_exception(e)
+            return
+        try:
+            for statements, _ in jobs:
+                self._execute(statements)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self._rollback()
+            # 合并提交失败时逐个提交，只让出错的写任务失败
+            self._write_one_by_one(jobs)
+        else:
+            for _, future in jobs:
+                future.set_result(None)
+
+    def _write_one_by_one(self, jobs: list):
+        for statements, future in jobs:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self._execute(statements)
+                self.conn.execute("COMMIT")
+            except Exception as e:
+                try:
+                    self._rollback()
+                finally:
+                    future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def close(self):
+        """等待写线程处理完已提交的写入，关闭所有连接"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+        self.conn.close()
+
+    # 异步接口：在线程池中调用同步实现，读写都能并发执行
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -6,13 +6,13 @@
 @Desc    : 使用SQLite作为短期记忆的外部存储
 """
 
-import sqlite3
+import os
 
 
 # 设置数据库文件路径
 DB_PATH = "db/memory.db"
 
-# 创建数据库连接
-SQLITE_CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
+# 确保数据库目录存在（连接由PooledSqliteSaver按线程创建）
+os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-print(f"已连接到持久化SQLite数据库，文件路径: {DB_PATH}")
+print(f"持久化SQLite数据库文件路径: {DB_PATH}")
@@ -7,44 +7,71 @@
 """
 
 from state import AgentState
-from langchain_core.messages import SystemMessage
-from llm import LLM_WITH_TOOLS
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage, get_buffer_string
+from llm import LLM
 from langgraph.graph.message import RemoveMessage
+from langchain_core.runnables import RunnableConfig
+from archive import MESSAGE_ARCHIVE
 
 SYSTEM_PROMPT = """
-请根据用户与AI助手的历史聊天记录，提前关键信息，生成精准的摘要。
+请根据用户与AI助手的历史聊天记录，提取关键信息，生成精准的摘要。
 """
 
 SUMMARY_PROMPT = """
-以下是当前最新的摘要
+以下是当前最新的摘要，请将新的聊天记录合并到摘要中，输出更新后的完整摘要。
 
 {summary}
 """
 
+# 摘要后保留的最近消息数量（保留的消息原样发送给LLM，不合并到摘要中）
+KEEP_MESSAGES = 2
 
-def summary_node(state: AgentState) -> dict:
+
+def split_index(messages: list) -> int:
+    """
+    计算需要合并到摘要中的消息数量
+
+    保留最近的KEEP_MESSAGES条消息，并且保留的消息不能以ToolMessage开头，
+    否则工具调用结果会与发起调用的AI消息分离
+    """
+    index = max(len(messages) - KEEP_MESSAGES, 0)
+    while 0 < index < len(messages) and isinstance(messages[index], ToolMessage):
+        index -= 1
+    return index
+
+
+def summary_node(state: AgentState, config: RunnableConfig) -> dict:
     """
     摘要节点
+
+    只把新的消息合并到已有摘要中：摘要覆盖的消息已经被删除，
+    状态中的消息都是尚未摘要的
     """
 
-    # 获取消息列表
+    # 获取需要合并到摘要中的消息
     messages = state["messages"]
+    folded = messages[:split_index(messages)]
+    if not folded:
+        return {}
 
-    # 获取摘要信息
-    summary = state["summary"]
-
-    # 根据系统提示词和消息列表，生成摘要
-    system_message = SystemMessage(content=SYSTEM_PROMPT)
-    messages = [system_message] + messages
+    # 根据系统提示词、已有摘要和新的聊天记录，生成最新的摘要
+    summary = state.get("summary")
+    system_prompt = SYSTEM_PROMPT
+    if summary:
+        system_prompt += SUMMARY_PROMPT.format(summary=summary)
+    prompt = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=get_buffer_string(folded)),
+    ]
 
-    # 构造完整消息列表
-    messages = [SystemMessage(content=SYSTEM_PROMPT)] + messages
+    # 摘要不需要调用工具，使用不绑定工具的LLM
+    summary = LLM.invoke(prompt).content
 
-    # 调用LLM，生成最新的摘要
-    summary = LLM_WITH_TOOLS.invoke(messages).content
+    # 删除前将原始消息归档，chat_node可以按需检索
+    MESSAGE_ARCHIVE.add(config["configurable"]["thread_id"], folded)
 
-    # 摘要生成成功,删除最近2条消息之前的所有消息
+    # 摘要生成成功，删除已经合并到摘要中的消息
     # 使用RemoveMessage来标记要删除的消息
-    delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
+    delete_messages = [RemoveMessage(id=m.id) for m in folded]
 
     return {"summary": summary, "messages": delete_messages}
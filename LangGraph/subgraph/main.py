@@ -102,7 +102,9 @@ def run_travel_agent_with_stream():
     # 创建MongoDB持久化存储
     mongodb_uri = "mongodb://localhost:27017"
     db_name = "travel_agent"
-    checkpointer = MongoDBSaver.from_conn_string(mongodb_uri, db_name=db_name)
+    # 每个会话只保留最近50个检查点，后台线程定期清理旧检查点和孤立数据
+    checkpointer = MongoDBSaver.from_conn_string(mongodb_uri, db_name=db_name, keep_last=50)
+    checkpointer.start_compactor()
 
     # 构建主 Agent，并设置checkpointer
     agent = build_travel_agent(checkpointer=checkpointer)
@@ -165,6 +167,14 @@ def run_travel_agent_with_stream():
             print()
             print(f"🤖 助手: {final_response}")
 
+        # 一次查询获取主图和各子图的最新检查点
+        latest = checkpointer.get_namespace_tuples(config)
+        print()
+        print("📦 最新检查点:")
+        for checkpoint_ns, checkpoint_tuple in latest.items():
+            namespace = tuple(checkpoint_ns.split("|")) if checkpoint_ns else ()
+            print(f"  • {format_namespace(namespace)}: step={checkpoint_tuple.metadata.get('step')}")
+
         print()
         print("-" * 70)
         print()
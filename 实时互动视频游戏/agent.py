@@ -2,6 +2,8 @@
 """
 主Agent：LangGraph工作流
 """
+from typing import AsyncIterator, Optional
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import START, END, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from state import GameState
@@ -10,50 +12,89 @@ from nodes import (
     storyboard_node,
     extract_frame_node,
     video_generation_node,
+    astory_continuation_node,
+    astoryboard_node,
+    aextract_frame_node,
+    avideo_generation_node,
 )
 
+# 工作流步骤顺序
+STEPS = ["story_continuation", "storyboard", "extract_frame", "video_generation"]
 
-def build_agent() -> CompiledStateGraph:
-    """
-    构建Agent工作流
-    流程：续写剧情 -> 构造分镜脚本 -> 抽取图片 -> 创作视频
-    """
+
+def _route_on_error(next_step: str):
+    """构造条件边：当前节点出错时直接结束，否则进入下一个节点"""
+
+    def route(state: GameState) -> str:
+        return END if state.get("error") else next_step
+
+    return route
+
+
+def _build_graph(nodes: list, checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
+    """根据节点函数列表（与STEPS一一对应）构建工作流"""
     # 创建状态图
     graph = StateGraph(GameState)
     
     # 添加节点
-    graph.add_node("story_continuation", story_continuation_node)
-    graph.add_node("storyboard", storyboard_node)
-    graph.add_node("extract_frame", extract_frame_node)
-    graph.add_node("video_generation", video_generation_node)
+    for step, node in zip(STEPS, nodes):
+        graph.add_node(step, node)
     
-    # 添加边（定义工作流）
-    graph.add_edge(START, "story_continuation")
-    graph.add_edge("story_continuation", "storyboard")
-    graph.add_edge("storyboard", "extract_frame")
-    graph.add_edge("extract_frame", "video_generation")
-    graph.add_edge("video_generation", END)
+    # 添加边（定义工作流），任一节点出错时提前结束
+    graph.add_edge(START, STEPS[0])
+    for step, next_step in zip(STEPS, STEPS[1:]):
+        graph.add_conditional_edges(step, _route_on_error(next_step), [next_step, END])
+    graph.add_edge(STEPS[-1], END)
     
     # 编译并返回
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
 
 
-def run_agent_step(agent: CompiledStateGraph, state: GameState, step_name: str) -> dict:
+def build_agent(checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
     """
-    运行Agent的单个步骤
-    用于流式输出，每个步骤完成后立即返回结果
+    构建Agent工作流
+    流程：续写剧情 -> 构造分镜脚本 -> 抽取图片 -> 创作视频
     """
-    # 根据步骤名称执行相应的节点
-    if step_name == "story_continuation":
-        new_state = story_continuation_node(state)
-    elif step_name == "storyboard":
-        new_state = storyboard_node(state)
-    elif step_name == "extract_frame":
-        new_state = extract_frame_node(state)
-    elif step_name == "video_generation":
-        new_state = video_generation_node(state)
-    else:
-        new_state = state
-    
-    return new_state
+    return _build_graph([
+        story_continuation_node,
+        storyboard_node,
+        extract_frame_node,
+        video_generation_node,
+    ], checkpointer)
+
+
+def build_async_agent(checkpointer: Optional[BaseCheckpointSaver] = None) -> CompiledStateGraph:
+    """
+    构建异步Agent工作流（节点均为异步实现）
+    通过astream执行，同一事件循环可以同时驱动多个玩家会话
+    指定checkpointer后，游戏状态按thread_id（即session_id）持久化
+    """
+    return _build_graph([
+        astory_continuation_node,
+        astoryboard_node,
+        aextract_frame_node,
+        avideo_generation_node,
+    ], checkpointer)
 
+
+async def astream_turn(
+    agent: CompiledStateGraph, state: dict, config: Optional[dict] = None
+) -> AsyncIterator[tuple]:
+    """
+    通过编译后的图异步执行一轮游戏，并逐个产出事件
+
+    Args:
+        agent: 编译后的图
+        state: 输入状态（使用checkpointer时只需传入本轮变更的字段）
+        config: 运行配置（使用checkpointer时需包含thread_id）
+
+    Yields:
+        (mode, payload) 元组：
+        - ("custom", {"node": ..., "delta"/"shot": ...})：节点内的流式事件
+        - ("updates", {node_name: update})：节点执行完成后的状态更新
+        - ("values", state)：每个节点执行后的完整状态，最后一个即为本轮最终状态
+    """
+    async for mode, payload in agent.astream(
+        state, config=config, stream_mode=["custom", "updates", "values"]
+    ):
+        yield mode, payload
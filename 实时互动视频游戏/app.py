@@ -3,6 +3,7 @@
 Streamlit前端应用
 """
 import streamlit as st
+import asyncio
 import time
 import sys
 from pathlib import Path
@@ -14,11 +15,13 @@ sys.path.insert(0, str(current_dir))
 
 from worldview import get_default_worldview  # , generate_cover_image
 from state import GameState
-from agent import run_agent_step
+from agent import build_async_agent, astream_turn
+from manifest import get_manifest
+from session_store import GameSessionStore, SESSION_DB_PATH, session_config
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from utils import ensure_data_dir, concatenate_videos
-from nodes import story_continuation_node_stream, storyboard_node_stream
-from nodes.extract_frame_node import extract_frame_node
-from nodes.video_node import video_generation_node
+from stream_renderer import ThrottledRenderer
+from postprocess import get_artifact
 
 
 # 页面配置
@@ -30,46 +33,55 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def get_session_store() -> GameSessionStore:
+    """会话存储（进程内单例）"""
+    return GameSessionStore()
+
+
 # 获取或生成session_id（用于数据隔离）
 def get_session_id() -> str:
-    """获取或生成唯一的session_id"""
+    """获取或生成唯一的session_id（写入URL参数，刷新页面或切换副本后仍可恢复会话）"""
     import uuid
 
     # 如果session_state中已有session_id，直接返回
     if "session_id" not in st.session_state:
-        # 生成新的唯一ID
-        st.session_state.session_id = str(uuid.uuid4())
+        # 优先从URL参数恢复，否则生成新的唯一ID
+        st.session_state.session_id = st.query_params.get("session") or str(uuid.uuid4())
+        st.query_params["session"] = st.session_state.session_id
     return st.session_state.session_id
 
 
-# 初始化会话状态
-if "game_state" not in st.session_state:
-    worldview = get_default_worldview()
-    # 确保session_id已生成
-    session_id = get_session_id()
-    st.session_state.game_state = {
+def initial_game_state(session_id: str) -> dict:
+    """新会话的初始状态"""
+    return {
         "session_id": session_id,
         "messages": [],
-        "story_context": worldview,
+        "story_context": get_default_worldview(),
         "latest_story": None,
         "storyboard": None,
         "storyboard_shots": None,
         "reference_image_path": None,
         "video_path": None,
         "last_video_id": None,  # 上一次生成的视频ID（用于remix）
+        "last_video_backend": None,  # 上一次生成视频所用的后端
         "current_step": "idle",
         "error": None,
     }
-else:
-    # 确保game_state中的session_id与session_state中的保持一致
-    if "session_id" not in st.session_state.game_state:
-        st.session_state.game_state["session_id"] = get_session_id()
+
+
+# 加载会话状态：游戏状态持久化在Checkpointer中，进程内只缓存最近一页消息，
+# 不放入st.session_state，空闲会话可以被及时淘汰
+session_id = get_session_id()
+session_store = get_session_store()
+game_state = session_store.load_state(session_id) or initial_game_state(session_id)
 
 if "show_worldview" not in st.session_state:
-    st.session_state.show_worldview = True
+    # 恢复已有会话时直接进入游戏
+    st.session_state.show_worldview = not game_state["messages"]
 
-if "video_list" not in st.session_state:
-    st.session_state.video_list = []
+# 视频列表从会话清单查询（按生成顺序）
+video_list = [video["path"] for video in get_manifest(session_id).list_artifacts("video")]
 
 # if "cover_image_path" not in st.session_state:
 #     st.session_state.cover_image_path = None
@@ -77,6 +89,23 @@ if "video_list" not in st.session_state:
 if "full_video_path" not in st.session_state:
     st.session_state.full_video_path = None  # 完整拼接视频路径
 
+# 聊天记录、历史剧情和视频列表分页大小（每次重新运行只渲染最近的一页，开销不随游戏时长增长）
+CHAT_PAGE_SIZE = 20
+CHAPTER_PAGE_SIZE = 3
+VIDEO_PAGE_SIZE = 5
+
+if "chat_visible_count" not in st.session_state:
+    st.session_state.chat_visible_count = CHAT_PAGE_SIZE
+
+if "chapter_visible_count" not in st.session_state:
+    st.session_state.chapter_visible_count = CHAPTER_PAGE_SIZE
+
+if "video_visible_count" not in st.session_state:
+    st.session_state.video_visible_count = VIDEO_PAGE_SIZE
+
+if "playing_video" not in st.session_state:
+    st.session_state.playing_video = None  # 当前展开播放的分段视频
+
 
 def display_worldview():
     """显示世界观"""
@@ -85,8 +114,10 @@ def display_worldview():
         # if st.session_state.cover_image_path is None:
         #     with st.spinner("🎨 正在生成游戏封面图..."):
         #         # 使用世界观文本生成匹配的封面图
-        #         worldview_text = st.session_state.game_state.get("story_context", "")
-        #         cover_path = generate_cover_image(worldview_text=worldview_text)
+        #         worldview_text = game_state.get("story_context", "")
+        #         cover_path = generate_cover_image(
+        #             worldview_text=worldview_text, session_id=session_id
+        #         )
         #         if cover_path:
         #             st.session_state.cover_image_path = cover_path
 
@@ -99,29 +130,20 @@ def display_worldview():
         #     st.markdown("---")
 
         with st.expander("📖 游戏世界观和故事背景", expanded=True):
-            st.markdown(st.session_state.game_state["story_context"])
+            st.markdown(game_state["story_context"])
 
         # 按钮布局
         # col1, col2 = st.columns(2)
         # with col1:
         #     if st.button("🔄 重新生成封面图", use_container_width=True):
         #         with st.spinner("🎨 正在重新生成游戏封面图..."):
-        #             # 删除旧封面图
-        #             old_cover = st.session_state.cover_image_path
-        #             if old_cover and Path(old_cover).exists():
-        #                 try:
-        #                     Path(old_cover).unlink()
-        #                 except:
-        #                     pass
-
-        #             # 清空封面图路径，强制重新生成
-        #             st.session_state.cover_image_path = None
-
-        #             # 生成新封面图
-        #             worldview_text = st.session_state.game_state.get(
+        #             # 忽略缓存重新生成（共享缓存中的旧图会被替换）
+        #             worldview_text = game_state.get(
         #                 "story_context", ""
         #             )
-        #             cover_path = generate_cover_image(worldview_text=worldview_text)
+        #             cover_path = generate_cover_image(
+        #                 worldview_text=worldview_text, session_id=session_id, force=True
+        #             )
         #             if cover_path:
         #                 st.session_state.cover_image_path = cover_path
         #                 st.success("✅ 封面图已重新生成！")
@@ -141,24 +163,31 @@ def display_chat():
 
     # 在游戏界面中显示世界观（可折叠）
     with st.expander("📖 游戏世界观和故事背景", expanded=False):
-        st.markdown(st.session_state.game_state["story_context"])
+        st.markdown(game_state["story_context"])
 
     st.markdown("---")
 
-    # 显示聊天历史
+    # 显示聊天历史（只渲染最近的消息，更早的消息按需加载）
+    visible_count = st.session_state.chat_visible_count
+    messages = session_store.load_messages(session_id, visible_count)
     chat_container = st.container()
     with chat_container:
-        for msg in st.session_state.game_state["messages"]:
+        hidden_count = max(session_store.message_count(session_id) - len(messages), 0)
+        if hidden_count:
+            if st.button(f"⬆️ 加载更早的消息（还有{hidden_count}条）", use_container_width=True):
+                st.session_state.chat_visible_count += CHAT_PAGE_SIZE
+                st.rerun()
+        for msg in messages:
             if isinstance(msg, HumanMessage):
                 with st.chat_message("user"):
-                    st.write(msg.content)
+                    st.markdown(msg.content)
             elif isinstance(msg, AIMessage):
                 with st.chat_message("assistant"):
-                    st.write(msg.content)
+                    st.markdown(msg.content)
 
     # 显示当前状态
-    if st.session_state.game_state.get("current_step") != "idle":
-        current_step = st.session_state.game_state["current_step"]
+    if game_state.get("current_step") not in ("idle", "completed"):
+        current_step = game_state["current_step"]
         step_names = {
             "story_continuation": "📝 正在续写剧情...",
             "storyboard": "🎬 正在生成分镜脚本...",
@@ -170,22 +199,54 @@ def display_chat():
         st.info(step_names.get(current_step, "处理中..."))
 
     # 显示错误
-    if st.session_state.game_state.get("error"):
-        st.error(f"错误: {st.session_state.game_state['error']}")
+    if game_state.get("error"):
+        st.error(f"错误: {game_state['error']}")
 
 
 def display_story():
     """显示最新剧情"""
-    if st.session_state.game_state.get("latest_story"):
+    if game_state.get("latest_story"):
         with st.expander("📖 最新剧情", expanded=True):
-            st.markdown(st.session_state.game_state["latest_story"])
+            st.markdown(game_state["latest_story"])
+
+
+def display_chapters():
+    """显示历史剧情（按需读取故事文件，从最新的章节往前翻）"""
+    visible_count = st.session_state.chapter_visible_count
+    # 多读取一章，用于判断是否还有更早的剧情
+    chapters = session_store.load_chapters(session_id, visible_count + 1)
+    if not chapters:
+        return
+    with st.expander("📚 历史剧情", expanded=False):
+        for chapter in reversed(chapters[-visible_count:]):
+            st.markdown(chapter)
+            st.markdown("---")
+        if len(chapters) > visible_count:
+            if st.button("⬇️ 加载更早的剧情", use_container_width=True):
+                st.session_state.chapter_visible_count += CHAPTER_PAGE_SIZE
+                st.rerun()
+
+
+def start_new_game():
+    """开始新游戏：释放当前会话的内存缓存（持久化数据保留，可通过原链接恢复），切换到新的session_id"""
+    import uuid
+
+    session_store.evict(session_id)
+    st.session_state.session_id = str(uuid.uuid4())
+    st.query_params["session"] = st.session_state.session_id
+    st.session_state.show_worldview = True
+    st.session_state.full_video_path = None
+    st.session_state.playing_video = None
+    st.session_state.chat_visible_count = CHAT_PAGE_SIZE
+    st.session_state.chapter_visible_count = CHAPTER_PAGE_SIZE
+    st.session_state.video_visible_count = VIDEO_PAGE_SIZE
 
 
 def display_storyboard():
     """显示分镜脚本"""
-    if st.session_state.game_state.get("storyboard_shots"):
+    if game_state.get("storyboard_shots"):
         with st.expander("🎬 分镜脚本", expanded=False):
-            shots = st.session_state.game_state["storyboard_shots"]
+            shots = game_state["storyboard_shots"]
             for i, shot in enumerate(shots, 1):
                 st.markdown(f"**分镜 {i}** (时长: {shot.get('duration', 0)}秒)")
                 st.write(f"描述: {shot.get('description', '')}")
@@ -196,15 +257,15 @@ def display_storyboard():
 
 def display_video():
     """显示所有生成的视频（持续保留在侧边栏）"""
-    if st.session_state.video_list:
+    if video_list:
         st.markdown("### 🎥 生成的视频")
 
         # 生成完整视频按钮
-        if len(st.session_state.video_list) > 1:
+        if len(video_list) > 1:
             if st.button("🎬 生成完整视频", type="primary", use_container_width=True):
                 with st.spinner("正在拼接所有视频..."):
                     # 按顺序拼接视频（video_list已经按顺序保存）
-                    session_id = st.session_state.game_state.get(
+                    session_id = game_state.get(
                         "session_id", "default"
                     )
                     output_path = str(
@@ -214,9 +275,12 @@ def display_video():
                         / "videos"
                         / "full_video.mp4"
                     )
-                    success = concatenate_videos(
-                        st.session_state.video_list, output_path
-                    )
+                    # 优先使用后台统一编码后的版本，拼接时可以直接复制流
+                    video_paths = [
+                        get_artifact(vp, "normalized", session_id) or vp
+                        for vp in video_list
+                    ]
+                    success = concatenate_videos(video_paths, output_path)
                     if success:
                         # 确保路径是绝对路径
                         full_path = Path(output_path).resolve()
@@ -238,7 +302,7 @@ def display_video():
             st.markdown("---")
         else:
             # 检查是否有完整视频文件但未加载到状态中
-            session_id = st.session_state.game_state.get("session_id", "default")
+            session_id = game_state.get("session_id", "default")
             default_full_video = (
                 Path(__file__).parent
                 / "data"
@@ -253,86 +317,123 @@ def display_video():
                 st.markdown("---")
 
         # 显示所有历史视频，最新的在最上面
+        # 只显示封面缩略图，点击后才加载视频；更早的视频按需加载
         st.markdown("#### 📹 分段视频")
-        for idx, video_path in enumerate(reversed(st.session_state.video_list), 1):
+        session_id = game_state.get("session_id", "default")
+        visible_videos = list(reversed(video_list))[: st.session_state.video_visible_count]
+        for idx, video_path in enumerate(visible_videos, 1):
             if video_path and Path(video_path).exists():
-                st.markdown(f"**视频 {len(st.session_state.video_list) - idx + 1}**")
-                st.video(video_path)
-                if idx < len(st.session_state.video_list):
+                video_number = len(video_list) - idx + 1
+                st.markdown(f"**视频 {video_number}**")
+                if st.session_state.playing_video == video_path:
+                    st.video(video_path)
+                else:
+                    poster = get_artifact(video_path, "poster", session_id, wait=False)
+                    if poster:
+                        st.image(poster, use_container_width=True)
+                    if st.button("▶️ 播放", key=f"play_video_{video_number}", use_container_width=True):
+                        st.session_state.playing_video = video_path
+                        st.rerun()
+                if idx < len(visible_videos):
                     st.markdown("---")
+        if len(video_list) > len(visible_videos):
+            if st.button("⬇️ 加载更早的视频", use_container_width=True):
+                st.session_state.video_visible_count += VIDEO_PAGE_SIZE
+                st.rerun()
 
 
-def process_user_input(user_input: str):
-    """处理用户输入并执行工作流（支持流式输出）"""
-    # 添加用户消息
-    st.session_state.game_state["messages"].append(HumanMessage(content=user_input))
-
+async def run_turn(turn_input: dict) -> dict:
+    """通过编译后的图异步执行一轮游戏，并把每个节点的事件实时渲染到前端"""
     # 步骤1: 续写剧情（流式输出）
-    st.session_state.game_state["current_step"] = "story_continuation"
     with st.chat_message("assistant"):
         story_placeholder = st.empty()
         story_placeholder.markdown("📝 正在续写剧情...")
-
-        st.session_state.game_state = story_continuation_node_stream(
-            st.session_state.game_state, stream_placeholder=story_placeholder
-        )
-
-        if st.session_state.game_state.get("error"):
-            st.error(f"错误: {st.session_state.game_state['error']}")
-            return
+    story_renderer = ThrottledRenderer(story_placeholder, "markdown")
 
     # 步骤2: 生成分镜脚本（流式输出）
-    st.session_state.game_state["current_step"] = "storyboard"
     with st.chat_message("assistant"):
         storyboard_placeholder = st.empty()
-        storyboard_placeholder.markdown("🎬 正在生成分镜脚本...")
-
-        st.session_state.game_state = storyboard_node_stream(
-            st.session_state.game_state, stream_placeholder=storyboard_placeholder
-        )
-
-        if st.session_state.game_state.get("error"):
-            st.error(f"错误: {st.session_state.game_state['error']}")
-            return
-
-        # 显示最终的分镜脚本摘要
-        shots_count = len(st.session_state.game_state.get("storyboard_shots", []))
-        storyboard_placeholder.markdown(f"✅ 分镜脚本已生成，共{shots_count}个分镜")
+        shots_placeholder = st.empty()
+    storyboard_renderer = ThrottledRenderer(storyboard_placeholder, "code", language="json")
+
+    # 步骤3、4: 抽取参考图片、生成视频
+    step_placeholder = st.empty()
+
+    story_text = ""
+    storyboard_text = ""
+    streamed_shots = []
+    final_state = turn_input
+
+    # 状态按session_id持久化到SQLite检查点，本轮只需传入变更的字段
+    async with AsyncSqliteSaver.from_conn_string(SESSION_DB_PATH) as checkpointer:
+        agent = build_async_agent(checkpointer=checkpointer)
+        async for mode, payload in astream_turn(
+            agent, turn_input, config=session_config(session_id)
+        ):
+            if mode == "custom":
+                node = payload.get("node")
+                if node == "story_continuation" and "delta" in payload:
+                    story_text += payload["delta"]
+                    story_renderer.update(story_text)
+                elif node == "storyboard" and "delta" in payload:
+                    storyboard_text += payload["delta"]
+                    storyboard_renderer.update(storyboard_text)
+                elif node == "storyboard" and "shot" in payload:
+                    # 每个分镜解析完成后立即展示，无需等待整个分镜脚本生成完毕
+                    shot = payload["shot"]
+                    streamed_shots.append(shot)
+                    shots_placeholder.caption(
+                        f"已解析 {len(streamed_shots)} 个分镜，最新：{shot.get('description', '')}"
+                    )
+            elif mode == "updates":
+                for node, update in payload.items():
+                    if not update or update.get("error"):
+                        continue
+                    if node == "story_continuation":
+                        story_renderer.flush(update.get("latest_story") or story_text)
+                        storyboard_placeholder.markdown("🎬 正在生成分镜脚本...")
+                    elif node == "storyboard":
+                        shots_count = len(update.get("storyboard_shots") or [])
+                        shots_placeholder.empty()
+                        storyboard_placeholder.markdown(f"✅ 分镜脚本已生成，共{shots_count}个分镜")
+                        step_placeholder.info("🖼️ 正在抽取参考图片...")
+                    elif node == "extract_frame":
+                        step_placeholder.info("🎥 正在生成视频，这可能需要几分钟...")
+                    elif node == "video_generation":
+                        step_placeholder.empty()
+            elif mode == "values":
+                final_state = payload
+
+    return final_state
 
-    # 步骤3: 抽取参考图片
-    st.session_state.game_state["current_step"] = "extract_frame"
-    st.info("🖼️ 正在抽取参考图片...")
-    st.session_state.game_state = extract_frame_node(st.session_state.game_state)
 
-    if st.session_state.game_state.get("error"):
-        st.error(f"错误: {st.session_state.game_state['error']}")
-        return
+def process_user_input(user_input: str):
+    """处理用户输入并通过LangGraph工作流执行（支持流式输出）"""
+    turn_input = {
+        "session_id": session_id,
+        "messages": [HumanMessage(content=user_input)],
+        "current_step": "story_continuation",
+        "error": None,
+    }
+    # 新会话首轮需要写入完整的初始状态
+    if not session_store.exists(session_id):
+        turn_input = {**initial_game_state(session_id), **turn_input}
 
-    # 步骤4: 生成视频
-    st.session_state.game_state["current_step"] = "video_generation"
-    with st.spinner("🎥 正在生成视频，这可能需要几分钟..."):
-        st.session_state.game_state = video_generation_node(st.session_state.game_state)
+    final_state = asyncio.run(run_turn(turn_input))
+    session_store.update(session_id, final_state)
 
-    if st.session_state.game_state.get("error"):
-        st.error(f"错误: {st.session_state.game_state['error']}")
+    if final_state.get("error"):
+        st.error(f"错误: {final_state['error']}")
         return
 
-    # 重置步骤状态
-    if st.session_state.game_state.get("current_step") == "completed":
-        st.session_state.game_state["current_step"] = "idle"
-        # 将新生成的视频添加到视频列表
-        video_path = st.session_state.game_state.get("video_path")
-        if video_path and Path(video_path).exists():
-            # 避免重复添加
-            if video_path not in st.session_state.video_list:
-                st.session_state.video_list.append(video_path)
+    if final_state.get("current_step") == "completed":
         st.success("✅ 视频生成完成！")
 
 
 def main():
     """主函数"""
     # 确保数据目录存在（使用session_id）
-    session_id = st.session_state.game_state.get("session_id", "default")
+    session_id = game_state.get("session_id", "default")
     ensure_data_dir(session_id)
 
     # 显示世界观（首次）
@@ -348,24 +449,30 @@ def main():
 
             # 显示世界观（侧边栏版本，方便查看）
             with st.expander("📖 世界观", expanded=False):
-                st.markdown(st.session_state.game_state["story_context"])
+                st.markdown(game_state["story_context"])
 
             st.markdown("---")
 
-            # 显示最新剧情
+            # 显示最新剧情和历史剧情
             display_story()
+            display_chapters()
 
             # 显示分镜脚本
             display_storyboard()
 
             # 显示参考图片
-            ref_image = st.session_state.game_state.get("reference_image_path")
+            ref_image = game_state.get("reference_image_path")
             if ref_image and Path(ref_image).exists():
                 st.image(ref_image, caption="参考图片（上一段视频的最后一帧）")
 
             # 显示视频
             display_video()
 
+            st.markdown("---")
+            if st.button("🆕 开始新游戏", use_container_width=True):
+                start_new_game()
+                st.rerun()
+
         # 用户输入
         user_input = st.chat_input("输入你的行动或对话...")
         if user_input:
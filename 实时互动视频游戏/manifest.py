@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+会话产物清单（Manifest）
+每个会话维护一个SQLite清单文件，原子分配产物索引，
+记录故事、分镜、视频、图片等产物及其关联关系，
+查询产物列表时无需扫描目录
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 产物类型及其所在子目录和文件名模式（用于从旧数据目录迁移）
+ARTIFACT_KINDS = {
+    "story": ("story", "story_*.txt"),
+    "storyboard": ("storyboards", "storyboard_*.json"),
+    "video": ("videos", "video_*.mp4"),
+    "frame": ("images", "video_*_last_frame.jpg"),
+}
+
+MANIFEST_FILE = "manifest.db"
+
+DATA_DIR = Path(__file__).parent / "data"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    kind TEXT PRIMARY KEY,
+    next_index INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    parent_id INTEGER REFERENCES artifacts(id),
+    created_at REAL NOT NULL,
+    UNIQUE (kind, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_parent ON artifacts(parent_id);
+"""
+
+
+class SessionManifest:
+    """
+    单个会话的产物清单
+    """
+
+    def __init__(self, session_dir: Path):
+        """
+        初始化会话清单
+
+        Args:
+            session_dir: 会话数据目录（data/<session_id>）
+        """
+        self.session_dir = session_dir
+        self.session_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # isolation_level=None：由我们显式控制事务（BEGIN IMMEDIATE），保证跨进程原子性
+        self._conn = sqlite3.connect(
+            str(session_dir / MANIFEST_FILE),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate_from_directory()
+
+    def _migrate_from_directory(self):
+        """首次创建清单时，根据已有文件初始化计数器（只执行一次）"""
+        with self._transaction() as cur:
+            existing = cur.execute("SELECT COUNT(*) FROM counters").fetchone()[0]
+            if existing:
+                return
+            for kind, (sub_dir, pattern) in ARTIFACT_KINDS.items():
+                max_index = -1
+                for f in (self.session_dir / sub_dir).glob(pattern):
+                    try:
+                        idx = int(f.stem.split("_")[1])
+                    except (IndexError, ValueError):
+                        continue
+                    max_index = max(max_index, idx)
+                    cur.execute(
+                        "INSERT OR IGNORE INTO artifacts (kind, idx, path, parent_id, created_at) "
+                        "VALUES (?, ?, ?, NULL, ?)",
+                        (kind, idx, str(f), f.stat().st_mtime),
+                    )
+                cur.execute(
+                    "INSERT INTO counters (kind, next_index) VALUES (?, ?)",
+                    (kind, max_index + 1),
+                )
+
+    @contextmanager
+    def _transaction(self):
+        """获取写事务（BEGIN IMMEDIATE），同一进程内通过锁串行化"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn.cursor()
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                self._conn.execute("COMMIT")
+
+    def allocate_index(self, kind: str) -> int:
+        """
+        原子分配指定类型产物的下一个索引
+
+        Args:
+            kind: 产物类型（story, storyboard, video, frame）
+
+        Returns:
+            分配到的索引
+        """
+        with self._transaction() as cur:
+            row = cur.execute(
+                "SELECT next_index FROM counters WHERE kind = ?", (kind,)
+            ).fetchone()
+            index = row["next_index"] if row else 0
+            cur.execute(
+                "INSERT INTO counters (kind, next_index) VALUES (?, ?) "
+                "ON CONFLICT(kind) DO UPDATE SET next_index = excluded.next_index",
+                (kind, index + 1),
+            )
+            return index
+
+    def peek_index(self, kind: str) -> int:
+        """查看下一个将被分配的索引（不占用）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT next_index FROM counters WHERE kind = ?", (kind,)
+            ).fetchone()
+        return row["next_index"] if row else 0
+
+    def record_artifact(
+        self, kind: str, index: int, path: str, parent_id: Optional[int] = None
+    ) -> int:
+        """
+        记录产物
+
+        Args:
+            kind: 产物类型
+            index: 产物索引
+            path: 产物文件路径
+            parent_id: 关联的上游产物ID（如视频对应的分镜）
+
+        Returns:
+            产物ID
+        """
+        with self._transaction() as cur:
+            cur.execute(
+                "INSERT INTO artifacts (kind, idx, path, parent_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(kind, idx) DO UPDATE SET path = excluded.path, "
+                "parent_id = COALESCE(excluded.parent_id, artifacts.parent_id)",
+                (kind, index, path, parent_id, time.time()),
+            )
+            row = cur.execute(
+                "SELECT id FROM artifacts WHERE kind = ? AND idx = ?", (kind, index)
+            ).fetchone()
+            return row["id"]
+
+    def list_artifacts(self, kind: Optional[str] = None) -> List[Dict]:
+        """
+        按索引顺序列出产物
+
+        Args:
+            kind: 产物类型（可选），为空时返回全部产物
+        """
+        sql = "SELECT id, kind, idx, path, parent_id, created_at FROM artifacts"
+        params = ()
+        if kind:
+            sql += " WHERE kind = ?"
+            params = (kind,)
+        sql += " ORDER BY kind, idx"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_artifact(self, kind: str) -> Optional[Dict]:
+        """获取指定类型的最新产物"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, idx, path, parent_id, created_at FROM artifacts "
+                "WHERE kind = ? ORDER BY idx DESC LIMIT 1",
+                (kind,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_artifact(self, kind: str, path: str) -> Optional[Dict]:
+        """根据路径查找产物"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, idx, path, parent_id, created_at FROM artifacts "
+                "WHERE kind = ? AND path = ?",
+                (kind, path),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def children(self, artifact_id: int) -> List[Dict]:
+        """获取由指定产物派生的下游产物"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, idx, path, parent_id, created_at FROM artifacts "
+                "WHERE parent_id = ? ORDER BY kind, idx",
+                (artifact_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """关闭清单连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_MANIFESTS: Dict[str, SessionManifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(session_id: str = "default") -> SessionManifest:
+    """获取会话清单（进程内按session_id缓存）"""
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(session_id)
+        if manifest is None:
+            manifest = SessionManifest(DATA_DIR / session_id)
+            _MANIFESTS[session_id] = manifest
+        return manifest
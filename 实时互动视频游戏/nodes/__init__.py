@@ -2,10 +2,14 @@
 """
 节点模块
 """
-from .story_node import story_continuation_node, story_continuation_node_stream
-from .storyboard_node import storyboard_node, storyboard_node_stream
-from .extract_frame_node import extract_frame_node
-from .video_node import video_generation_node
+from .story_node import (
+    story_continuation_node,
+    story_continuation_node_stream,
+    astory_continuation_node,
+)
+from .storyboard_node import storyboard_node, storyboard_node_stream, astoryboard_node
+from .extract_frame_node import extract_frame_node, aextract_frame_node
+from .video_node import video_generation_node, avideo_generation_node
 
 __all__ = [
     "story_continuation_node",
@@ -14,5 +18,9 @@ __all__ = [
     "storyboard_node_stream",
     "extract_frame_node",
     "video_generation_node",
+    "astory_continuation_node",
+    "astoryboard_node",
+    "aextract_frame_node",
+    "avideo_generation_node",
 ]
 
@@ -3,13 +3,14 @@
 图片抽取节点
 """
 import sys
+import asyncio
 from pathlib import Path
 
 # 添加父目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from state import GameState
-from utils import extract_last_frame
+from postprocess import get_last_frame
 
 
 def extract_frame_node(state: GameState) -> GameState:
@@ -22,9 +23,9 @@ def extract_frame_node(state: GameState) -> GameState:
         previous_video_path = state.get("video_path")
         
         if previous_video_path and Path(previous_video_path).exists():
-            # 提取最后一帧
+            # 提取最后一帧（优先使用视频下载后的后台预处理结果）
             session_id = state.get("session_id", "default")
-            reference_image_path = extract_last_frame(previous_video_path, session_id=session_id)
+            reference_image_path = get_last_frame(previous_video_path, session_id=session_id)
             
             if reference_image_path:
                 return {
@@ -56,3 +57,31 @@ def extract_frame_node(state: GameState) -> GameState:
             "current_step": "error"
         }
 
+
+
+async def aextract_frame_node(state: GameState) -> dict:
+    """
+    图片抽取节点（异步版本）
+    OpenCV解码在线程池中执行，避免阻塞事件循环
+    """
+    try:
+        reference_image_path = None
+        previous_video_path = state.get("video_path")
+        
+        if previous_video_path and Path(previous_video_path).exists():
+            # 提取最后一帧（优先使用后台预处理结果，失败时不使用参考图片）
+            session_id = state.get("session_id", "default")
+            reference_image_path = await asyncio.to_thread(
+                get_last_frame, previous_video_path, session_id=session_id
+            )
+        
+        return {
+            "reference_image_path": reference_image_path,
+            "current_step": "video_generation",
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "error": f"图片抽取失败: {str(e)}",
+            "current_step": "error"
+        }
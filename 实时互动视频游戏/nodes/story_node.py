@@ -3,6 +3,7 @@
 剧情续写节点
 """
 import sys
+import asyncio
 from pathlib import Path
 from langchain_core.messages import HumanMessage, AIMessage
 
@@ -12,8 +13,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from state import GameState
 from llm import DEEPSEEK
 from prompts import STORY_CONTINUATION_PROMPT
-from utils import save_story, get_next_story_index
+from utils import save_story, allocate_index, get_event_writer
 from worldview import get_default_worldview
+from stream_renderer import ThrottledRenderer
 
 
 def story_continuation_node_stream(state: GameState, stream_placeholder=None):
@@ -43,14 +45,16 @@ def story_continuation_node_stream(state: GameState, stream_placeholder=None):
         # 流式调用LLM生成剧情
         latest_story = ""
         if stream_placeholder:
-            # 使用流式输出
+            # 使用流式输出（节流刷新，避免逐token重绘全文）
+            renderer = ThrottledRenderer(stream_placeholder, "markdown")
             for chunk in DEEPSEEK.stream([HumanMessage(content=prompt)]):
                 # chunk可能是AIMessage类型，直接获取content
                 content = chunk.content if hasattr(chunk, 'content') else str(chunk)
                 if content:
                     latest_story += content
                     # 实时更新显示
-                    stream_placeholder.markdown(latest_story)
+                    renderer.update(latest_story)
+            renderer.flush(latest_story)
         else:
             # 非流式输出（备用）
             response = DEEPSEEK.invoke([HumanMessage(content=prompt)])
@@ -61,7 +65,7 @@ def story_continuation_node_stream(state: GameState, stream_placeholder=None):
         
         # 保存故事
         session_id = state.get("session_id", "default")
-        story_index = get_next_story_index(session_id)
+        story_index = allocate_index("story", session_id)
         save_story(latest_story, story_index, session_id)
         
         # 更新状态
@@ -114,7 +118,7 @@ def story_continuation_node(state: GameState) -> GameState:
         
         # 保存故事
         session_id = state.get("session_id", "default")
-        story_index = get_next_story_index(session_id)
+        story_index = allocate_index("story", session_id)
         save_story(latest_story, story_index, session_id)
         
         # 更新状态
@@ -133,3 +137,59 @@ def story_continuation_node(state: GameState) -> GameState:
             "current_step": "error"
         }
 
+
+
+async def astory_continuation_node(state: GameState) -> dict:
+    """
+    剧情续写节点（异步版本）
+    通过LangGraph的astream执行，生成的每个token以自定义事件的形式推送给前端
+    """
+    try:
+        # 获取用户输入（最后一条用户消息）
+        user_messages = [msg for msg in state["messages"] if isinstance(msg, HumanMessage)]
+        if not user_messages:
+            return {"error": "未找到用户输入", "current_step": "error"}
+        
+        user_input = user_messages[-1].content
+        
+        # 获取世界观和故事上下文
+        worldview = get_default_worldview() if not state.get("story_context") else state["story_context"]
+        story_context = state.get("story_context", worldview)
+        
+        # 构建提示词
+        prompt = STORY_CONTINUATION_PROMPT.format(
+            worldview=worldview,
+            story_context=story_context,
+            user_input=user_input
+        )
+        
+        # 异步流式调用LLM生成剧情
+        writer = get_event_writer()
+        latest_story = ""
+        async for chunk in DEEPSEEK.astream([HumanMessage(content=prompt)]):
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if content:
+                latest_story += content
+                writer({"node": "story_continuation", "delta": content})
+        
+        # 更新故事上下文（追加新剧情）
+        updated_story_context = f"{story_context}\n\n{latest_story}"
+        
+        # 保存故事（文件I/O放到线程池，避免阻塞事件循环）
+        session_id = state.get("session_id", "default")
+        story_index = await asyncio.to_thread(allocate_index, "story", session_id)
+        await asyncio.to_thread(save_story, latest_story, story_index, session_id)
+        
+        # 只返回变更的字段，messages由add_messages合并
+        return {
+            "latest_story": latest_story,
+            "story_context": updated_story_context,
+            "current_step": "storyboard",
+            "error": None,
+            "messages": [AIMessage(content=f"剧情已续写：\n{latest_story}")]
+        }
+    except Exception as e:
+        return {
+            "error": f"剧情续写失败: {str(e)}",
+            "current_step": "error"
+        }
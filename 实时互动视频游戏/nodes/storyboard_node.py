@@ -3,6 +3,7 @@
 分镜脚本生成节点
 """
 import sys
+import asyncio
 import json
 import re
 from pathlib import Path
@@ -14,7 +15,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from state import GameState
 from llm import DEEPSEEK
 from prompts import STORYBOARD_PROMPT
-from utils import save_storyboard, get_next_story_index
+from utils import save_storyboard, allocate_index, get_event_writer
+from stream_renderer import ThrottledRenderer
 
 
 def extract_and_fix_json(text: str) -> tuple[str, dict]:
@@ -95,10 +97,117 @@ def extract_and_fix_json(text: str) -> tuple[str, dict]:
             return None, None
 
 
-def storyboard_node_stream(state: GameState, stream_placeholder=None):
+class StoryboardStreamParser:
+    """
+    增量式分镜JSON解析器
+    逐块消费LLM流式输出，"shots"数组中的每个分镜对象在右花括号出现时立即解析并返回，
+    无需等待整个流结束，也无需对全文重复解析
+    """
+
+    def __init__(self):
+        self.text = ""  # 已接收的完整文本
+        self.shots = []  # 已解析完成的分镜
+        self._pos = 0  # 下一个待扫描字符的位置
+        self._stack = []  # 当前嵌套的括号栈（"{" 或 "["）
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_key = None  # 根对象中最近一个字符串（用于识别"shots"键）
+        self._root_start = -1
+        self._root_end = -1
+        self._shots_depth = -1  # "shots"数组所在的栈深度
+        self._shot_start = -1
+
+    def feed(self, chunk: str) -> list:
+        """
+        消费一段流式文本
+
+        Returns:
+            本次新解析完成的分镜列表
+        """
+        self.text += chunk
+        new_shots = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            # 根对象开始之前的内容（如```json标记、说明文字）直接跳过
+            if self._root_start < 0:
+                if char == "{":
+                    self._root_start = i
+                    self._stack.append("{")
+                continue
+            if self._root_end >= 0:
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if char == "[" and len(self._stack) == 1 and self._last_key == "shots":
+                    self._shots_depth = len(self._stack) + 1
+                elif char == "{" and len(self._stack) == self._shots_depth:
+                    self._shot_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                depth = len(self._stack)
+                if char == "}" and depth == self._shots_depth and self._shot_start >= 0:
+                    try:
+                        shot = json.loads(text[self._shot_start:i + 1])
+                        self.shots.append(shot)
+                        new_shots.append(shot)
+                    except json.JSONDecodeError:
+                        pass
+                    self._shot_start = -1
+                elif char == "]" and depth == self._shots_depth - 1:
+                    self._shots_depth = -1
+                elif depth == 0:
+                    self._root_end = i
+        self._pos = len(text)
+        return new_shots
+
+    def finish(self) -> tuple[str, dict]:
+        """
+        结束解析，返回完整的分镜数据
+
+        Returns:
+            tuple: (清理后的文本, 解析后的数据) 或 (None, None) 如果失败
+        """
+        if self._root_end >= 0:
+            root_text = self.text[self._root_start:self._root_end + 1]
+            try:
+                return root_text, json.loads(root_text)
+            except json.JSONDecodeError:
+                pass
+        # 输出被截断时，使用已完整解析的分镜
+        if self.shots:
+            data = {"shots": self.shots}
+            return json.dumps(data, ensure_ascii=False), data
+        return extract_and_fix_json(self.text)
+
+
+def storyboard_node_stream(state: GameState, stream_placeholder=None, on_shot=None):
     """
     分镜脚本生成节点（流式版本）
     根据剧情生成视频分镜脚本，支持流式输出
+
+    Args:
+        state: 游戏状态
+        stream_placeholder: Streamlit占位组件（可选），用于实时显示
+        on_shot: 分镜回调（可选），每解析出一个完整分镜立即调用 on_shot(shot)
     """
     try:
         latest_story = state.get("latest_story")
@@ -112,24 +221,29 @@ def storyboard_node_stream(state: GameState, stream_placeholder=None):
         # 构建提示词
         prompt = STORYBOARD_PROMPT.format(story=latest_story)
         
-        # 流式调用LLM生成分镜脚本
-        storyboard_text = ""
-        if stream_placeholder:
-            # 使用流式输出
+        # 流式调用LLM生成分镜脚本，边接收边解析分镜
+        parser = StoryboardStreamParser()
+        if stream_placeholder or on_shot:
+            # 使用流式输出（节流刷新，避免逐token重绘全文）
+            renderer = ThrottledRenderer(stream_placeholder, "code", language="json")
             for chunk in DEEPSEEK.stream([HumanMessage(content=prompt)]):
                 # chunk可能是AIMessage类型，直接获取content
                 content = chunk.content if hasattr(chunk, 'content') else str(chunk)
                 if content:
-                    storyboard_text += content
+                    for shot in parser.feed(content):
+                        if on_shot:
+                            on_shot(shot)
                     # 实时更新显示（以代码块形式显示JSON）
-                    stream_placeholder.code(storyboard_text, language="json")
+                    renderer.update(parser.text)
+            renderer.flush(parser.text)
         else:
             # 非流式输出（备用）
             response = DEEPSEEK.invoke([HumanMessage(content=prompt)])
-            storyboard_text = response.content
+            parser.feed(response.content)
+        storyboard_text = parser.text
         
-        # 提取并修复JSON
-        cleaned_text, storyboard_data = extract_and_fix_json(storyboard_text)
+        # 获取解析结果（流结束时只做一次收尾解析）
+        cleaned_text, storyboard_data = parser.finish()
         
         if not storyboard_data:
             return {
@@ -148,7 +262,7 @@ def storyboard_node_stream(state: GameState, stream_placeholder=None):
         
         # 保存分镜脚本
         session_id = state.get("session_id", "default")
-        storyboard_index = get_next_story_index(session_id)
+        storyboard_index = allocate_index("storyboard", session_id)
         save_storyboard(json.dumps(storyboard_data, ensure_ascii=False), storyboard_index, session_id)
         
         # 更新状态
@@ -189,8 +303,10 @@ def storyboard_node(state: GameState) -> GameState:
         response = DEEPSEEK.invoke([HumanMessage(content=prompt)])
         storyboard_text = response.content
         
-        # 提取并修复JSON
-        cleaned_text, storyboard_data = extract_and_fix_json(storyboard_text)
+        # 解析JSON
+        parser = StoryboardStreamParser()
+        parser.feed(storyboard_text)
+        cleaned_text, storyboard_data = parser.finish()
         
         if not storyboard_data:
             return {
@@ -209,7 +325,7 @@ def storyboard_node(state: GameState) -> GameState:
         
         # 保存分镜脚本
         session_id = state.get("session_id", "default")
-        storyboard_index = get_next_story_index(session_id)
+        storyboard_index = allocate_index("storyboard", session_id)
         save_storyboard(json.dumps(storyboard_data, ensure_ascii=False), storyboard_index, session_id)
         
         # 更新状态
@@ -228,3 +344,68 @@ def storyboard_node(state: GameState) -> GameState:
             "current_step": "error"
         }
 
+
+
+async def astoryboard_node(state: GameState) -> dict:
+    """
+    分镜脚本生成节点（异步版本）
+    通过LangGraph的astream执行，流式文本和每个解析完成的分镜以自定义事件的形式推送给前端
+    """
+    try:
+        latest_story = state.get("latest_story")
+        if not latest_story:
+            return {
+                "error": "未找到最新剧情",
+                "current_step": "error"
+            }
+        
+        # 构建提示词
+        prompt = STORYBOARD_PROMPT.format(story=latest_story)
+        
+        # 异步流式调用LLM生成分镜脚本，边接收边解析分镜
+        writer = get_event_writer()
+        parser = StoryboardStreamParser()
+        async for chunk in DEEPSEEK.astream([HumanMessage(content=prompt)]):
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if content:
+                writer({"node": "storyboard", "delta": content})
+                for shot in parser.feed(content):
+                    writer({"node": "storyboard", "shot": shot})
+        storyboard_text = parser.text
+        
+        # 获取解析结果
+        cleaned_text, storyboard_data = parser.finish()
+        
+        if not storyboard_data:
+            return {
+                "error": f"分镜脚本JSON解析失败\n原始内容前500字符: {storyboard_text[:500]}\n\n请尝试重新输入。",
+                "current_step": "error"
+            }
+        
+        shots = storyboard_data.get("shots", [])
+        if not shots:
+            return {
+                "error": "分镜脚本中未找到有效的分镜数据",
+                "current_step": "error"
+            }
+        
+        # 保存分镜脚本（文件I/O放到线程池，避免阻塞事件循环）
+        session_id = state.get("session_id", "default")
+        storyboard_index = await asyncio.to_thread(allocate_index, "storyboard", session_id)
+        await asyncio.to_thread(
+            save_storyboard, json.dumps(storyboard_data, ensure_ascii=False), storyboard_index, session_id
+        )
+        
+        # 只返回变更的字段，messages由add_messages合并
+        return {
+            "storyboard": cleaned_text or storyboard_text,
+            "storyboard_shots": shots,
+            "current_step": "extract_frame",
+            "error": None,
+            "messages": [AIMessage(content=f"分镜脚本已生成，共{len(shots)}个分镜")]
+        }
+    except Exception as e:
+        return {
+            "error": f"分镜脚本生成失败: {str(e)}",
+            "current_step": "error"
+        }
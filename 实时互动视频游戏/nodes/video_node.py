@@ -2,8 +2,9 @@
 """
 视频生成节点
 """
+import os
 import sys
-import time
+import asyncio
 from pathlib import Path
 from langchain_core.messages import AIMessage
 
@@ -11,110 +12,184 @@ from langchain_core.messages import AIMessage
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from state import GameState
-from sora2_client import Sora2Client
-from utils import get_next_video_index, ensure_data_dir
+from utils import allocate_index, record_video, concatenate_videos
+from postprocess import schedule_postprocess
+from video_backends import get_video_router
+
+# 视频生成模式：single（合并所有分镜生成一段视频）或 per_shot（每个分镜并发生成一段片段后拼接）
+VIDEO_GENERATION_MODE = os.getenv("VIDEO_GENERATION_MODE", "single")
+MAX_SHOT_RETRIES = 2  # 单个分镜片段失败后的重试次数
+SHOT_SECONDS_OPTIONS = (4, 8, 12)  # Sora2支持的片段时长
+
+
+def build_video_prompt(storyboard_shots: list) -> str:
+    """构建视频生成的prompt（合并所有分镜描述）"""
+    shot_descriptions = []
+    for shot in storyboard_shots:
+        desc = shot.get("description", "")
+        camera = shot.get("camera_movement", "")
+        style = shot.get("style", "暗黑系RPG风格")
+        shot_descriptions.append(f"{desc}，{camera}，{style}")
+
+    video_prompt = "，".join(shot_descriptions)
+    # 添加总体风格描述和内容限制
+    return f"暗黑系RPG游戏风格，{video_prompt}，8秒视频，流畅连贯，适合全年龄，无暴力血腥内容，安全健康，所有声音和对话均使用中文，人物对话为中文，旁白为中文"
+
+
+def build_shot_prompt(shot: dict, seconds: int) -> str:
+    """构建单个分镜片段的prompt"""
+    desc = shot.get("description", "")
+    camera = shot.get("camera_movement", "")
+    style = shot.get("style", "暗黑系RPG风格")
+    return f"暗黑系RPG游戏风格，{desc}，{camera}，{style}，{seconds}秒视频，流畅连贯，适合全年龄，无暴力血腥内容，安全健康，所有声音和对话均使用中文，人物对话为中文，旁白为中文"
+
+
+def _shot_seconds(shot: dict) -> int:
+    """根据分镜时长选择最接近的可用片段时长（向上取整）"""
+    duration = float(shot.get("duration") or 0)
+    for seconds in SHOT_SECONDS_OPTIONS:
+        if duration <= seconds:
+            return seconds
+    return SHOT_SECONDS_OPTIONS[-1]
+
+
+async def _agenerate_clip(
+    prompt: str,
+    reference_image_path,
+    seconds: int,
+    save_path: str,
+) -> dict:
+    """
+    生成并下载单个分镜片段，失败时只重试该片段（每次重试都重新选择后端）
+
+    Returns:
+        {"video_id": ..., "backend": ..., "error": ...}
+    """
+    router = get_video_router()
+    result = {"video_id": None, "backend": None, "error": "视频生成失败"}
+    for _ in range(MAX_SHOT_RETRIES + 1):
+        result = await router.agenerate(
+            prompt, save_path, reference_image_path=reference_image_path, seconds=seconds
+        )
+        if result["error"] is None:
+            return result
+    return result
+
+
+async def _agenerate_per_shot(state: GameState) -> dict:
+    """
+    分镜并发生成模式
+    每个分镜作为独立任务并发提交（共享同一张参考图片保证画面连贯），
+    全部完成后按顺序拼接，本轮耗时取决于最慢的分镜
+    """
+    storyboard_shots = state.get("storyboard_shots")
+    reference_image_path = state.get("reference_image_path")
+    session_id = state.get("session_id", "default")
+
+    video_index = await asyncio.to_thread(allocate_index, "video", session_id)
+    videos_dir = Path(__file__).parent.parent / "data" / session_id / "videos"
+    clip_paths = [
+        str(videos_dir / "clips" / f"video_{video_index:04d}_shot_{i:02d}.mp4")
+        for i in range(len(storyboard_shots))
+    ]
+
+    results = await asyncio.gather(*[
+        _agenerate_clip(
+            build_shot_prompt(shot, _shot_seconds(shot)),
+            reference_image_path,
+            _shot_seconds(shot),
+            clip_path,
+        )
+        for shot, clip_path in zip(storyboard_shots, clip_paths)
+    ])
+
+    failed = [i + 1 for i, r in enumerate(results) if r["error"]]
+    if failed:
+        errors = "；".join(f"分镜{i}: {results[i - 1]['error']}" for i in failed)
+        return {"error": f"分镜片段生成失败（{errors}）", "current_step": "error"}
+
+    # 按分镜顺序拼接所有片段
+    video_path = str(videos_dir / f"video_{video_index:04d}.mp4")
+    success = await asyncio.to_thread(concatenate_videos, clip_paths, video_path)
+    if not success:
+        return {"error": "分镜片段拼接失败", "current_step": "error"}
+
+    await asyncio.to_thread(record_video, video_path, video_index, session_id)
+    # 后台预处理（抽帧、缩略图、预览、统一编码），下一轮直接使用
+    schedule_postprocess(video_path, session_id)
+    # 拼接后的视频没有对应的后端视频ID，remix任一片段都只能延续最后一个分镜，
+    # 因此分镜模式下不保留remix信息，下一轮基于参考图片重新生成
+    return {
+        "video_path": video_path,
+        "last_video_id": None,
+        "last_video_backend": None,
+        "current_step": "completed",
+        "error": None,
+        "messages": [AIMessage(content=f"视频已生成完成！（{len(clip_paths)}个分镜片段）")],
+    }
 
 
 def video_generation_node(state: GameState) -> GameState:
     """
     视频生成节点
-    根据分镜脚本生成视频
+    根据分镜脚本生成视频（同步入口，内部驱动异步版本）
+    """
+    update = asyncio.run(avideo_generation_node(state))
+    if "messages" in update:
+        update["messages"] = state["messages"] + update["messages"]
+    return {**state, **update}
+
+
+async def avideo_generation_node(state: GameState) -> dict:
+    """
+    视频生成节点（异步版本）
+    由后端路由选择当前最快的健康后端生成视频，API调用在线程池中执行，
+    轮询等待使用asyncio.sleep，等待视频生成期间不占用线程，同一事件循环可以同时驱动多个会话
     """
     try:
         storyboard_shots = state.get("storyboard_shots")
         if not storyboard_shots:
-            return {**state, "error": "未找到分镜脚本", "current_step": "error"}
+            return {"error": "未找到分镜脚本", "current_step": "error"}
 
-        # 获取参考图片
-        reference_image_path = state.get("reference_image_path")
+        # 分镜并发生成模式
+        if VIDEO_GENERATION_MODE == "per_shot":
+            return await _agenerate_per_shot(state)
 
-        # 构建视频生成的prompt（合并所有分镜描述）
-        shot_descriptions = []
-        for shot in storyboard_shots:
-            desc = shot.get("description", "")
-            camera = shot.get("camera_movement", "")
-            style = shot.get("style", "暗黑系RPG风格")
-            shot_descriptions.append(f"{desc}，{camera}，{style}")
-
-        video_prompt = "，".join(shot_descriptions)
-        # 添加总体风格描述和内容限制
-        video_prompt = f"暗黑系RPG游戏风格，{video_prompt}，8秒视频，流畅连贯，适合全年龄，无暴力血腥内容，安全健康，所有声音和对话均使用中文，人物对话为中文，旁白为中文"
-
-        # 初始化Sora2客户端
-        sora2_client = Sora2Client()
-
-        # 判断是否是第一次生成视频
-        last_video_id = state.get("last_video_id")
-
-        # 生成视频：第一次使用create，后续使用remix
-        if last_video_id is None:
-            # 第一次生成，使用create方法
-            result = sora2_client.generate_video(video_prompt, reference_image_path)
-        else:
-            # 后续生成，使用remix方法
-            result = sora2_client.remix_video(
-                last_video_id, video_prompt, reference_image_path
-            )
-
-        if result["status"] == "failed":
-            return {
-                **state,
-                "error": result.get("error", "视频生成失败"),
-                "current_step": "error",
-            }
-
-        video_id = result["video_id"]
-
-        # 轮询视频生成状态
-        max_attempts = 120  # 最多轮询120次（20分钟）
-        poll_interval = 2  # 每2秒轮询一次
-
-        for attempt in range(max_attempts):
-            status_result = sora2_client.poll_status(video_id)
-            status = status_result["status"]
-
-            if status == "completed":
-                # 视频生成完成，下载视频
-                session_id = state.get("session_id", "default")
-                video_index = get_next_video_index(session_id)
-                ensure_data_dir(session_id)
-                video_path = str(
-                    Path(__file__).parent.parent
-                    / "data"
-                    / session_id
-                    / "videos"
-                    / f"video_{video_index:04d}.mp4"
-                )
-
-                success = sora2_client.download_video(
-                    status_result["video_url"], video_path
-                )
-
-                if success:
-                    return {
-                        **state,
-                        "video_path": video_path,
-                        "last_video_id": video_id,  # 保存当前视频ID，用于下次remix
-                        "current_step": "completed",
-                        "error": None,
-                        "messages": state["messages"]
-                        + [AIMessage(content="视频已生成完成！")],
-                    }
-                else:
-                    return {**state, "error": "视频下载失败", "current_step": "error"}
-            elif status == "failed":
-                return {
-                    **state,
-                    "error": status_result.get("error", "视频生成失败"),
-                    "current_step": "error",
-                }
-            else:
-                # 仍在处理中，等待后继续轮询
-                # 注意：在Streamlit中，这里会阻塞，但这是必要的等待
-                time.sleep(poll_interval)
-
-        # 超时
-        return {**state, "error": "视频生成超时（超过20分钟）", "current_step": "error"}
+        reference_image_path = state.get("reference_image_path")
+        video_prompt = build_video_prompt(storyboard_shots)
+
+        session_id = state.get("session_id", "default")
+        video_index = await asyncio.to_thread(allocate_index, "video", session_id)
+        video_path = str(
+            Path(__file__).parent.parent
+            / "data"
+            / session_id
+            / "videos"
+            / f"video_{video_index:04d}.mp4"
+        )
+
+        # 上一段视频的后端支持remix且本轮仍选中它时使用remix，否则重新生成
+        result = await get_video_router().agenerate(
+            video_prompt,
+            video_path,
+            reference_image_path=reference_image_path,
+            remix_video_id=state.get("last_video_id"),
+            remix_backend=state.get("last_video_backend") or "sora2",
+        )
+        if result["error"]:
+            return {"error": result["error"], "current_step": "error"}
+
+        await asyncio.to_thread(record_video, video_path, video_index, session_id)
+        # 后台预处理（抽帧、缩略图、预览、统一编码），下一轮直接使用
+        schedule_postprocess(video_path, session_id)
+        return {
+            "video_path": video_path,
+            "last_video_id": result["video_id"],  # 保存当前视频ID，用于下次remix
+            "last_video_backend": result["backend"],
+            "current_step": "completed",
+            "error": None,
+            "messages": [AIMessage(content=f"视频已生成完成！（{result['backend']}）")],
+        }
 
     except Exception as e:
-        return {**state, "error": f"视频生成失败: {str(e)}", "current_step": "error"}
+        return {"error": f"视频生成失败: {str(e)}", "current_step": "error"}
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+视频后处理流水线
+视频下载完成后立即在后台线程池中执行：抽取最后一帧、生成封面缩略图、
+生成低分辨率预览、统一编码格式（便于拼接），并写入会话清单。
+下一轮开始时这些产物已经准备好，图片抽取节点直接命中缓存。
+"""
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+
+from manifest import get_manifest
+from utils import extract_last_frame
+
+# 后台线程池（视频解码和ffmpeg转码为I/O和子进程密集型任务）
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="postprocess")
+
+# 正在执行的后处理任务：video_path -> {产物类型: Future}，每个钩子单独提交，互不等待
+_PENDING: Dict[str, Dict[str, Future]] = {}
+_PENDING_LOCK = threading.Lock()
+
+POSTER_WIDTH = 320  # 封面缩略图宽度
+PROXY_HEIGHT = 360  # 低分辨率预览高度
+
+
+def _artifact_path(video_path: str, sub_dir: str, suffix: str) -> str:
+    """根据视频路径生成派生产物路径（位于会话目录的子目录下）"""
+    video = Path(video_path)
+    session_dir = video.parent.parent
+    return str(session_dir / sub_dir / f"{video.stem}{suffix}")
+
+
+def _run_ffmpeg(args: List[str]) -> bool:
+    """执行ffmpeg命令，ffmpeg不可用或执行失败时返回False"""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", *args],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        return result.returncode == 0
+    except FileNotFoundError:
+        return False
+
+
+def last_frame_hook(video_path: str, session_id: str) -> Optional[str]:
+    """抽取最后一帧（下一段视频的参考图片）"""
+    return extract_last_frame(video_path, session_id=session_id)
+
+
+def poster_hook(video_path: str, session_id: str) -> Optional[str]:
+    """生成封面缩略图（取视频第一帧并缩放）"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    if not ret:
+        return None
+    height, width = frame.shape[:2]
+    scale = POSTER_WIDTH / float(width)
+    poster = cv2.resize(frame, (POSTER_WIDTH, int(height * scale)))
+    output_path = _artifact_path(video_path, "images", "_poster.jpg")
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    return output_path if cv2.imwrite(output_path, poster) else None
+
+
+def proxy_hook(video_path: str, session_id: str) -> Optional[str]:
+    """生成低分辨率预览视频"""
+    output_path = _artifact_path(video_path, "videos/proxy", "_proxy.mp4")
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    ok = _run_ffmpeg([
+        "-i", video_path,
+        "-vf", f"scale=-2:{PROXY_HEIGHT}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "30",
+        "-c:a", "aac", "-b:a", "64k",
+        output_path,
+    ])
+    return output_path if ok else None
+
+
+def normalize_hook(video_path: str, session_id: str) -> Optional[str]:
+    """统一编码格式（H.264 + AAC），拼接时可以直接复制流"""
+    output_path = _artifact_path(video_path, "videos/normalized", ".mp4")
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    ok = _run_ffmpeg([
+        "-i", video_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k", "-ar", "48000",
+        output_path,
+    ])
+    return output_path if ok else None
+
+
+# 后处理钩子：(产物类型, 处理函数)，按顺序提交，最后一帧排在最前面
+POSTPROCESS_HOOKS: List[Tuple[str, Callable[[str, str], Optional[str]]]] = [
+    ("frame", last_frame_hook),
+    ("poster", poster_hook),
+    ("proxy", proxy_hook),
+    ("normalized", normalize_hook),
+]
+
+
+def _run_hook(
+    video_path: str, session_id: str, kind: str, hook: Callable[[str, str], Optional[str]]
+) -> Optional[str]:
+    """执行单个后处理钩子，并把产物记录到会话清单"""
+    try:
+        output_path = hook(video_path, session_id)
+    except Exception as e:
+        print(f"视频后处理失败（{kind}）: {e}")
+        output_path = None
+    # frame由extract_last_frame自行记录
+    if output_path and kind != "frame":
+        manifest = get_manifest(session_id)
+        video = manifest.find_artifact("video", video_path)
+        if video:
+            manifest.record_artifact(kind, video["idx"], output_path, parent_id=video["id"])
+    with _PENDING_LOCK:
+        futures = _PENDING.get(video_path)
+        if futures is not None:
+            futures.pop(kind, None)
+            if not futures:
+                _PENDING.pop(video_path, None)
+    return output_path
+
+
+def schedule_postprocess(video_path: str, session_id: str = "default") -> Dict[str, Future]:
+    """
+    提交视频后处理任务（视频下载完成后立即调用）
+
+    Args:
+        video_path: 视频文件路径
+        session_id: 会话ID，用于数据隔离
+
+    Returns:
+        每种产物对应的Future，获取某种产物时只需等待对应的钩子
+    """
+    with _PENDING_LOCK:
+        futures = _PENDING.get(video_path)
+        if futures is None:
+            futures = _PENDING[video_path] = {}
+            for kind, hook in POSTPROCESS_HOOKS:
+                futures[kind] = _EXECUTOR.submit(_run_hook, video_path, session_id, kind, hook)
+        return dict(futures)
+
+
+def get_artifact(
+    video_path: str, kind: str, session_id: str = "default", wait: bool = True
+) -> Optional[str]:
+    """
+    获取视频的派生产物路径
+
+    Args:
+        video_path: 视频文件路径
+        kind: 产物类型（frame, poster, proxy, normalized）
+        session_id: 会话ID
+        wait: 该产物的钩子仍在执行时是否等待其完成（前端渲染时传False，避免阻塞）
+
+    Returns:
+        产物路径，不存在时返回None
+    """
+    with _PENDING_LOCK:
+        future = _PENDING.get(video_path, {}).get(kind)
+    if future is not None and wait:
+        try:
+            future.result()
+        except Exception:
+            pass
+
+    manifest = get_manifest(session_id)
+    video = manifest.find_artifact("video", video_path)
+    if not video:
+        return None
+    for child in manifest.children(video["id"]):
+        if child["kind"] == kind and Path(child["path"]).exists():
+            return child["path"]
+    return None
+
+
+def get_last_frame(video_path: str, session_id: str = "default") -> Optional[str]:
+    """获取视频最后一帧：优先使用后处理的缓存结果，未命中时现场抽取"""
+    return get_artifact(video_path, "frame", session_id) or extract_last_frame(
+        video_path, session_id=session_id
+    )
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+游戏会话持久化
+游戏状态通过LangGraph Checkpointer（本地使用SQLite）按session_id持久化，
+进程重启或多个副本之间都可以恢复会话；
+进程内只缓存活跃会话的最近一页消息，空闲会话会被淘汰以控制内存占用；
+缓存命中时用最新检查点ID校验，其他副本或进程写入后会重新读取
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from manifest import get_manifest
+
+# 会话检查点数据库路径
+SESSION_DB_PATH = str(Path(__file__).parent / "data" / "sessions.db")
+
+# 内存缓存配置
+MESSAGE_PAGE_SIZE = 20  # 每页消息数量
+IDLE_TIMEOUT = 30 * 60  # 会话空闲超过30分钟后从内存中淘汰
+MAX_CACHED_SESSIONS = 200  # 进程内最多缓存的会话数
+
+
+def session_config(session_id: str) -> dict:
+    """会话对应的LangGraph运行配置（thread_id即session_id）"""
+    return {"configurable": {"thread_id": session_id}}
+
+
+class GameSessionStore:
+    """
+    游戏会话存储
+
+    读取通过同步SqliteSaver完成；每轮游戏由编译了AsyncSqliteSaver的图写入同一个数据库。
+    缓存中只保留除消息外的状态字段和最近一页消息，以及对应的检查点ID；
+    向前翻页时加载一次该检查点的完整消息列表并复用，检查点变化或会话被淘汰时释放。
+    """
+
+    def __init__(self, db_path: str = SESSION_DB_PATH):
+        """
+        初始化会话存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        self.saver = SqliteSaver(conn)
+        self.saver.setup()
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read_checkpoint(self, session_id: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """从检查点读取会话的完整状态，返回 (检查点ID, 状态)"""
+        checkpoint_tuple = self.saver.get_tuple(session_config(session_id))
+        if checkpoint_tuple is None:
+            return None, None
+        return checkpoint_tuple.checkpoint["id"], dict(checkpoint_tuple.checkpoint["channel_values"])
+
+    def _latest_checkpoint_id(self, session_id: str) -> Optional[str]:
+        """只查询会话最新的检查点ID（用于校验缓存，不反序列化状态）"""
+        with self.saver.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (session_id,),
+            )
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def _evict_idle(self):
+        """淘汰空闲超时或超出数量上限的会话缓存"""
+        now = time.time()
+        for session_id in list(self._cache):
+            if now - self._cache[session_id]["last_access"] > IDLE_TIMEOUT:
+                del self._cache[session_id]
+        while len(self._cache) > MAX_CACHED_SESSIONS:
+            self._cache.popitem(last=False)
+
+    def _cache_values(self, session_id: str, values: Dict, checkpoint_id: Optional[str]) -> Dict:
+        """缓存状态（消息只保留最近一页）"""
+        messages = values.get("messages") or []
+        entry = {
+            "state": {**values, "messages": messages[-MESSAGE_PAGE_SIZE:]},
+            "message_count": len(messages),
+            "checkpoint_id": checkpoint_id,
+            # 向前翻页时才加载的完整消息列表（同一检查点只反序列化一次）
+            "history": None,
+            "last_access": time.time(),
+        }
+        self._cache[session_id] = entry
+        self._cache.move_to_end(session_id)
+        self._evict_idle()
+        return entry
+
+    def exists(self, session_id: str) -> bool:
+        """会话是否已持久化"""
+        with self._lock:
+            if session_id in self._cache:
+                return True
+        return self._latest_checkpoint_id(session_id) is not None
+
+    def load_state(self, session_id: str) -> Optional[Dict]:
+        """
+        加载会话状态（messages只包含最近一页）
+
+        Returns:
+            状态字典，会话不存在时返回None
+        """
+        with self._lock:
+            entry = self._cache.get(session_id)
+            # 其他副本或进程写入了新的检查点时，缓存已过期，重新读取
+            if entry is not None and entry["checkpoint_id"] != self._latest_checkpoint_id(session_id):
+                entry = None
+            if entry is None:
+                checkpoint_id, values = self._read_checkpoint(session_id)
+                if values is None:
+                    self._cache.pop(session_id, None)
+                    return None
+                entry = self._cache_values(session_id, values, checkpoint_id)
+            entry["last_access"] = time.time()
+            self._cache.move_to_end(session_id)
+            return entry["state"]
+
+    def message_count(self, session_id: str) -> int:
+        """会话的消息总数"""
+        if self.load_state(session_id) is None:
+            return 0
+        with self._lock:
+            entry = self._cache.get(session_id)
+            return entry["message_count"] if entry else 0
+
+    def load_messages(self, session_id: str, limit: int, offset_from_end: int = 0) -> List:
+        """
+        分页加载消息（从最新的消息往前翻）
+
+        Args:
+            session_id: 会话ID
+            limit: 返回的消息数量
+            offset_from_end: 跳过最新的多少条消息
+
+        Returns:
+            按时间顺序排列的消息列表
+        """
+        state = self.load_state(session_id)
+        if state is None:
+            return []
+        # 缓存的最近一页足够时直接返回，否则使用（或加载）该检查点的完整消息列表
+        if offset_from_end + limit <= len(state["messages"]):
+            messages = state["messages"]
+        else:
+            messages = self._load_history(session_id)
+        end = len(messages) - offset_from_end
+        return messages[max(end - limit, 0):max(end, 0)]
+
+    def _load_history(self, session_id: str) -> List:
+        """获取会话的完整消息列表：同一检查点只反序列化一次，后续翻页直接复用"""
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry["history"] is not None:
+                return entry["history"]
+            checkpoint_id, values = self._read_checkpoint(session_id)
+            messages = (values or {}).get("messages") or []
+            # load_state刚校验过缓存，检查点未变时才保存（期间有新的写入时下次重新加载）
+            if entry is not None and entry["checkpoint_id"] == checkpoint_id:
+                entry["history"] = messages
+            return messages
+
+    def load_chapters(self, session_id: str, limit: int, offset_from_end: int = 0) -> List[str]:
+        """
+        分页加载历史剧情章节（按需读取故事文件）
+
+        Returns:
+            按时间顺序排列的剧情文本列表
+        """
+        stories = get_manifest(session_id).list_artifacts("story")
+        end = len(stories) - offset_from_end
+        chapters = []
+        for story in stories[max(end - limit, 0):max(end, 0)]:
+            try:
+                chapters.append(Path(story["path"]).read_text(encoding="utf-8"))
+            except OSError:
+                continue
+        return chapters
+
+    def update(self, session_id: str, values: Dict):
+        """一轮游戏结束后用最终状态刷新缓存"""
+        with self._lock:
+            self._cache_values(session_id, values, self._latest_checkpoint_id(session_id))
+
+    def evict(self, session_id: str):
+        """从内存中移除会话缓存（持久化数据不受影响）"""
+        with self._lock:
+            self._cache.pop(session_id, None)
@@ -18,14 +18,17 @@ class Sora2Client:
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
     def generate_video(
-        self, prompt: str, reference_image_path: Optional[str] = None
+        self,
+        prompt: str,
+        reference_image_path: Optional[str] = None,
+        seconds: str = "8",
     ) -> Dict[str, Any]:
         """生成视频"""
         try:
             # 构建API调用参数
             create_params = {
                 "prompt": prompt,
-                "seconds": "8",
+                "seconds": seconds,
                 "size": "720x1280",
             }
 
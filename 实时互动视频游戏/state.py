@@ -19,6 +19,7 @@ class GameState(TypedDict):
     reference_image_path: Optional[str]  # 参考图片路径（上一段视频的最后一帧）
     video_path: Optional[str]  # 生成的视频路径
     last_video_id: Optional[str]  # 上一次生成的视频ID（用于remix）
+    last_video_backend: Optional[str]  # 上一次生成视频所用的后端（remix只能在同一后端上进行）
     current_step: str  # 当前执行的步骤（story_continuation, storyboard, extract_frame, video_generation）
     error: Optional[str]  # 错误信息
 
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+流式输出渲染器
+合并高频的token更新，按时间或字符预算节流刷新Streamlit占位组件
+"""
+import time
+from typing import Optional
+
+
+class ThrottledRenderer:
+    """
+    节流渲染器
+
+    Streamlit的占位组件每次刷新都会重新发送并渲染完整文本，
+    逐token刷新会导致O(n²)的渲染开销和websocket流量。
+    该渲染器只在距上次刷新超过时间间隔、或新增内容超过字符预算时才刷新，
+    并保证最终文本只完整刷新一次。
+    """
+
+    def __init__(
+        self,
+        placeholder,
+        method: str = "markdown",
+        interval: float = 0.05,
+        max_pending_chars: int = 2048,
+        **render_kwargs,
+    ):
+        """
+        初始化节流渲染器
+
+        Args:
+            placeholder: Streamlit占位组件（st.empty()）
+            method: 渲染方法名，如 "markdown"、"code"
+            interval: 最小刷新间隔（秒），默认50ms
+            max_pending_chars: 未刷新内容的字符数上限，超过后立即刷新
+            render_kwargs: 传递给渲染方法的额外参数，如 language="json"
+        """
+        self.placeholder = placeholder
+        self.method = method
+        self.interval = interval
+        self.max_pending_chars = max_pending_chars
+        self.render_kwargs = render_kwargs
+        self.render_count = 0
+        self._last_render_time = 0.0
+        self._last_rendered_len = 0
+        self._last_text: Optional[str] = None
+
+    def _render(self, text: str):
+        """刷新占位组件"""
+        getattr(self.placeholder, self.method)(text, **self.render_kwargs)
+        self._last_render_time = time.monotonic()
+        self._last_rendered_len = len(text)
+        self._last_text = text
+        self.render_count += 1
+
+    def update(self, text: str):
+        """
+        提交最新的累计文本，满足节流条件时才刷新
+
+        Args:
+            text: 当前累计的完整文本
+        """
+        if self.placeholder is None:
+            return
+        pending = len(text) - self._last_rendered_len
+        elapsed = time.monotonic() - self._last_render_time
+        if elapsed >= self.interval or pending >= self.max_pending_chars:
+            self._render(text)
+
+    def flush(self, text: str):
+        """
+        流结束时刷新最终文本（若与上次刷新内容一致则跳过）
+
+        Args:
+            text: 最终的完整文本
+        """
+        if self.placeholder is None:
+            return
+        if text != self._last_text:
+            self._render(text)
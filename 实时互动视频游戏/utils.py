@@ -8,13 +8,34 @@ from pathlib import Path
 from typing import Optional
 import cv2
 
+from manifest import get_manifest
+
+# 已创建过数据目录的会话（避免每次调用都执行mkdir）
+_READY_SESSIONS = set()
+
+
+def get_event_writer():
+    """
+    获取LangGraph自定义流事件写入器（stream_mode="custom"）
+    不在图执行上下文中调用时返回空操作写入器
+    """
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except Exception:
+        return lambda event: None
+
 
 def ensure_data_dir(session_id: str = "default"):
-    """确保数据目录存在"""
+    """确保数据目录存在（每个会话在进程内只创建一次）"""
+    if session_id in _READY_SESSIONS:
+        return
     base_dir = Path(__file__).parent / "data" / session_id
     dirs = ["story", "videos", "images", "storyboards"]
     for d in dirs:
         (base_dir / d).mkdir(parents=True, exist_ok=True)
+    _READY_SESSIONS.add(session_id)
 
 
 def save_story(story: str, index: int, session_id: str = "default") -> str:
@@ -23,6 +44,7 @@ def save_story(story: str, index: int, session_id: str = "default") -> str:
     file_path = Path(__file__).parent / "data" / session_id / "story" / f"story_{index:04d}.txt"
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(story)
+    get_manifest(session_id).record_artifact("story", index, str(file_path))
     return str(file_path)
 
 
@@ -32,9 +54,24 @@ def save_storyboard(storyboard: str, index: int, session_id: str = "default") ->
     file_path = Path(__file__).parent / "data" / session_id / "storyboards" / f"storyboard_{index:04d}.json"
     with open(file_path, "w", encoding="utf-8") as f:
         json.dump(json.loads(storyboard), f, ensure_ascii=False, indent=2)
+    # 分镜由最新一段剧情生成，记录其关联关系
+    manifest = get_manifest(session_id)
+    story = manifest.latest_artifact("story")
+    manifest.record_artifact(
+        "storyboard", index, str(file_path), parent_id=story["id"] if story else None
+    )
     return str(file_path)
 
 
+def record_video(video_path: str, index: int, session_id: str = "default") -> int:
+    """记录生成的视频（关联到最新的分镜脚本），返回产物ID"""
+    manifest = get_manifest(session_id)
+    storyboard = manifest.latest_artifact("storyboard")
+    return manifest.record_artifact(
+        "video", index, video_path, parent_id=storyboard["id"] if storyboard else None
+    )
+
+
 def extract_last_frame(video_path: str, output_path: Optional[str] = None, session_id: str = "default") -> Optional[str]:
     """
     从视频中提取最后一帧作为图片
@@ -80,6 +117,12 @@ def extract_last_frame(video_path: str, output_path: Optional[str] = None, sessi
         # 保存图片
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         cv2.imwrite(output_path, frame)
+
+        # 记录到会话清单（关联到来源视频）
+        manifest = get_manifest(session_id)
+        video = manifest.find_artifact("video", video_path)
+        if video:
+            manifest.record_artifact("frame", video["idx"], output_path, parent_id=video["id"])
         return output_path
         
     except Exception as e:
@@ -88,37 +131,28 @@ def extract_last_frame(video_path: str, output_path: Optional[str] = None, sessi
 
 
 def get_next_video_index(session_id: str = "default") -> int:
-    """获取下一个视频索引"""
-    ensure_data_dir(session_id)
-    video_dir = Path(__file__).parent / "data" / session_id / "videos"
-    existing_files = list(video_dir.glob("video_*.mp4"))
-    if not existing_files:
-        return 0
-    indices = []
-    for f in existing_files:
-        try:
-            idx = int(f.stem.split("_")[-1])
-            indices.append(idx)
-        except:
-            pass
-    return max(indices) + 1 if indices else 0
+    """获取下一个视频索引（查询会话清单，不扫描目录）"""
+    return get_manifest(session_id).peek_index("video")
 
 
 def get_next_story_index(session_id: str = "default") -> int:
-    """获取下一个故事索引"""
+    """获取下一个故事索引（查询会话清单，不扫描目录）"""
+    return get_manifest(session_id).peek_index("story")
+
+
+def allocate_index(kind: str, session_id: str = "default") -> int:
+    """
+    原子分配产物索引
+
+    Args:
+        kind: 产物类型（story, storyboard, video, frame）
+        session_id: 会话ID，用于数据隔离
+
+    Returns:
+        分配到的索引
+    """
     ensure_data_dir(session_id)
-    story_dir = Path(__file__).parent / "data" / session_id / "story"
-    existing_files = list(story_dir.glob("story_*.txt"))
-    if not existing_files:
-        return 0
-    indices = []
-    for f in existing_files:
-        try:
-            idx = int(f.stem.split("_")[-1])
-            indices.append(idx)
-        except:
-            pass
-    return max(indices) + 1 if indices else 0
+    return get_manifest(session_id).allocate_index(kind)
 
 
 def concatenate_videos(video_paths: list, output_path: str) -> bool:
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+视频生成后端选择
+统一封装多个视频生成服务（Sora2及「视频模型质量评估」中的各个VideoGenerationStrategy），
+实时统计每个后端的耗时和失败情况，每轮选择当前p90耗时最低的健康后端；
+主后端过慢或失败时，向第二个后端发起对冲请求，取先完成的结果
+"""
+import asyncio
+import importlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from sora2_client import Sora2Client
+
+# 「视频模型质量评估」目录，其中的策略实现与Sora2Client接口一致
+EVALUATION_DIR = Path(__file__).parent.parent / "视频模型质量评估"
+
+# 启用的后端（逗号分隔，按优先级排列，无统计数据时按此顺序选择）
+VIDEO_BACKENDS = [
+    name.strip() for name in os.getenv("VIDEO_BACKENDS", "sora2").split(",") if name.strip()
+]
+
+# 对冲请求：主后端超过该时间（秒）仍未完成时，向第二个后端发起请求；
+# 未设置时使用主后端的p90耗时
+HEDGE_AFTER = float(os.getenv("VIDEO_HEDGE_AFTER", "0")) or None
+
+# 轮询配置
+MAX_POLL_ATTEMPTS = 120  # 最多轮询120次（20分钟）
+POLL_INTERVAL = 2  # 每2秒轮询一次
+
+# 统计配置
+LATENCY_WINDOW = 50  # 耗时统计窗口大小
+DEFAULT_LATENCY = 180.0  # 没有统计数据时假定的耗时（秒）
+CIRCUIT_BREAK_FAILURES = 3  # 连续失败次数达到该值后熔断
+CIRCUIT_BREAK_SECONDS = 300  # 熔断持续时间（秒）
+
+
+def _remove_file(path: str):
+    """删除文件（不存在时忽略）"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _load_strategy(module_path: str, class_name: str) -> Callable[[], Any]:
+    """构造「视频模型质量评估」中策略类的工厂函数（按需导入）"""
+
+    def factory():
+        if str(EVALUATION_DIR) not in sys.path:
+            sys.path.insert(0, str(EVALUATION_DIR))
+        module = importlib.import_module(module_path)
+        return getattr(module, class_name)()
+
+    return factory
+
+
+# 可用后端：名称 -> (工厂函数, 是否支持图生视频, 是否支持remix)
+BACKEND_REGISTRY: Dict[str, tuple] = {
+    "sora2": (Sora2Client, True, True),
+    "fal": (_load_strategy("fal.strategy", "FalStrategy"), True, False),
+    "wan": (_load_strategy("wan.strategy", "WanStrategy"), True, False),
+    "wavespeed": (_load_strategy("wavespeed.strategy", "WaveSpeedStrategy"), True, False),
+    "ltx2": (_load_strategy("ltx2.strategy", "LTX2Strategy"), True, False),
+    "gaga": (_load_strategy("gaga.strategy", "GagaStrategy"), True, False),
+    "pixverse-v5.5": (_load_strategy("pixverse_v55.strategy", "PixVerseV55Strategy"), True, False),
+}
+
+
+class BackendStats:
+    """单个后端的实时统计"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 熔断截止时间
+
+    def record(self, latency: float, success: bool):
+        """记录一次请求结果"""
+        if success:
+            self.latencies.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= CIRCUIT_BREAK_FAILURES:
+                self.open_until = time.time() + CIRCUIT_BREAK_SECONDS
+
+    @property
+    def p90(self) -> float:
+        """最近窗口内的p90耗时"""
+        if not self.latencies:
+            return DEFAULT_LATENCY
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.9), len(ordered) - 1)]
+
+    @property
+    def failure_rate(self) -> float:
+        """失败率"""
+        total = self.successes + self.failures
+        return self.failures / total if total else 0.0
+
+    @property
+    def healthy(self) -> bool:
+        """是否可用（未处于熔断状态）"""
+        return time.time() >= self.open_until
+
+    def score(self) -> float:
+        """排序得分（越小越好）：p90耗时按失败率惩罚"""
+        return self.p90 / max(1.0 - self.failure_rate, 0.1)
+
+
+class VideoBackendRouter:
+    """视频生成后端路由"""
+
+    def __init__(self, backend_names: Optional[List[str]] = None):
+        """
+        初始化后端路由
+
+        Args:
+            backend_names: 启用的后端名称列表，默认读取VIDEO_BACKENDS环境变量
+        """
+        self.backend_names = [
+            name for name in (backend_names or VIDEO_BACKENDS) if name in BACKEND_REGISTRY
+        ] or ["sora2"]
+        self.stats = {name: BackendStats() for name in self.backend_names}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _client(self, name: str):
+        """获取后端客户端（首次使用时创建，创建失败视为一次失败）"""
+        with self._lock:
+            if name not in self._clients:
+                factory = BACKEND_REGISTRY[name][0]
+                self._clients[name] = factory()
+            return self._clients[name]
+
+    def select(self, require_image: bool = False) -> List[str]:
+        """
+        按当前统计排序可用后端
+
+        Args:
+            require_image: 是否需要支持图生视频
+
+        Returns:
+            后端名称列表，第一个为主后端
+        """
+        candidates = [
+            name for name in self.backend_names
+            if self.stats[name].healthy and (BACKEND_REGISTRY[name][1] or not require_image)
+        ]
+        if not candidates:
+            # 全部熔断时退回到配置顺序
+            candidates = list(self.backend_names)
+        order = {name: i for i, name in enumerate(self.backend_names)}
+        return sorted(candidates, key=lambda name: (self.stats[name].score(), order[name]))
+
+    async def _arun(
+        self,
+        name: str,
+        prompt: str,
+        reference_image_path: Optional[str],
+        save_path: str,
+        seconds: Optional[int],
+        remix_video_id: Optional[str],
+        discard: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """在指定后端上完成一次生成：提交任务、轮询、下载"""
+        start = time.time()
+        try:
+            result = await self._arun_once(
+                name, prompt, reference_image_path, save_path, seconds, remix_video_id, discard
+            )
+        except Exception as e:
+            # 后端抛出的异常同样计为失败（参与熔断），并按失败结果返回，不中断对冲
+            result = {"video_id": None, "error": f"视频后端{name}执行失败: {e}"}
+        self.stats[name].record(time.time() - start, result["error"] is None)
+        result["backend"] = name
+        return result
+
+    async def _arun_once(
+        self,
+        name: str,
+        prompt: str,
+        reference_image_path: Optional[str],
+        save_path: str,
+        seconds: Optional[int],
+        remix_video_id: Optional[str],
+        discard: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        try:
+            client = await asyncio.to_thread(self._client, name)
+        except Exception as e:
+            return {"video_id": None, "error": f"初始化视频后端{name}失败: {e}"}
+
+        if remix_video_id and BACKEND_REGISTRY[name][2]:
+            created = await asyncio.to_thread(
+                client.remix_video, remix_video_id, prompt, reference_image_path
+            )
+        elif seconds and name == "sora2":
+            created = await asyncio.to_thread(
+                client.generate_video, prompt, reference_image_path, str(seconds)
+            )
+        else:
+            created = await asyncio.to_thread(client.generate_video, prompt, reference_image_path)
+        if created.get("status") == "failed" or not created.get("video_id"):
+            return {"video_id": None, "error": created.get("error") or "视频生成失败"}
+
+        video_id = created["video_id"]
+        for _ in range(MAX_POLL_ATTEMPTS):
+            status_result = await asyncio.to_thread(client.poll_status, video_id)
+            status = status_result.get("status")
+            if status == "completed":
+                def download() -> bool:
+                    success = client.download_video(status_result["video_url"], save_path)
+                    # 请求被取消后下载线程仍会继续执行，完成后由线程自己删除文件
+                    if discard is not None and discard.is_set():
+                        _remove_file(save_path)
+                    return success
+
+                success = await asyncio.to_thread(download)
+                if success:
+                    return {"video_id": video_id, "error": None}
+                return {"video_id": video_id, "error": "视频下载失败"}
+            elif status == "failed":
+                return {"video_id": video_id, "error": status_result.get("error") or "视频生成失败"}
+            await asyncio.sleep(POLL_INTERVAL)
+        return {"video_id": video_id, "error": "视频生成超时（超过20分钟）"}
+
+    async def agenerate(
+        self,
+        prompt: str,
+        save_path: str,
+        reference_image_path: Optional[str] = None,
+        seconds: Optional[int] = None,
+        remix_video_id: Optional[str] = None,
+        remix_backend: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        生成视频并下载到指定路径
+
+        Args:
+            prompt: 视频生成提示词
+            save_path: 视频保存路径
+            reference_image_path: 参考图片路径（可选）
+            seconds: 视频时长（仅对支持的后端生效）
+            remix_video_id: 上一段视频ID（可选），主后端与上一段视频的后端相同且支持remix时使用
+            remix_backend: 上一段视频所用的后端
+
+        Returns:
+            {"video_id": ..., "backend": ..., "error": ...}
+        """
+        backends = self.select(require_image=bool(reference_image_path))
+        primary = backends[0]
+        secondary = backends[1] if len(backends) > 1 else None
+
+        def run(name: str):
+            # 每个后端下载到各自的临时文件，胜出者再移动到目标路径，
+            # 避免被取消的请求在后台线程中完成下载后覆盖结果
+            remix_id = remix_video_id if remix_backend == name else None
+            temp_path = f"{save_path}.{name}.part.mp4"
+            discard = threading.Event()
+            task = asyncio.create_task(
+                self._arun(name, prompt, reference_image_path, temp_path, seconds, remix_id, discard)
+            )
+            task.temp_path = temp_path
+            task.discard = discard
+            tasks.append(task)
+            return task
+
+        def finish(task) -> Dict[str, Any]:
+            result = task.result()
+            if result["error"] is None:
+                os.replace(task.temp_path, save_path)
+            return result
+
+        tasks: List[asyncio.Task] = []
+        try:
+            primary_task = run(primary)
+            if secondary is None:
+                await primary_task
+                return finish(primary_task)
+
+            # 等待主后端，超过对冲时间或主后端失败时向第二个后端发起请求
+            hedge_after = HEDGE_AFTER or self.stats[primary].p90
+            done, _ = await asyncio.wait({primary_task}, timeout=hedge_after)
+            if done and primary_task.result()["error"] is None:
+                return finish(primary_task)
+
+            hedge_task = run(secondary)
+            pending = {hedge_task} if done else {primary_task, hedge_task}
+            last_result = primary_task.result() if done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    last_result = task.result()
+                    if last_result["error"] is None:
+                        return finish(task)
+            return last_result
+        finally:
+            # 取消未完成的请求，删除落选、失败或被取消的后端留下的临时文件
+            # （胜出者的临时文件已移动到目标路径）
+            for task in tasks:
+                task.cancel()
+                task.discard.set()
+                _remove_file(task.temp_path)
+
+
+_ROUTER: Optional[VideoBackendRouter] = None
+
+
+def get_video_router() -> VideoBackendRouter:
+    """获取进程内共享的后端路由（统计数据在所有会话间共享）"""
+    global _ROUTER
+    if _ROUTER is None:
+        _ROUTER = VideoBackendRouter()
+    return _ROUTER
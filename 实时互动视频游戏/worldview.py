@@ -2,9 +2,13 @@
 """
 默认世界观和故事背景
 """
+import hashlib
 import os
+import shutil
+import threading
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 import sys
 
 # 添加当前目录到路径
@@ -50,25 +54,20 @@ def get_default_worldview() -> str:
     return DEFAULT_WORLDVIEW
 
 
-def generate_cover_image(worldview_text: Optional[str] = None) -> Optional[str]:
-    """
-    生成游戏封面图
+# 封面图缓存目录（按提示词和宽高比的哈希寻址，所有会话共享）
+COVER_CACHE_DIR = Path(__file__).parent / "data" / "images" / "cache"
+COVER_ASPECT_RATIO = "16:9"  # 16:9宽高比，适合封面
 
-    Args:
-        worldview_text: 世界观文本（可选），用于生成更匹配的封面图
+# 正在生成的封面图：缓存键 -> Future（相同键的并发请求只生成一次）
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
 
-    Returns:
-        封面图路径，如果失败返回None
-    """
-    try:
-        # 构建封面图提示词
-        if (
-            worldview_text
-            and worldview_text.strip()
-            and len(worldview_text.strip()) > 50
-        ):
-            # 如果提供了世界观文本，基于世界观生成提示词
-            prompt = f"""根据以下游戏世界观，创建一个RPG游戏封面图：
+
+def build_cover_prompt(worldview_text: Optional[str] = None) -> str:
+    """构建封面图提示词"""
+    if worldview_text and worldview_text.strip() and len(worldview_text.strip()) > 50:
+        # 如果提供了世界观文本，基于世界观生成提示词
+        return f"""根据以下游戏世界观，创建一个RPG游戏封面图：
 
 {worldview_text[:500]}
 
@@ -78,9 +77,9 @@ def generate_cover_image(worldview_text: Optional[str] = None) -> Optional[str]:
 - 适合作为游戏封面
 - 高质量，精美细节
 - 视觉风格要与世界观匹配"""
-        else:
-            # 默认提示词（基于当前世界观）
-            prompt = """创建一个奇幻RPG游戏封面图，画面包含：
+
+    # 默认提示词（基于当前世界观）
+    return """创建一个奇幻RPG游戏封面图，画面包含：
 - 一个年轻的符文学徒站在高塔上，手持闪烁着元素光芒的符文
 - 背景是被元素风暴撕裂的天空，四大元素（火、水、风、土）在天空中交织
 - 远处有崩塌的星尘之塔，散发着神秘的光芒
@@ -88,18 +87,91 @@ def generate_cover_image(worldview_text: Optional[str] = None) -> Optional[str]:
 - 游戏标题风格：星尘遗境：最后的符文
 - 适合作为游戏封面，高质量，精美细节"""
 
-        # 初始化客户端
-        client = GeminiImageClient()
 
-        # 设置保存路径
-        cover_path = str(Path(__file__).parent / "data" / "images" / "cover_image.png")
+def cover_cache_key(prompt: str, aspect_ratio: str = COVER_ASPECT_RATIO) -> str:
+    """封面图缓存键（提示词和宽高比的SHA-256）"""
+    return hashlib.sha256(f"{aspect_ratio}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _generate_cached_image(prompt: str, aspect_ratio: str, force: bool = False) -> Optional[str]:
+    """
+    生成图片并写入共享缓存，缓存命中时直接返回
+
+    相同缓存键的并发请求只有第一个会调用Gemini，其余请求等待其结果
+    """
+    key = cover_cache_key(prompt, aspect_ratio)
+    cache_path = COVER_CACHE_DIR / f"{key}.png"
+    if cache_path.exists() and not force:
+        return str(cache_path)
+
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _INFLIGHT[key] = future
+    if not owner:
+        return future.result()
 
-        # 生成图片（使用16:9宽高比，适合封面）
+    try:
+        # 先写临时文件再原子替换，读者不会看到写了一半的图片
+        temp_path = COVER_CACHE_DIR / f"{key}.{os.getpid()}.{threading.get_ident()}.png"
+        client = GeminiImageClient()
         image_path = client.generate_image(
-            prompt=prompt, save_path=cover_path, aspect_ratio="16:9"
+            prompt=prompt, save_path=str(temp_path), aspect_ratio=aspect_ratio
         )
+        result = None
+        if image_path:
+            os.replace(temp_path, cache_path)
+            result = str(cache_path)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
+def _link_to_session(cache_path: str, session_id: str) -> str:
+    """把共享缓存中的封面图链接到会话目录（不支持硬链接时复制）"""
+    link_path = Path(__file__).parent / "data" / session_id / "images" / "cover_image.png"
+    link_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = link_path.with_name(f"cover_image.{threading.get_ident()}.png")
+    try:
+        os.link(cache_path, temp_path)
+    except OSError:
+        shutil.copyfile(cache_path, temp_path)
+    os.replace(temp_path, link_path)
+    return str(link_path)
+
+
+def generate_cover_image(
+    worldview_text: Optional[str] = None,
+    session_id: str = "default",
+    force: bool = False,
+) -> Optional[str]:
+    """
+    生成游戏封面图
+
+    相同的世界观（提示词和宽高比相同）只生成一次，之后所有会话直接复用缓存
 
-        return image_path
+    Args:
+        worldview_text: 世界观文本（可选），用于生成更匹配的封面图
+        session_id: 会话ID，封面图会链接到该会话的目录下
+        force: 是否忽略缓存重新生成
+
+    Returns:
+        封面图路径，如果失败返回None
+    """
+    try:
+        prompt = build_cover_prompt(worldview_text)
+        COVER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_path = _generate_cached_image(prompt, COVER_ASPECT_RATIO, force=force)
+        if cache_path is None:
+            return None
+        return _link_to_session(cache_path, session_id)
     except Exception as e:
         print(f"生成封面图失败: {e}")
         return None